@@ -1,22 +1,57 @@
 import os
-import tempfile
+import sys
+import json
+import time
 import threading
+import itertools
 import logging
-from flask import Flask, render_template, request, session, url_for, jsonify
-from pyswip import Prolog, Functor, call, registerForeign, Variable
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, session, jsonify, stream_with_context, g, has_app_context
+from flask import render_template as flask_render_template
+from pyswip import Prolog, registerForeign
+from kb_manager import KnowledgeBase, KB_PATH
+from rule_index import count_bits
+from kb_reloader import KBReloader
+from catalog import catalog, questions, questions_by_attribute
+from question_scheduler import next_question, questions_left, INFORMATION_GAIN
+from reco_cache import recommendation_cache
+from recommendations import restaurant_info, first_restaurant, recommend
+from prolog_pool import PrologPool
+from session_store import AnswerCodec, MemoryStore, SQLiteStore, ServerSessionInterface
+from metrics import registry, span, InstrumentedLock
+import test_harness
 
 # Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Per-query lines (answers, results, recommendations) go to their own logger,
+# quiet by default; HOT_PATH_LOG_LEVEL=INFO brings them back. They use lazy
+# %-style arguments so a disabled line costs no formatting.
+HOT_PATH_LOG_LEVEL = os.environ.get("HOT_PATH_LOG_LEVEL", "WARNING").upper()
+hot_path_logger = logging.getLogger(f"{__name__}.hot_path")
+hot_path_logger.setLevel(HOT_PATH_LOG_LEVEL)
+
+request_seconds = registry.histogram(
+    "recommender_http_request_seconds", "Request latency by endpoint", ("endpoint", "method", "status"))
+inference_calls = registry.counter(
+    "recommender_inference_total", "Restaurant lookups by the source that answered them", ("source",))
+inference_errors = registry.counter("recommender_inference_errors_total", "Failed inference calls")
+
+# prolog_lock contention is summarized in the log at most this often
+LOCK_SUMMARY_INTERVAL = float(os.environ.get("LOCK_SUMMARY_INTERVAL", "60"))
+
 app = Flask(__name__)
 app.secret_key = 'sf_restaurant_recommender'
 
 # Setup PySWIP Prolog interface with thread lock
 prolog = Prolog()
-retractall = Functor("retractall")
-known = Functor("known", 3)
-prolog_lock = threading.Lock()  # Add thread lock for Prolog operations
+# Add thread lock for Prolog operations, timed per call site
+prolog_lock = InstrumentedLock("prolog_lock", summary_interval=LOCK_SUMMARY_INTERVAL)
+registry.callback("recommender_lock_queued", "Threads holding or waiting for prolog_lock", "gauge",
+                  lambda: {("prolog_lock",): prolog_lock.queued}, ("lock",))
 
 # Define essential foreign functions
 def read_py(A, V, Y):
@@ -42,296 +77,411 @@ registerForeign(read_menu_py)
 registerForeign(write_py)
 registerForeign(dialog_response)
 
-# Updated askables and their corresponding questions/options
-questions = [
-    {
-        'text': "What meal are you looking for?",
-        'attribute': 'meal_type',
-        'options': ["breakfast", "lunch", "dinner"]
-    },
-    {
-        'text': "What kind of food are you in the mood for today?",
-        'attribute': 'cuisine',
-        'options': ["american", "chinese", "italian", "japanese", "mexican", "thai", "indian", "middle_eastern", "seafood"]
-    },
-    {
-        'text': "Do you have any specific dietary requirements or preferences?",
-        'attribute': 'diet',
-        'options': ["standard", "vegetarian", "vegan", "halal", "gluten_free"]
-    },
-    {
-        'text': "What price range are you comfortable with for this meal?",
-        'attribute': 'price',
-        'options': ["affordable", "moderate", "expensive"]
-    },
-    {
-        'text': "What kind of dining atmosphere would you prefer?",
-        'attribute': 'atmosphere',
-        'options': ["casual", "upscale", "cozy", "trendy", "quiet"]
-    },
-    {
-        'text': "How far are you willing to travel from Minerva residence?",
-        'attribute': 'distance',
-        'options': ["walking_distance", "muni_required", "bart_required"]
-    },
-    {
-        'text': "What type of service are you looking for?",
-        'attribute': 'service_style',
-        'options': ["dine_in", "take_out", "quick_bite"]
-    },
-    {
-        'text': "How many people will be dining?",
-        'attribute': 'group_size',
-        'options': ["solo", "small_group", "large_group"]
-    },
-    {
-        'text': "What noise level would be ideal for your dining experience?",
-        'attribute': 'noise',
-        'options': ["quiet", "moderate", "lively"]
-    }
-]
+# Inference backend: "index" matches against the compiled rule index,
+# "matrix" against its NumPy matrix form, "prolog" queries SWI-Prolog through
+# the knowledge base under prolog_lock, "pool" spreads Prolog queries over
+# PROLOG_POOL_SIZE worker processes
+INFERENCE_BACKEND = os.environ.get("RECOMMENDER_BACKEND", "index")
+PROLOG_POOL_SIZE = int(os.environ.get("PROLOG_POOL_SIZE", os.cpu_count() or 1))
+PROLOG_POOL_TIMEOUT = float(os.environ.get("PROLOG_POOL_TIMEOUT", "5"))
+
+# Question order: "information_gain" asks the most informative question next
+# and skips questions that cannot change the outcome, "fixed" asks them in order
+QUESTION_ORDER = os.environ.get("QUESTION_ORDER", INFORMATION_GAIN)
+
+# Restaurants failing at most this many criteria are offered as alternatives
+NEAR_MISS_LIMIT = int(os.environ.get("NEAR_MISS_LIMIT", "2"))
+MAX_ALTERNATIVES = 5
 
-'''
+# Profiles evaluated together by recommend_batch and /api/recommend/batch
+BATCH_CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", "1024"))
 
-# Function to determine if a question should be skipped based on previous answers
-def should_skip_question(question, answers):
+# Consult the KB once; queries only assert and retract known/3 facts
+knowledge_base = KnowledgeBase(KB_PATH, prolog, lock=prolog_lock)
+if INFERENCE_BACKEND == "prolog":
+    knowledge_base.load(site="startup")
+
+# Everything compiled from kb.pl: the rule index (bitsets for Prolog-free
+# matching), the exact-match table, the matrix matcher and the lookup table
+# (python lookup_table.py build). Rebuilt in the background when kb.pl changes
+kb_reloader = KBReloader(KB_PATH, matrix=INFERENCE_BACKEND == "matrix")
+
+def current_kb():
     """
-    Determine if a question should be skipped based on previous answers.
-    Returns True if the question should be skipped, False otherwise.
+    The KB snapshot for the current request, taken the first time the
+    request needs it, so a reload cannot change the KB under a request
     """
-    attribute = question['attribute']
-    
-    # Skip diet question if cuisine is seafood
-    if attribute == 'diet' and answers.get('cuisine') == 'seafood':
-        # Automatically set diet to standard for seafood
-        answers['diet'] = 'standard'
-        return True
-        
-    # Skip noise level question if atmosphere is quiet
-    # (since quiet atmosphere implies quiet noise level)
-    if attribute == 'noise' and answers.get('atmosphere') == 'quiet':
-        # Automatically set noise to quiet
-        answers['noise'] = 'quiet'
-        return True
-    
-    # Skip service_style question if meal_type is breakfast
-    # (since most breakfast places are dine_in)
-    if attribute == 'service_style' and answers.get('meal_type') == 'breakfast':
-        # Auto-set service_style to dine_in for breakfast
-        answers['service_style'] = 'dine_in'
-        return True
-        
-    # Add more conditional logic as needed
-    
-    return False
-'''
-
-# Updated restaurant URL mappings
-restaurant_urls = {
-    'raavi': "https://maps.app.goo.gl/8ov6JTFxY5rExqmv5",
-    'red_chilli': "https://maps.app.goo.gl/8gKJA2qMgfKkvwN86",
-    'kin_khao': "https://maps.app.goo.gl/CZNLdhBdVzigb3Dp9",
-    'sababa': "https://maps.app.goo.gl/98u7dPwLvbJWuNot6",
-    'tratto': "https://maps.app.goo.gl/wbrDsd7HcThU3KYA9",
-    'taylor_street_coffee': "https://maps.app.goo.gl/4QFjRKGyJAwMzEDS7",
-    'mr_charlies': "https://maps.app.goo.gl/jnGzdgx8Q3nfx9xq6",
-    'grove_yerba_buena': "https://maps.app.goo.gl/VhVPT3Kwgj5r2U1p7",
-    'mkt_restaurant': "https://maps.app.goo.gl/nMrR8TzQc1kqtFy46",
-    'brendas_french_soul': "https://maps.app.goo.gl/YWpgozFgp2KxKwG47",
-    'thats_my_jam': "https://maps.app.goo.gl/GFaq2LCCRJ1DK1oK9",
-    'subway': "https://maps.app.goo.gl/areYk9z6rXPqXWQJ6",
-    'gotts_roadside': "https://maps.app.goo.gl/Fc1D4CgDHXZmLDJi8",
-    'burger_king': "https://maps.app.goo.gl/9h5XNEDkL9bjNjWJA",
-    'mcdonalds': "https://maps.app.goo.gl/fFyy2ZGwNpQk9ALj8",
-    'in_n_out': "https://maps.app.goo.gl/rPyCYasEKGL2XNmPA",
-    'scomas': "https://maps.app.goo.gl/GYzvJ8GG1yi98qVT9",
-    'hinodeya_ramen': "https://maps.app.goo.gl/UiRRDqSKgTVviCwv8",
-    'panda_express': "https://maps.app.goo.gl/8mNGpbn51weKcVoH9"
-}
-
-# Restaurant names for display
-restaurant_names = {
-    'raavi': "Raavi North Indian Cuisine",
-    'red_chilli': "Red Chilli Halal",
-    'kin_khao': "Kin Khao",
-    'sababa': "Sababa",
-    'tratto': "Tratto",
-    'taylor_street_coffee': "Taylor Street Coffee Shop",
-    'mr_charlies': "Mr. Charlie's",
-    'grove_yerba_buena': "The Grove - Yerba Buena",
-    'mkt_restaurant': "MKT Restaurant and Bar",
-    'brendas_french_soul': "Brenda's French Soul Food",
-    'thats_my_jam': "That's My Jam",
-    'subway': "Subway",
-    'gotts_roadside': "Gott's Roadside",
-    'burger_king': "Burger King",
-    'mcdonalds': "McDonald's",
-    'in_n_out': "In-N-Out Burger",
-    'scomas': "Scoma's Restaurant",
-    'hinodeya_ramen': "HINODEYA Ramen Japantown",
-    'panda_express': "Panda Express"
-}
-
-# Modify Prolog knowledge base to skip interactive questioning
-def modify_kb(kb_content):
-    """
-    Modify KB to replace interactive questioning with direct fact checking
-    This avoids the read_menu_py and read_py calls entirely
-    """
-    modified_kb = []
-    skip_next = False
-    
-    for line in kb_content.split('\n'):
-        # Skip the definition of interactive menuask and ask clauses
-        if "menuask(A, V, Menu):-" in line or "ask(A, V):-" in line:
-            skip_next = True
-            continue
-        
-        if skip_next:
-            if line.strip().endswith("."):
-                skip_next = False
-            continue
-            
-        modified_kb.append(line)
-    
-    # Add simplified versions that just check facts without interaction
-    modified_kb.append("""
-% Simplified menuask that just checks if the fact is known
-menuask(_, V, _) :- known(yes, _, V).
-
-% Simplified ask that just checks if the fact is known
-ask(_, V) :- known(yes, _, V).
-    """)
-    
-    return '\n'.join(modified_kb)
-
-# Load and consult the Prolog KB dynamically
-def load_kb():
-    try:
-        kb_path = "kb.pl"
-        logger.info(f"Loading knowledge base from: {kb_path}")
-        
-        with open(kb_path, "r") as f:
-            kb = f.read()
-        
-        # Modify the KB to avoid interactive questioning
-        modified_kb = modify_kb(kb)
-        
-        (fd, temp_path) = tempfile.mkstemp(suffix=".pl", text=True)
-        with os.fdopen(fd, "w") as temp_file:
-            temp_file.write(modified_kb)
-        
-        prolog.consult(temp_path)
-        os.unlink(temp_path)
-        call(retractall(known))
-        return True
-    except Exception as e:
-        logger.error(f"Error loading knowledge base: {e}")
-        return False
+    if not has_app_context():
+        return kb_reloader.current
+    if 'kb' not in g:
+        g.kb = kb_reloader.current
+    return g.kb
+
+# Session storage: "memory" and "sqlite" keep sessions on the server with only
+# an id in the cookie, "cookie" keeps everything in Flask's signed cookie
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "memory")
+SESSION_DB = os.environ.get("SESSION_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions.db"))
+SESSION_IDLE_TIMEOUT = float(os.environ.get("SESSION_IDLE_TIMEOUT", "1800"))
+
+# Only a storage format, so it keeps the startup domains; answers outside
+# them, e.g. values a reload added, are stored unpacked
+startup_index = kb_reloader.current.rule_index
+answer_codec = AnswerCodec({attribute: startup_index.domain(attribute) for attribute in startup_index.attributes()})
+session_store = None
+if SESSION_BACKEND == "memory":
+    session_store = MemoryStore(answer_codec, SESSION_IDLE_TIMEOUT)
+elif SESSION_BACKEND == "sqlite":
+    session_store = SQLiteStore(answer_codec, SESSION_DB, SESSION_IDLE_TIMEOUT)
+if session_store is not None:
+    app.session_interface = ServerSessionInterface(session_store)
+
+# Started on first use so spawned worker processes re-importing this module
+# do not start pools of their own
+prolog_pool = None
+prolog_pool_lock = threading.Lock()
+
+def get_prolog_pool():
+    global prolog_pool
+    with prolog_pool_lock:
+        if prolog_pool is None:
+            prolog_pool = PrologPool(PROLOG_POOL_SIZE, KB_PATH, timeout=PROLOG_POOL_TIMEOUT)
+    return prolog_pool
+
+def reload_prolog(old, new):
+    """
+    Bring the Prolog engines in line with a newly published KB. This runs
+    on the reloader thread, which must not drive the in-process engine, so
+    that engine re-consults under prolog_lock on the request thread of its
+    next query. The pool is replaced by a fresh one before the old one is
+    closed, which lets its queries finish for up to PROLOG_POOL_TIMEOUT.
+    """
+    global prolog_pool
+    if knowledge_base.loaded:
+        knowledge_base.schedule_reload(new.content, site="reload")
+    if prolog_pool is not None:
+        pool = PrologPool(PROLOG_POOL_SIZE, KB_PATH, timeout=PROLOG_POOL_TIMEOUT)
+        with prolog_pool_lock:
+            old_pool, prolog_pool = prolog_pool, pool
+        old_pool.close()
+
+kb_reloader.listeners.append(reload_prolog)
+# Results from different KB versions never share cache entries
+recommendation_cache.version = lambda: current_kb().version
+
+def find_restaurants(answers, site="recommendation"):
+    """
+    Names of all restaurants matching answers, in KB clause order; site
+    names the caller in the prolog_lock statistics
+    """
+    with span("inference"):
+        if INFERENCE_BACKEND == "prolog":
+            inference_calls.inc(source="prolog")
+            return knowledge_base.query(answers, site=site)
+        if INFERENCE_BACKEND == "pool":
+            inference_calls.inc(source="pool")
+            return get_prolog_pool().query(answers)
+        kb = current_kb()
+        if kb.lookup_table is not None:
+            mask = kb.lookup_table.lookup(answers)
+            if mask is not None:
+                inference_calls.inc(source="lookup")
+                return kb.lookup_table.names_for(mask)
+        if kb.matrix_matcher is not None:
+            inference_calls.inc(source="matrix")
+            return kb.matrix_matcher.matches(answers)
+        inference_calls.inc(source="index")
+        return kb.rule_index.matches(answers)
 
-# Direct mapping of test cases to restaurants (hardcoded fallback)
 def direct_restaurant_match(answers):
-    """Directly match restaurants based on criteria without using Prolog"""
-    location = answers.get('location')
-    if location != 'san_francisco':
-        return None
-        
-    meal = answers.get('meal_type')
-    cuisine = answers.get('cuisine')
-    diet = answers.get('diet')
-    price = answers.get('price')
-    atmosphere = answers.get('atmosphere')
-    distance = answers.get('distance')
-    service = answers.get('service_style')
-    group = answers.get('group_size')
-    noise = answers.get('noise')
-    
-    # Test case 1: Breakfast at Tratto
-    if (meal == 'breakfast' and cuisine == 'italian' and diet == 'vegetarian' 
-            and price == 'expensive' and atmosphere == 'upscale' 
-            and distance == 'walking_distance' and service == 'dine_in'
-            and group == 'small_group' and noise == 'quiet'):
-        return 'tratto'
-    
-    # Test case 2: Lunch at Raavi
-    elif (meal == 'lunch' and cuisine == 'indian' and diet == 'halal'
-            and price == 'affordable' and atmosphere == 'casual'
-            and distance == 'walking_distance' and service == 'dine_in'
-            and group == 'small_group' and noise == 'moderate'):
-        return 'raavi'
-    
-    # Test case 3: Quick Vegan Lunch at Mr. Charlie's
-    elif (meal == 'lunch' and cuisine == 'american' and diet == 'vegan'
-            and price == 'affordable' and atmosphere == 'casual'
-            and distance == 'walking_distance' and service == 'quick_bite'
-            and group == 'solo' and noise == 'lively'):
-        return 'mr_charlies'
-    
-    # Test case 4: Upscale Seafood Dinner
-    elif (meal == 'dinner' and cuisine == 'seafood' and diet == 'standard'
-            and price == 'expensive' and atmosphere == 'upscale'
-            and distance == 'bart_required' and service == 'dine_in'
-            and group == 'small_group' and noise == 'moderate'):
-        return 'scomas'
-    
-    # Add more direct matches as needed
-    
-    return None
+    """The restaurant for a known answer profile, from the exact-match table"""
+    return current_kb().exact_matches.lookup(answers)
 
-# Perform Prolog inference based on user's answers
+
+# Perform Prolog inference based on user's answers; returns the
+# restaurant_info of the recommendation, or None
+@recommendation_cache.cached
 def get_prolog_recommendation(answers):
-    # Try direct matching first (guaranteed to work for test cases)
-    direct_match = direct_restaurant_match(answers)
-    if direct_match:
-        logger.info(f"Direct match found: {direct_match}")
-        display_name = restaurant_names.get(direct_match, direct_match.replace('_', ' ').title())
-        url = restaurant_urls.get(direct_match, "")
-        return f"{display_name}: {url}"
-    
-    # Fall back to Prolog inference if direct match fails
-    with prolog_lock:  # Use lock to prevent concurrent Prolog access
-        if not load_kb():
-            logger.error("Failed to load knowledge base")
-            return None
-        
-        # Log the answers we're using for recommendation
-        logger.info(f"Getting Prolog recommendation with answers: {answers}")
-        
-        # Assert each answer into Prolog
-        for key, val in answers.items():
-            assertion = f"known(yes, {key}, {val})"
-            logger.debug(f"Asserting: {assertion}")
-            prolog.assertz(assertion)
+    hot_path_logger.info("Getting %s recommendation with answers: %s", INFERENCE_BACKEND, answers)
+    try:
+        reco = recommend(answers, direct_restaurant_match, find_restaurants, hot_path_logger)
+    except Exception as e:
+        inference_errors.inc()
+        logger.error(f"Inference failed: {e}")
+        return None
+    if reco is None:
+        hot_path_logger.warning("No matching restaurants found")
+    return reco
 
+def recommend_batch(profiles, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    get_prolog_recommendation for every answers dict of an iterable,
+    yielded in order one chunk at a time, so neither side has to hold the
+    whole batch. With the index backend each chunk is matched column-wise
+    in one pass over the rules, with the matrix backend in one matrix
+    product; Prolog backends query profile by profile, the pool from as
+    many threads as it has workers.
+    """
+    def query(answers):
         try:
-            # Query for a restaurant without limiting results
-            logger.info("Running Prolog query: restaurant(X)")
-            results = list(prolog.query("restaurant(X)"))
-            logger.info(f"Query results: {results}")
-            
-            if not results:
-                logger.warning("No matching restaurants found in Prolog query")
-                return None
-                
-            # Filter out 'ask_others' if it's in the results
-            valid_results = [r for r in results if r["X"] != "ask_others"]
-            
-            if not valid_results:
-                logger.warning("Only 'ask_others' found in results")
-                return None
-                
-            # Take the first valid result
-            result = valid_results[0]
-            name = result["X"]
-            display_name = restaurant_names.get(name, name.replace('_', ' ').title())
-            url = restaurant_urls.get(name, "")
-            
-            logger.info(f"Prolog recommending: {display_name}")
-            return f"{display_name}: {url}"
-            
+            return find_restaurants(answers, site="batch")
         except Exception as e:
-            logger.error(f"Prolog query failed: {e}")
-            return None
+            inference_errors.inc()
+            logger.error(f"Inference failed for {answers}: {e}")
+            return []
+
+    kb = current_kb()
+    executor = None
+    if INFERENCE_BACKEND == "pool":
+        executor = ThreadPoolExecutor(PROLOG_POOL_SIZE)
+    try:
+        profiles = iter(profiles)
+        while True:
+            chunk = list(itertools.islice(profiles, chunk_size))
+            if not chunk:
+                return
+            if INFERENCE_BACKEND == "index":
+                results = (kb.rule_index.names_for(mask) for mask in kb.rule_index.match_masks(chunk))
+            elif kb.matrix_matcher is not None:
+                results = kb.matrix_matcher.match_lists(chunk)
+            elif executor is not None:
+                results = executor.map(query, chunk)
+            else:
+                results = map(query, chunk)
+            for answers, names in zip(chunk, results):
+                name = direct_restaurant_match(answers) or first_restaurant(names)
+                yield restaurant_info(name) if name else None
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+@recommendation_cache.cached
+def get_recommendations(answers):
+    """
+    All restaurants matching answers plus near-misses failing at most
+    NEAR_MISS_LIMIT answered criteria, best first, each with its
+    partial-match score and the attributes it missed. Computed in one pass
+    over the rule index.
+    """
+    ranked = []
+    for match in current_kb().rule_index.rank(answers, NEAR_MISS_LIMIT, answered_only=True):
+        if match.name == "ask_others":
+            continue
+        info = restaurant_info(match.name)
+        info.update(score=round(match.score, 3), misses=match.misses, missed=list(match.missed))
+        ranked.append(info)
+    return ranked
+
+def explain(answers):
+    """
+    For every restaurant, whether answers match it and, if not, the first of
+    its tests they fail, read off the compiled index without another query
+    """
+    explanation = []
+    for name, failure in current_kb().rule_index.explain(answers):
+        if name == "ask_others":
+            continue
+        entry = {'id': name, 'name': catalog.display_name(name), 'matched': failure is None}
+        if failure is not None:
+            entry['failed'] = failure._asdict()
+        explanation.append(entry)
+    return explanation
+
+def completed_answers(answers):
+    """
+    answers plus the values inferred for the questions that were skipped,
+    for the final lookup only: ranking and explanations must not count
+    answers the user never gave
+    """
+    inferred = session.get('inferred')
+    return {**inferred, **answers} if inferred else answers
+
+def store_recommendation(answers, reco):
+    """Keep the recommendation's id and the best alternatives to it in the session"""
+    chosen = reco['id'] if reco else None
+    alternatives = [r for r in get_recommendations(answers) if r['id'] != chosen]
+    session['recommendation'] = chosen
+    session['alternatives'] = [[r['id'], r['missed']] for r in alternatives[:MAX_ALTERNATIVES]]
+    return bool(reco or alternatives)
+
+def session_candidates(answers):
+    """
+    Bitmask of restaurants still possible, rebuilt from answers if missing
+    or computed by another version of the KB
+    """
+    kb = current_kb()
+    candidates = session.get('candidates')
+    if candidates is None or session.get('kb_version') != kb.version:
+        candidates = kb.rule_index.candidates(answers)
+    return candidates
+
+def store_candidates(candidates):
+    """Keep candidates in the session, with the KB version they belong to"""
+    session['candidates'] = candidates
+    session['kb_version'] = current_kb().version
+
+def advance_session(answers, candidates):
+    """
+    Schedule the next question and remember it in the session. Answers to
+    questions that can no longer change the outcome are inferred and kept
+    apart from the user's, under 'inferred'.
+    Returns the question, or None when the session is over.
+    """
+    inferred = session.get('inferred', {})
+    question, more = next_question(current_kb().rule_index, questions, {**inferred, **answers}, candidates,
+                                   QUESTION_ORDER)
+    if more:
+        session['inferred'] = {**inferred, **more}
+    session['current'] = question['attribute'] if question else None
+    return question
+
+def question_steps(answers, candidates):
+    """
+    Questions answered so far plus the most that may still be asked, for
+    the progress bar; the early recommendation can end a session sooner
+    """
+    settled = {**session.get('inferred', {}), **answers}
+    step = session.get('q_index', 0)
+    return step + max(1, questions_left(current_kb().rule_index, questions, settled, candidates, QUESTION_ORDER))
+
+def current_question(answers, candidates):
+    """The question being asked, or None when the session is over"""
+    if 'current' not in session:
+        question = advance_session(answers, candidates)
+        session['answers'] = answers
+        return question
+    attribute = session['current']
+    return questions_by_attribute[attribute] if attribute else None
+
+def finish_session(answers):
+    """
+    Store the final recommendation, or the closest alternatives.
+    Returns the endpoint to show next: recommendation or no_results.
+    """
+    reco = get_prolog_recommendation(completed_answers(answers))
+    if store_recommendation(answers, reco):
+        return "recommendation"
+    return "no_results"
+
+def start_session(in_sf):
+    """
+    Reset the session for a new run of questions.
+    Returns the endpoint to show next, or None outside San Francisco.
+    """
+    session.clear()
+    if not in_sf:
+        return None
+    answers = {'location': 'san_francisco'}
+    candidates = current_kb().rule_index.candidates(answers)
+    session['asked'] = []
+    session['q_index'] = 0
+    current = advance_session(answers, candidates)
+    session['answers'] = answers
+    store_candidates(candidates)
+    return "question" if current else finish_session(answers)
+
+def answer_question(current, value):
+    """
+    Record the answer to the current question and schedule the next one.
+    Returns the endpoint to show next: question, recommendation or no_results.
+    """
+    answers = session.get('answers', {})
+    attribute = current['attribute']
+    # Narrow the surviving restaurants by this one answer
+    rule_index = current_kb().rule_index
+    candidates = rule_index.candidates({attribute: value}, session_candidates(answers))
+    answers[attribute] = value
+    asked = session.get('asked', []) + [attribute]
+    session['asked'] = asked
+    session['q_index'] = len(asked)
+    current = advance_session(answers, candidates)
+    session['answers'] = answers
+    store_candidates(candidates)
+
+    hot_path_logger.info("User selected %s=%s, now have answers: %s", attribute, value, answers)
+
+    # Try to get a recommendation after 3 questions (early recommendation),
+    # but only once some candidate already satisfies every answered test
+    completed = completed_answers(answers)
+    if len(answers) >= 4 and rule_index.exact_mask(completed, candidates):  # Location + 3 criteria
+        reco = get_prolog_recommendation(completed)
+        if reco:
+            store_recommendation(answers, reco)
+            return "recommendation"
+
+    if current is None:
+        return finish_session(answers)
+    return "question"
+
+def undo_answer():
+    """Drop the last answer, and the inferred answers, and ask it again"""
+    asked = session.get('asked', [])
+    if not asked:
+        return
+    # Ask the last question again. Inferences may rest on the dropped
+    # answer; they are re-inferred on the next step
+    attribute = asked.pop()
+    answers = {
+        key: value for key, value in session.get('answers', {}).items()
+        if key in asked or key not in questions_by_attribute
+    }
+    session.pop('inferred', None)
+    session['asked'] = asked
+    session['q_index'] = len(asked)
+    session['answers'] = answers
+    store_candidates(current_kb().rule_index.candidates(answers))
+    session['current'] = attribute
+
+def session_alternatives():
+    """The alternatives stored in the session, ready for display"""
+    alternatives = []
+    for name, missed in session.get('alternatives', []):
+        info = restaurant_info(name)
+        info['missed'] = [attribute.replace('_', ' ') for attribute in missed]
+        alternatives.append(info)
+    return alternatives
+
+def cache_requests():
+    stats = recommendation_cache.stats()
+    return {("hit",): stats['hits'], ("miss",): stats['misses']}
+
+registry.callback("recommender_cache_requests_total", "Recommendation cache lookups by result", "counter",
+                  cache_requests, ("result",))
+registry.callback("recommender_cache_entries", "Recommendations in the cache", "gauge",
+                  lambda: recommendation_cache.stats()['size'])
+
+def render_template(template_name, **context):
+    """flask.render_template, timed as the "render" span"""
+    with span("render"):
+        return flask_render_template(template_name, **context)
+
+@app.context_processor
+def template_flags():
+    """
+    The shared templates only load the JSON API flow here; web_gui.py
+    renders them too but has no /api endpoints
+    """
+    return {'json_api': True}
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    # Watch kb.pl once the app serves requests; processes that only import
+    # this module, such as spawned pool workers, never start the watcher
+    if not kb_reloader.started:
+        kb_reloader.start()
+
+@app.after_request
+def record_request(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        request_seconds.observe(time.perf_counter() - start, endpoint=request.endpoint or "unknown",
+                                method=request.method, status=response.status_code)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Counters and latency histograms in the Prometheus text format"""
+    return Response(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.route('/')
 def index():
@@ -340,87 +490,170 @@ def index():
 
 @app.route('/location', methods=['POST'])
 def location():
-    if request.form.get('location') == 'yes':
-        session['answers'] = {'location': 'san_francisco'}
-        session['q_index'] = 0
-        return render_template("redirect.html", endpoint="question")
-    else:
+    endpoint = start_session(request.form.get('location') == 'yes')
+    if endpoint is None:
         return render_template('no_results.html', message="Sorry, we only support SF for now.")
+    return render_template("redirect.html", endpoint=endpoint)
 
 @app.route('/question', methods=['GET', 'POST'])
 def question():
-    q_index = session.get('q_index', 0)
     answers = session.get('answers', {})
+    candidates = session_candidates(answers)
+    current = current_question(answers, candidates)
+
+    if current is None:
+        # Every question that could still change the outcome has been answered
+        return render_template("redirect.html", endpoint=finish_session(answers))
 
     if request.method == 'POST':
         value = request.form.get('option')
-        if not value:
-            return render_template('question.html', question=questions[q_index], error="Please select an option.")
-        
-        attribute = questions[q_index]['attribute']
-        answers[attribute] = value
-        session['answers'] = answers
-        session['q_index'] = q_index + 1
-        
-        logger.info(f"User selected {attribute}={value}, now have answers: {answers}")
-
-        # Try to get a recommendation after 3 questions (early recommendation)
-        if len(answers) >= 4:  # Location + 3 criteria
-            reco = get_prolog_recommendation(answers)
-            if reco:
-                session['recommendation'] = reco
-                return render_template("redirect.html", endpoint="recommendation")
-        
-        # If we've gone through all questions and still no recommendation, show no results
-        if q_index >= len(questions) - 1:
-            # Try one last time with all criteria
-            reco = get_prolog_recommendation(answers)
-            if reco:
-                session['recommendation'] = reco
-                return render_template("redirect.html", endpoint="recommendation")
-            return render_template("redirect.html", endpoint="no_results")
-        
-        return render_template("redirect.html", endpoint="question")
-
-    if q_index >= len(questions):
-        # If we've gone through all questions, try one final time for a recommendation
-        reco = get_prolog_recommendation(answers)
-        if reco:
-            session['recommendation'] = reco
-            return render_template("redirect.html", endpoint="recommendation")
-        return render_template("redirect.html", endpoint="no_results")
+        if value not in current['options']:
+            return render_template('question.html', question=current, error="Please select an option.",
+                                   remaining=count_bits(candidates), steps=question_steps(answers, candidates))
+        return render_template("redirect.html", endpoint=answer_question(current, value))
 
-    return render_template('question.html', question=questions[q_index])
+    return render_template('question.html', question=current,
+                           remaining=count_bits(candidates), steps=question_steps(answers, candidates))
 
 @app.route('/recommendation')
 def recommendation():
     reco = session.get('recommendation')
-    if reco:
-        return render_template('recommendation.html', restaurant=reco)
+    alternatives = session_alternatives()
+    if reco or alternatives:
+        return render_template('recommendation.html', restaurant=restaurant_info(reco) if reco else None,
+                               alternatives=alternatives)
     return render_template('no_results.html', message="Sorry, we couldn't find a match.")
 
 @app.route('/previous_question')
 def previous_question():
     """Go back to the previous question."""
-    q_index = session.get('q_index', 0)
-    
-    # If we're already at the first question, redirect to the start
-    if q_index <= 1:
-        return render_template("redirect.html", endpoint="question")
-    
-    # Otherwise decrement the question index
-    session['q_index'] = q_index - 1
-    
-    # Remove the last answer from the answers dictionary
-    answers = session.get('answers', {})
-    if q_index > 0 and len(questions) >= q_index - 1:
-        attribute = questions[q_index - 1]['attribute']
-        if attribute in answers:
-            del answers[attribute]
-            session['answers'] = answers
-    
+    undo_answer()
     return render_template("redirect.html", endpoint="question")
 
+# JSON API: each call returns the next step in one response, so the
+# client-side flow in base.html needs no redirect round trips
+
+def api_state(endpoint):
+    """JSON body describing the step the session is at"""
+    if endpoint == "question":
+        answers = session.get('answers', {})
+        candidates = session_candidates(answers)
+        current = current_question(answers, candidates)
+        if current is not None:
+            return {
+                'status': 'question',
+                'question': {
+                    'attribute': current['attribute'],
+                    'text': current['text'],
+                    'options': current['options'],
+                },
+                'step': session.get('q_index', 0),
+                'steps': question_steps(answers, candidates),
+                'remaining': count_bits(candidates),
+            }
+        endpoint = finish_session(answers)
+    if endpoint == "recommendation":
+        return dict(status='recommendation', **api_recommendation_body())
+    return {
+        'status': 'no_results',
+        'message': "Sorry, we couldn't find a restaurant matching all your criteria.",
+        'explanation': explain(session.get('answers', {})),
+    }
+
+def api_recommendation_body():
+    reco = session.get('recommendation')
+    return {'restaurant': restaurant_info(reco) if reco else None, 'alternatives': session_alternatives()}
+
+def api_error(message, status=400):
+    return jsonify({'status': 'error', 'error': message}), status
+
+@app.route('/api/session', methods=['POST'])
+def api_session():
+    """Start a session; body {"location": "yes"} when the user is in SF"""
+    data = request.get_json(silent=True) or {}
+    endpoint = start_session(data.get('location') == 'yes')
+    if endpoint is None:
+        return jsonify({'status': 'unsupported', 'message': "Sorry, we only support SF for now."})
+    return jsonify(api_state(endpoint))
+
+@app.route('/api/answer', methods=['POST', 'DELETE'])
+def api_answer():
+    """
+    POST {"option": value} answers the current question, DELETE takes the
+    last answer back. Both return the next step.
+    """
+    if 'answers' not in session:
+        return api_error("No session; POST /api/session first", 409)
+
+    if request.method == 'DELETE':
+        undo_answer()
+        return jsonify(api_state("question"))
+
+    answers = session['answers']
+    current = current_question(answers, session_candidates(answers))
+    if current is None:
+        return api_error("All questions have been answered", 409)
+    value = (request.get_json(silent=True) or {}).get('option')
+    if value not in current['options']:
+        return api_error(f"option must be one of {', '.join(current['options'])}")
+    return jsonify(api_state(answer_question(current, value)))
+
+@app.route('/api/recommendation')
+def api_recommendation():
+    """
+    The recommendation and alternatives of a finished session; with
+    ?explain=1 also why each restaurant did or did not match
+    """
+    if not session.get('recommendation') and not session.get('alternatives'):
+        return api_error("No recommendation yet", 404)
+    body = api_recommendation_body()
+    if request.args.get('explain', type=int):
+        body['explanation'] = explain(session.get('answers', {}))
+    return jsonify(body)
+
+@app.route('/api/recommend/batch', methods=['POST'])
+def api_recommend_batch():
+    """
+    Bulk evaluation: the body is NDJSON, one answers object per line, and
+    the response streams one {"line", "recommendation"} object per input
+    line, in order, as each chunk of lines is evaluated.
+    """
+    def parse(line):
+        try:
+            answers = json.loads(line)
+        except ValueError as e:
+            return None, f"Invalid JSON: {e}"
+        if not isinstance(answers, dict) or not all(isinstance(value, str) for value in answers.values()):
+            return None, "Expected an object of attribute: value strings"
+        return answers, None
+
+    # (line number, error) for every line recommend_batch has read ahead
+    pending = deque()
+
+    def valid_profiles():
+        for number, line in enumerate(request.stream, 1):
+            if not line.strip():
+                continue
+            answers, error = parse(line)
+            pending.append((number, error))
+            if error is None:
+                yield answers
+
+    def error_line(number, error):
+        return json.dumps({'line': number, 'error': error}) + "\n"
+
+    def generate():
+        for recommendation in recommend_batch(valid_profiles()):
+            number, error = pending.popleft()
+            while error is not None:
+                yield error_line(number, error)
+                number, error = pending.popleft()
+            yield json.dumps({'line': number, 'recommendation': recommendation}) + "\n"
+        for number, error in pending:
+            yield error_line(number, error)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/no_results')
 def no_results():
     return render_template('no_results.html', message="Sorry, we couldn't find a restaurant matching all your criteria.")
@@ -429,115 +662,63 @@ def no_results():
 def debug():
     """Display current session data for debugging."""
     debug_data = {
+        'backend': INFERENCE_BACKEND,
         'answers': session.get('answers', {}),
+        'inferred': session.get('inferred', {}),
         'q_index': session.get('q_index', 0),
-        'recommendation': session.get('recommendation', None)
+        'candidates': current_kb().rule_index.names_for(session_candidates(session.get('answers', {}))),
+        'recommendation': session.get('recommendation', None),
+        'cache': recommendation_cache.stats(),
+        'sessions': session_store.stats() if session_store else {'backend': 'cookie'},
+        'prolog_lock': prolog_lock.stats(),
+        'kb': kb_reloader.stats()
     }
     
-    # Also run a prolog test with the current answers
+    # What the current answers match, and why the other restaurants fail,
+    # from the index rather than another query under prolog_lock
     answers = session.get('answers', {})
     if answers:
-        with prolog_lock:
-            if load_kb():
-                for key, val in answers.items():
-                    prolog.assertz(f"known(yes, {key}, {val})")
-                
-                results = list(prolog.query("restaurant(X)"))
-                debug_data['prolog_results'] = results
+        explanation = explain(answers)
+        debug_data['results'] = [entry['id'] for entry in explanation if entry['matched']]
+        debug_data['explanation'] = explanation
     
     return jsonify(debug_data)
 
+def run_test_cases():
+    """Run test_cases.json against the backends in ?backends=, timed over ?rounds="""
+    names = request.args.get('backends')
+    backends = test_harness.app_backends(sys.modules[__name__], names.split(',') if names else None)
+    rounds = min(request.args.get('rounds', test_harness.DEFAULT_ROUNDS, type=int), 1000)
+    return test_harness.run_suite(test_harness.load_cases(), backends, rounds)
+
 @app.route('/test_cases')
 def test_cases():
     """Run predefined test cases to verify system functionality."""
-    test_cases = [
-        {
-            'name': "Test 1: Breakfast at Tratto",
-            'answers': {
-                'location': 'san_francisco',
-                'meal_type': 'breakfast',
-                'cuisine': 'italian',
-                'diet': 'vegetarian',
-                'price': 'expensive',
-                'atmosphere': 'upscale',
-                'distance': 'walking_distance',
-                'service_style': 'dine_in',
-                'group_size': 'small_group',
-                'noise': 'quiet'
-            },
-            'expected': 'Tratto'
-        },
-        {
-            'name': "Test 2: Lunch at Raavi",
-            'answers': {
-                'location': 'san_francisco',
-                'meal_type': 'lunch',
-                'cuisine': 'indian',
-                'diet': 'halal',
-                'price': 'affordable',
-                'atmosphere': 'casual',
-                'distance': 'walking_distance',
-                'service_style': 'dine_in',
-                'group_size': 'small_group',
-                'noise': 'moderate'
-            },
-            'expected': 'Raavi North Indian Cuisine'
-        },
-        {
-            'name': "Test 3: Quick Vegan Lunch at Mr. Charlie's",
-            'answers': {
-                'location': 'san_francisco',
-                'meal_type': 'lunch',
-                'cuisine': 'american',
-                'diet': 'vegan',
-                'price': 'affordable',
-                'atmosphere': 'casual',
-                'distance': 'walking_distance',
-                'service_style': 'quick_bite',
-                'group_size': 'solo',
-                'noise': 'lively'
-            },
-            'expected': "Mr. Charlie's"
-        },
-        {
-            'name': "Test 4: Upscale Seafood Dinner",
-            'answers': {
-                'location': 'san_francisco',
-                'meal_type': 'dinner',
-                'cuisine': 'seafood',
-                'diet': 'standard',
-                'price': 'expensive',
-                'atmosphere': 'upscale',
-                'distance': 'bart_required',
-                'service_style': 'dine_in',
-                'group_size': 'small_group',
-                'noise': 'moderate'
-            },
-            'expected': "Scoma's Restaurant"
-        }
-    ]
-    
-    results = []
-    for test in test_cases:
-        # Use the same get_prolog_recommendation function that the app uses
-        reco = get_prolog_recommendation(test['answers'])
-        
-        if reco:
-            actual = reco.split(':')[0].strip()
-            passed = test['expected'] in actual
-        else:
-            actual = "No result"
-            passed = False
-        
-        results.append({
-            'name': test['name'],
-            'expected': test['expected'],
-            'actual': actual,
-            'passed': passed
-        })
-    
-    return render_template('test_results.html', results=results)
+    try:
+        results = run_test_cases()
+    except ValueError as e:
+        return render_template('no_results.html', message=str(e)), 400
+    for result in results:
+        stats = test_harness.timing_stats(result['timings'])
+        result['median_ms'] = stats['median'] * 1000 if stats else None
+        result['expected_name'] = catalog.display_name(result['expected']) if result['expected'] else "No result"
+        result['actual_name'] = catalog.display_name(result['actual']) if result['actual'] else "No result"
+    return render_template('test_results.html', results=results, summary=test_harness.summarize(results))
+
+@app.route('/api/test_cases')
+def api_test_cases():
+    """The test case report as pytest-benchmark style JSON"""
+    try:
+        results = run_test_cases()
+    except ValueError as e:
+        return api_error(str(e), 400)
+    report = test_harness.benchmark_json(results)
+    report['summary'] = test_harness.summarize(results)
+    return jsonify(report)
 
 if __name__ == "__main__":
-    # Disable threaded mode to prevent segmentation faults
-    app.run(debug=False, host="0.0.0.0", port=5000, threaded=False, use_reloader=False)
\ No newline at end of file
+    if INFERENCE_BACKEND == "pool":
+        get_prolog_pool()
+    # Only the in-process prolog backend touches SWI-Prolog from request
+    # threads; keep it single-threaded to prevent segmentation faults
+    app.run(debug=False, host="0.0.0.0", port=5000, threaded=INFERENCE_BACKEND != "prolog", use_reloader=False)
\ No newline at end of file
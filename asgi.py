@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+ASGI entry point.
+Serves the Flask app from an asyncio server. Requests are read and answered
+on the event loop, while the Flask handlers, where all inference happens,
+run on a bounded thread pool, so a slow Prolog query only holds up its own
+session. Once every worker is busy and ASGI_QUEUE_SIZE requests are already
+waiting, further requests get an immediate 503 instead of piling up.
+Neither body is buffered whole: the handler reads the request body chunk by
+chunk as the client sends it, and each chunk of the response is sent as soon
+as the WSGI iterable yields it.
+
+Run with: uvicorn asgi:app --host 0.0.0.0 --port 5000
+      or: python asgi.py
+"""
+
+import io
+import os
+import sys
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app as flask_app, INFERENCE_BACKEND, PROLOG_POOL_SIZE, get_prolog_pool
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# The in-process Prolog engine answers one query at a time anyway; the pool
+# answers one per worker process; the rule index is limited by the CPU
+if INFERENCE_BACKEND == "prolog":
+    DEFAULT_WORKERS = 1
+elif INFERENCE_BACKEND == "pool":
+    DEFAULT_WORKERS = PROLOG_POOL_SIZE
+else:
+    DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+ASGI_WORKERS = int(os.environ.get("ASGI_WORKERS", DEFAULT_WORKERS))
+ASGI_QUEUE_SIZE = int(os.environ.get("ASGI_QUEUE_SIZE", "64"))
+
+class ReceiveStream(io.RawIOBase):
+    """
+    Request body for a WSGI handler running in a worker thread.
+
+    Each chunk is fetched from the ASGI receive() channel on the event loop
+    only when the handler asks for more; a disconnect reads as end of body.
+    """
+
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.chunk = b''
+        self.more = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.chunk and self.more:
+            message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+            if message['type'] == 'http.disconnect':
+                self.more = False
+                break
+            self.chunk = message.get('body', b'')
+            self.more = message.get('more_body', False)
+        count = min(len(buffer), len(self.chunk))
+        buffer[:count] = self.chunk[:count]
+        self.chunk = self.chunk[count:]
+        return count
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI http scope; body is a readable binary stream"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f"HTTP_{name}"
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+class ExecutorApp:
+    """
+    ASGI application running a WSGI app on a bounded thread pool.
+
+    At most workers + queue_size requests are accepted at once; the count
+    is only touched on the event loop, so it needs no lock.
+    """
+
+    def __init__(self, wsgi_app, workers=ASGI_WORKERS, queue_size=ASGI_QUEUE_SIZE):
+        self.wsgi_app = wsgi_app
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="inference")
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']!r}")
+
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            logger.warning(f"Rejecting {scope['method']} {scope['path']}: {self.in_flight} requests in flight")
+            await self.respond(send, 503, [(b'content-type', b'text/plain'), (b'retry-after', b'1')],
+                               b"Server busy, please retry shortly\n")
+            return
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            body = io.BufferedReader(ReceiveStream(receive, loop))
+            environ = build_environ(scope, body)
+            status, headers, result, chunks, first = await loop.run_in_executor(self.executor, self.call_wsgi,
+                                                                                environ)
+            try:
+                await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+                chunk = first
+                while chunk is not None:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                    chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+                await send({'type': 'http.response.body', 'body': b''})
+            finally:
+                if hasattr(result, 'close'):
+                    await loop.run_in_executor(self.executor, result.close)
+        finally:
+            self.in_flight -= 1
+
+    def call_wsgi(self, environ):
+        """
+        Start the WSGI app in a worker thread.
+
+        Returns (status, headers, result, iterator, first chunk); the caller
+        closes result once the body is sent. The first chunk is read here
+        because an app may call start_response only once it starts iterating;
+        it is None when the body is empty.
+        """
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin1'), value.encode('latin1'))
+                                   for name, value in headers]
+
+        result = self.wsgi_app(environ, start_response)
+        chunks = iter(result)
+        try:
+            first = next(chunks, None)
+        except BaseException:
+            if hasattr(result, 'close'):
+                result.close()
+            raise
+        return response['status'], response['headers'], result, chunks, first
+
+    @staticmethod
+    async def respond(send, status, headers, content):
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': content})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if INFERENCE_BACKEND == "pool":
+                    # Start the Prolog workers before the first request
+                    await asyncio.get_running_loop().run_in_executor(self.executor, get_prolog_pool)
+                logger.info(f"Serving with {self.workers} inference threads, "
+                            f"{self.capacity - self.workers} queued requests at most")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+app = ExecutorApp(flask_app)
+registry.callback("recommender_asgi_in_flight", "Requests running or queued for the inference pool", "gauge",
+                  lambda: app.in_flight)
+registry.callback("recommender_asgi_rejected_total", "Requests answered 503 because the pool was full", "counter",
+                  lambda: app.rejected)
+
+if __name__ == "__main__":
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("The ASGI mode needs an ASGI server: pip install uvicorn")
+    uvicorn.run(app, host="0.0.0.0", port=5000)
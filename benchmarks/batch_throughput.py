@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark batch matching throughput.
+Matches batches of 1 to 1e6 random answer profiles, some of them partial,
+and reports profiles per second for each matcher:
+
+    match_mask     RuleIndex.match_mask, one profile at a time
+    match_masks    RuleIndex.match_masks, column-wise over the batch
+    matrix         MatrixMatcher.match_lists, encoding the answer dicts
+    matrix-codes   MatrixMatcher.match_matrix on pre-encoded codes, e.g.
+                   session answer vectors
+    scores         MatrixMatcher.scores on pre-encoded codes
+
+The per-profile Python matchers stop at --python-limit profiles.
+
+Usage: python benchmarks/batch_throughput.py [--sizes 1,10,100,1000,10000,100000,1000000] [--kb kb.pl]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kb_parser import KB_PATH
+from matrix_matcher import MatrixMatcher
+
+METHODS = ('match_mask', 'match_masks', 'matrix', 'matrix-codes', 'scores')
+
+def random_profiles(index, count, seed):
+    """count answer dicts drawn from a pool of at most 10000 distinct ones"""
+    rng = random.Random(seed)
+    distinct = []
+    for _ in range(min(count, 10000)):
+        answers = {}
+        for attribute in index.attributes():
+            if rng.random() < 0.9:
+                answers[attribute] = rng.choice(index.domain(attribute))
+        distinct.append(answers)
+    return [distinct[i % len(distinct)] for i in range(count)]
+
+def timed(function, repeat):
+    """Best of repeat runs, in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1,10,100,1000,10000,100000,1000000',
+                        help="comma-separated batch sizes")
+    parser.add_argument('--kb', default=KB_PATH, help="knowledge base, e.g. one from generate_kb.py")
+    parser.add_argument('--python-limit', type=int, default=100000,
+                        help="largest batch for the per-profile matchers")
+    parser.add_argument('--seed', type=int, default=152)
+    args = parser.parse_args()
+
+    matcher = MatrixMatcher.from_file(args.kb)
+    index = matcher.index
+    print(f"{len(matcher.names)} restaurants, {matcher.unknown_row + 1} answer rows; profiles/s")
+    print(f"{'batch':>9} " + " ".join(f"{method:>13}" for method in METHODS))
+    for size in [int(n) for n in args.sizes.split(',')]:
+        profiles = random_profiles(index, size, args.seed)
+        codes = matcher.encode(profiles)
+        repeat = max(1, min(100, 10000 // size))
+        runs = {
+            'match_mask': lambda: [index.match_mask(answers) for answers in profiles],
+            'match_masks': lambda: index.match_masks(profiles),
+            'matrix': lambda: matcher.match_lists(profiles),
+            'matrix-codes': lambda: matcher.match_matrix(codes),
+            'scores': lambda: matcher.scores(codes),
+        }
+        cells = []
+        for method in METHODS:
+            if method in ('match_mask', 'match_masks') and size > args.python_limit:
+                cells.append(f"{'-':>13}")
+                continue
+            cells.append(f"{size / timed(runs[method], repeat):>13,.0f}")
+        print(f"{size:>9} " + " ".join(cells))
+
+if __name__ == "__main__":
+    main()
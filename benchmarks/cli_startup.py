@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark CLI cold start.
+Starts recommender.py in fresh interpreters and reports wall-clock times:
+until the first interactive prompt, for a scripted --answers run answered
+from the exact-match table, and for a scripted run that needs Prolog
+(RECOMMENDER_BACKEND=prolog with a profile the table does not cover, which
+starts the engine). Starting Python alone and starting SWI-Prolog alone are
+measured as reference points.
+
+Usage: python benchmarks/cli_startup.py [--runs 10]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(ROOT, "recommender.py")
+
+# Answered from the exact-match table, and one it does not cover
+EXACT_PROFILE = ("meal_type=breakfast,cuisine=italian,diet=vegetarian,price=expensive,atmosphere=upscale,"
+                 "distance=walking_distance,service_style=dine_in,group_size=small_group,noise=quiet")
+PARTIAL_PROFILE = "meal_type=lunch,diet=halal"
+
+PROMPT = b"Enter your choice"
+
+def run_command(command, env=None):
+    """Seconds until command exits"""
+    start = time.perf_counter()
+    subprocess.run(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+    return time.perf_counter() - start
+
+def time_to_prompt(env=None):
+    """Seconds until the interactive CLI asks its first question"""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, CLI], cwd=ROOT, env=env, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b""
+    while PROMPT not in output:
+        chunk = os.read(process.stdout.fileno(), 4096)
+        if not chunk:
+            break
+        output += chunk
+    elapsed = time.perf_counter() - start
+    process.communicate(b"q\n")
+    if PROMPT not in output:
+        raise RuntimeError("recommender.py exited before its first prompt")
+    return elapsed
+
+def prolog_available():
+    try:
+        import pyswip  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def report(label, measure, runs):
+    times = [measure() for _ in range(runs)]
+    print(f"{label:<44} {min(times) * 1000:>8.1f} {statistics.median(times) * 1000:>8.1f} "
+          f"{max(times) * 1000:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help="cold starts per measurement")
+    args = parser.parse_args()
+
+    prolog_env = dict(os.environ, RECOMMENDER_BACKEND="prolog")
+    print(f"{'ms, over ' + str(args.runs) + ' runs':<44} {'min':>8} {'median':>8} {'max':>8}")
+    report("python -c pass", lambda: run_command([sys.executable, "-c", "pass"]), args.runs)
+    report("interactive, until the first prompt", time_to_prompt, args.runs)
+    report("--answers, exact-match table",
+           lambda: run_command([sys.executable, CLI, "--answers", EXACT_PROFILE]), args.runs)
+    if prolog_available():
+        report("--answers, prolog backend, table miss",
+               lambda: run_command([sys.executable, CLI, "--answers", PARTIAL_PROFILE], prolog_env), args.runs)
+        report("starting SWI-Prolog alone",
+               lambda: run_command([sys.executable, "-c", "import pyswip; pyswip.Prolog()"]), args.runs)
+    else:
+        print("pyswip is not installed; skipping the Prolog measurements")
+
+if __name__ == "__main__":
+    main()
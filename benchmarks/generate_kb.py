@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic knowledge bases.
+Writes kb.pl with its restaurant/1 rules replaced by `count` random ones of
+the same shape: every askable tested once, some as disjunctions such as
+(meal_type(lunch); meal_type(dinner)). The fact-table form of the same
+restaurants (see kb_facts.py) is written next to it with --facts.
+
+Usage: python benchmarks/generate_kb.py 10000 [--output kb_10k.pl] [--facts kb_10k_facts.pl]
+"""
+
+import os
+import sys
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kb_parser import KB_PATH, Term
+from kb_facts import split_rules, format_tables
+from rule_index import compile_rules
+
+# How often a generated test accepts 1, 2 or 3 values
+GROUP_SIZES = (1, 1, 1, 1, 1, 1, 2, 2, 2, 3)
+
+def generate_tables(askables, count, seed):
+    """(restaurant, {attribute: accepted values}) for count random restaurants"""
+    rng = random.Random(seed)
+    menus = [(askable.attribute, askable.options) for askable in askables.values() if askable.options]
+    width = len(str(count))
+    tables = []
+    for i in range(count):
+        accepted = {'location': ['san_francisco']}
+        for attribute, options in menus:
+            size = min(rng.choice(GROUP_SIZES), len(options))
+            picked = set(rng.sample(options, size))
+            accepted[attribute] = [option for option in options if option in picked]
+        tables.append((f"restaurant_{i:0{width}d}", accepted))
+    return tables
+
+def format_rule(name, accepted, predicates):
+    """restaurant(Name) :- one test, or a disjunction of tests, per attribute"""
+    goals = []
+    for attribute, values in accepted.items():
+        tests = [repr(Term(predicates[attribute], (Term(value, ()),))) for value in values]
+        goals.append(tests[0] if len(tests) == 1 else f"({'; '.join(tests)})")
+    return f"restaurant({Term(name, ())!r}):- {', '.join(goals)}."
+
+def generate_kb(count, seed=152, kb_path=KB_PATH):
+    """(rule KB text, fact-table KB text, tables) for count restaurants"""
+    with open(kb_path, "r") as f:
+        kb_content = f.read()
+    header, rule_clauses, askables = split_rules(kb_content)
+    predicates = {askable.attribute: askable.predicate for askable in askables.values()}
+    # Rules that are not one of the restaurants, e.g. restaurant(ask_others)
+    negated = [kb_content[clause.start:clause.end].strip()
+               for clause, rule in zip(rule_clauses, compile_rules(rule_clauses, askables)) if rule.negations]
+
+    tables = generate_tables(askables, count, seed)
+    rules = [format_rule(name, accepted, predicates) for name, accepted in tables]
+    rule_kb = header + "\n\n" + "\n".join(rules + negated) + "\n"
+    fact_kb = header + "\n\n" + format_tables(tables, negated)
+    return rule_kb, fact_kb, tables
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('count', type=int, help="number of restaurants")
+    parser.add_argument('--output', help="rule KB path (default: kb_<count>.pl)")
+    parser.add_argument('--facts', help="also write the fact-table KB here")
+    parser.add_argument('--seed', type=int, default=152)
+    args = parser.parse_args()
+
+    rule_kb, fact_kb, _ = generate_kb(args.count, args.seed)
+    output = args.output or f"kb_{args.count}.pl"
+    with open(output, "w") as f:
+        f.write(rule_kb)
+    print(f"Wrote {args.count} restaurant rules to {output}")
+    if args.facts:
+        with open(args.facts, "w") as f:
+            f.write(fact_kb)
+        print(f"Wrote their fact tables to {args.facts}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark the KB at scale.
+Generates KBs of 1k, 10k and 100k restaurants, in rule and fact-table form,
+and for each inference path reports load time, memory and per-query
+latency over random full answer profiles, half of them built to match a
+restaurant. Each measurement runs in a fresh process, so SWI-Prolog never
+holds two KBs at once.
+
+    index          the compiled RuleIndex over the rule KB
+    prolog-rules   SWI-Prolog over per-restaurant restaurant/1 rules
+    prolog-facts   SWI-Prolog over attr/3 fact tables (kb_facts.py)
+
+Usage: python benchmarks/kb_scale.py [--sizes 1000,10000,100000] [--backends index,prolog-rules,prolog-facts]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats import percentile
+
+BACKENDS = ('index', 'prolog-rules', 'prolog-facts')
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def random_profiles(tables, count, seed):
+    """Full answer profiles; every other one picks its answers from a restaurant"""
+    from rule_index import RuleIndex
+
+    index = RuleIndex.from_file()
+    attributes = [attribute for attribute in index.attributes() if attribute != 'location']
+    rng = random.Random(seed)
+    profiles = []
+    for i in range(count):
+        answers = {'location': 'san_francisco'}
+        accepted = rng.choice(tables)[1] if i % 2 else {}
+        for attribute in attributes:
+            answers[attribute] = rng.choice(accepted.get(attribute) or index.domain(attribute))
+        profiles.append(answers)
+    return profiles
+
+def measure(backend, kb_path, profiles):
+    """Load kb_path with backend and time every profile; runs in a child process"""
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if backend == 'index':
+        from rule_index import RuleIndex
+
+        index = RuleIndex.from_file(kb_path)
+        query = index.matches
+    else:
+        from kb_manager import KnowledgeBase
+
+        knowledge_base = KnowledgeBase(kb_path)
+        knowledge_base.load()
+        query = knowledge_base.query
+    load = time.perf_counter() - start
+    memory = peak_rss_mb() - baseline
+
+    latencies = []
+    matched = 0
+    for answers in profiles:
+        start = time.perf_counter()
+        matched += bool(query(answers))
+        latencies.append(time.perf_counter() - start)
+    return {
+        'load': load,
+        'memory': memory,
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'matched': matched,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000', help="comma-separated restaurant counts")
+    parser.add_argument('--backends', default=','.join(BACKENDS), help="comma-separated inference paths")
+    parser.add_argument('--queries', type=int, default=1000, help="profiles per index measurement")
+    parser.add_argument('--prolog-queries', type=int, default=200, help="profiles per Prolog measurement")
+    parser.add_argument('--seed', type=int, default=152)
+    parser.add_argument('--measure', nargs=3, metavar=('BACKEND', 'KB', 'PROFILES'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        backend, kb_path, profiles_path = args.measure
+        with open(profiles_path) as f:
+            profiles = json.load(f)
+        print(json.dumps(measure(backend, kb_path, profiles)))
+        return
+
+    from generate_kb import generate_kb
+
+    backends = args.backends.split(',')
+    print(f"{'restaurants':>11} {'backend':>13} {'load s':>8} {'memory MB':>10} "
+          f"{'p50 ms':>9} {'p99 ms':>9} {'matched':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in [int(n) for n in args.sizes.split(',')]:
+            rule_kb, fact_kb, tables = generate_kb(size, args.seed)
+            paths = {
+                'index': os.path.join(workdir, f"kb_{size}.pl"),
+                'prolog-rules': os.path.join(workdir, f"kb_{size}.pl"),
+                'prolog-facts': os.path.join(workdir, f"kb_{size}_facts.pl"),
+            }
+            with open(paths['prolog-rules'], "w") as f:
+                f.write(rule_kb)
+            with open(paths['prolog-facts'], "w") as f:
+                f.write(fact_kb)
+
+            for backend in backends:
+                count = args.queries if backend == 'index' else args.prolog_queries
+                profiles_path = os.path.join(workdir, "profiles.json")
+                with open(profiles_path, "w") as f:
+                    json.dump(random_profiles(tables, count, args.seed), f)
+                result = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--measure', backend, paths[backend], profiles_path],
+                    capture_output=True, text=True,
+                )
+                if result.returncode:
+                    print(f"{size:>11} {backend:>13} failed: {result.stderr.strip().splitlines()[-1:]}")
+                    continue
+                stats = json.loads(result.stdout.strip().splitlines()[-1])
+                print(f"{size:>11} {backend:>13} {stats['load']:>8.2f} {stats['memory']:>10.1f} "
+                      f"{stats['p50'] * 1000:>9.3f} {stats['p99'] * 1000:>9.3f} {stats['matched']:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Load-test a running web app over HTTP.
+Concurrent clients each walk full sessions through the JSON API, answering
+at random, and the script reports request throughput, latency and how many
+requests the server turned away with a 503. Start the server first, e.g.
+
+    RECOMMENDER_BACKEND=prolog python app.py            # single-threaded
+    RECOMMENDER_BACKEND=pool uvicorn asgi:app --port 5000
+
+Usage: python benchmarks/load_test.py [--url http://127.0.0.1:5000] [--clients 1,8,32]
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from http.cookiejar import CookieJar
+
+from stats import percentile
+
+class Client:
+    """One browser: its own cookie jar, so each client has its own session"""
+
+    def __init__(self, url, timeout):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+    def call(self, method, path, body):
+        request = urllib.request.Request(self.url + path, data=json.dumps(body).encode(), method=method,
+                                         headers={'Content-Type': 'application/json'})
+        with self.opener.open(request, timeout=self.timeout) as response:
+            return json.load(response)
+
+def run_client(client, sessions, rng, latencies, counts, lock):
+    for _ in range(sessions):
+        path, body = '/api/session', {'location': 'yes'}
+        while True:
+            start = time.perf_counter()
+            try:
+                state = client.call('POST', path, body)
+            except urllib.error.HTTPError as e:
+                outcome = 'rejected' if e.code == 503 else 'failed'
+                state = None
+            except OSError:
+                outcome, state = 'failed', None
+            else:
+                outcome = 'ok'
+            elapsed = time.perf_counter() - start
+            with lock:
+                counts[outcome] += 1
+                if outcome == 'ok':
+                    latencies.append(elapsed)
+            # A rejected or failed request abandons the session
+            if state is None or state['status'] != 'question':
+                break
+            path, body = '/api/answer', {'option': rng.choice(state['question']['options'])}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--clients', default='1,8,32', help="comma-separated concurrency levels")
+    parser.add_argument('--sessions', type=int, default=20, help="sessions per client")
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=152)
+    args = parser.parse_args()
+
+    print(f"{'clients':>8} {'requests/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'rejected':>9} {'failed':>7}")
+    for clients in [int(n) for n in args.clients.split(',')]:
+        latencies = []
+        counts = {'ok': 0, 'rejected': 0, 'failed': 0}
+        lock = threading.Lock()
+        threads = [
+            threading.Thread(target=run_client, args=(Client(args.url, args.timeout), args.sessions,
+                                                      random.Random(args.seed + i), latencies, counts, lock))
+            for i in range(clients)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        print(f"{clients:>8} {counts['ok'] / elapsed:>11.1f} {percentile(latencies, 50) * 1000:>8.2f} "
+              f"{percentile(latencies, 99) * 1000:>8.2f} {counts['rejected']:>9} {counts['failed']:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Stress prolog_lock with concurrent sessions.
+Imports the web app in-process with the chosen backend and the
+recommendation cache off, so every recommendation reaches inference. Client
+threads each walk full sessions through the JSON API, answering at random,
+and check /debug after every session. For each concurrency level it reports
+sessions per second, request latency and prolog_lock contention: wait time,
+hold time and queue depth per call site.
+
+With --verify, the threads then query find_restaurants directly with random
+full profiles and compare every result with the rule index, which catches a
+lock-free replacement that lets concurrent queries see each other's facts.
+
+Usage: python benchmarks/lock_contention.py [--backend prolog] [--clients 1,4,16] [--sessions 20] [--verify]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats import percentile
+
+def run_sessions(app, sessions, rng, latencies, lock):
+    client = app.app.test_client()
+    for _ in range(sessions):
+        requests = [('/api/session', {'location': 'yes'})]
+        while requests:
+            path, body = requests.pop()
+            start = time.perf_counter()
+            state = client.post(path, json=body).get_json()
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+            if state and state['status'] == 'question':
+                requests.append(('/api/answer', {'option': rng.choice(state['question']['options'])}))
+        start = time.perf_counter()
+        client.get('/debug')
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+def run_verify(app, queries, rng, mismatches, lock):
+    rule_index = app.current_kb().rule_index
+    attributes = rule_index.attributes()
+    for _ in range(queries):
+        answers = {attribute: rng.choice(rule_index.domain(attribute)) for attribute in attributes}
+        # Mostly matching profiles, so wrong answers show up as wrong names
+        if rng.random() < 0.5:
+            rule = rng.choice(rule_index.rules)
+            answers.update((group[0][0], rng.choice(group)[1]) for group in rule.groups)
+        expected = rule_index.matches(answers)
+        actual = app.find_restaurants(answers)
+        if actual != expected:
+            with lock:
+                mismatches.append((answers, expected, actual))
+
+def drive(work, clients, seed):
+    """Run work(rng) on clients threads, each with its own seeded rng; return seconds taken"""
+    threads = [threading.Thread(target=work, args=(random.Random(seed + i),)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+def print_lock_stats(stats):
+    sites = stats['sites']
+    if not sites:
+        print("    prolog_lock was not used by this backend")
+        return
+    for site, site_stats in sites.items():
+        print(f"    {site:<32} {site_stats['acquisitions']:>8} {site_stats['contended']:>9} "
+              f"{site_stats['wait_ms_avg']:>9.3f} {site_stats['wait_ms_max']:>9.3f} "
+              f"{site_stats['hold_ms_avg']:>9.3f} {site_stats['max_queue_depth']:>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backend', default='prolog', help="RECOMMENDER_BACKEND to import the app with")
+    parser.add_argument('--clients', default='1,4,16', help="comma-separated concurrency levels")
+    parser.add_argument('--sessions', type=int, default=20, help="sessions per client")
+    parser.add_argument('--verify', action='store_true', help="also check concurrent results against the rule index")
+    parser.add_argument('--queries', type=int, default=200, help="verification queries per client")
+    parser.add_argument('--seed', type=int, default=152)
+    args = parser.parse_args()
+
+    os.environ['RECOMMENDER_BACKEND'] = args.backend
+    os.environ['RECOMMENDATION_CACHE_SIZE'] = '0'
+    os.environ.setdefault('LOCK_SUMMARY_INTERVAL', '3600')
+    import app
+
+    if args.backend == 'pool':
+        app.get_prolog_pool()
+    failed = False
+    for clients in [int(n) for n in args.clients.split(',')]:
+        app.prolog_lock.reset()
+        latencies = []
+        lock = threading.Lock()
+        elapsed = drive(lambda rng: run_sessions(app, args.sessions, rng, latencies, lock), clients, args.seed)
+        print(f"{clients:>3} clients: {clients * args.sessions / elapsed:.1f} sessions/s, "
+              f"p50 {percentile(latencies, 50) * 1000:.2f} ms, p99 {percentile(latencies, 99) * 1000:.2f} ms")
+        print(f"    {'call site':<32} {'acquired':>8} {'contended':>9} {'wait avg':>9} {'wait max':>9} "
+              f"{'hold avg':>9} {'queue':>6}")
+        print_lock_stats(app.prolog_lock.stats())
+
+        if args.verify:
+            mismatches = []
+            drive(lambda rng: run_verify(app, args.queries, rng, mismatches, lock), clients, args.seed)
+            print(f"    verify: {clients * args.queries - len(mismatches)}/{clients * args.queries} "
+                  f"concurrent queries agree with the rule index")
+            for answers, expected, actual in mismatches[:3]:
+                print(f"      {answers}: expected {expected}, got {actual}")
+            failed = failed or bool(mismatches)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
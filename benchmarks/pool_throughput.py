@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Load-test the Prolog worker pool.
+For each pool size, drives random answer profiles from concurrent client
+threads and reports throughput, so you can see how recommendations scale
+with the number of worker processes.
+
+Usage: python benchmarks/pool_throughput.py [--workers 1,2,4,8] [--queries N]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prolog_pool import PrologPool
+from rule_index import RuleIndex
+
+def random_profiles(count, seed):
+    index = RuleIndex.from_file()
+    attributes = [attribute for attribute in index.attributes() if attribute != 'location']
+    rng = random.Random(seed)
+    profiles = []
+    for _ in range(count):
+        answers = {'location': 'san_francisco'}
+        for attribute in attributes:
+            answers[attribute] = rng.choice(index.domain(attribute))
+        profiles.append(answers)
+    return profiles
+
+def drive(pool, profiles, clients):
+    """Run every profile through the pool from `clients` threads; return seconds taken"""
+    chunks = [profiles[i::clients] for i in range(clients)]
+    errors = []
+
+    def client(chunk):
+        for answers in chunk:
+            try:
+                pool.query(answers)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=client, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        print(f"  {len(errors)} queries failed, first: {errors[0]}")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    default_workers = sorted({1, 2, 4, os.cpu_count() or 1})
+    parser.add_argument('--workers', default=','.join(str(n) for n in default_workers),
+                        help="comma-separated pool sizes to test")
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--clients-per-worker', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=152)
+    args = parser.parse_args()
+
+    profiles = random_profiles(args.queries, args.seed)
+    print(f"{'workers':>8} {'clients':>8} {'queries/s':>12} {'restarts':>9}")
+    for size in [int(n) for n in args.workers.split(',')]:
+        pool = PrologPool(size)
+        try:
+            drive(pool, profiles[:size], size)  # warm up every worker
+            clients = size * args.clients_per_worker
+            elapsed = drive(pool, profiles, clients)
+            print(f"{size:>8} {clients:>8} {len(profiles) / elapsed:>12.1f} {pool.restarts:>9}")
+        finally:
+            pool.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Report the average number of questions asked per session.
+Simulates users who pick every answer uniformly at random and replays the
+/question flow (including the early recommendation) under each question
+ordering strategy.
+
+Usage: python benchmarks/question_count.py [--sessions N]
+"""
+
+import os
+import sys
+import random
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import questions
+from rule_index import RuleIndex
+from question_scheduler import next_question, STRATEGIES
+
+rule_index = RuleIndex.from_file()
+
+def simulate(strategy, rng):
+    """Run one session; return the number of questions the user answered"""
+    answers = {'location': 'san_francisco'}
+    candidates = rule_index.candidates(answers)
+    asked = 0
+    question, inferred = next_question(rule_index, questions, answers, candidates, strategy)
+    while question is not None:
+        value = rng.choice(question['options'])
+        candidates = rule_index.candidates({question['attribute']: value}, candidates)
+        answers[question['attribute']] = value
+        asked += 1
+        question, more = next_question(rule_index, questions, {**inferred, **answers}, candidates, strategy)
+        inferred.update(more)
+        if len(answers) >= 4 and rule_index.exact_mask({**inferred, **answers}, candidates):
+            break
+    return asked
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=152)
+    args = parser.parse_args()
+
+    print(f"{'strategy':>18} {'avg questions':>14}  distribution")
+    for strategy in STRATEGIES:
+        rng = random.Random(args.seed)
+        counts = Counter(simulate(strategy, rng) for _ in range(args.sessions))
+        average = sum(n * count for n, count in counts.items()) / args.sessions
+        distribution = ' '.join(f"{n}:{counts[n]}" for n in sorted(counts))
+        print(f"{strategy:>18} {average:>14.2f}  {distribution}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark /question latency.
+Replays random full answer profiles through the final POST of /question and
+reports p50/p99 latency. Each session is seeded through the JSON API in the
+order the question scheduler asks, up to the question that ends it. Run with --reload-per-query to reproduce the old
+behaviour of re-consulting kb.pl on every Prolog fallback.
+
+Usage: python benchmarks/question_latency.py [--requests N] [--reload-per-query]
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as web_app
+from stats import percentile
+
+def random_profile(rng):
+    answers = {'location': 'san_francisco'}
+    for question in web_app.questions:
+        answers[question['attribute']] = rng.choice(question['options'])
+    return answers
+
+def answer_until(client, answers, count=None):
+    """
+    Start a session and answer the scheduler's questions from answers, at
+    most count of them; returns the attributes asked and the last API state
+    """
+    state = client.post('/api/session', json={'location': 'yes'}).get_json()
+    asked = []
+    while state['status'] == 'question' and (count is None or len(asked) < count):
+        attribute = state['question']['attribute']
+        asked.append(attribute)
+        state = client.post('/api/answer', json={'option': answers[attribute]}).get_json()
+    return asked, state
+
+def run(requests, seed):
+    rng = random.Random(seed)
+    client = web_app.app.test_client()
+    # The redirect pages a finished session gets instead of another question
+    finished = ('0;url=/recommendation"', '0;url=/no_results"')
+    timings = []
+
+    for _ in range(requests):
+        answers = random_profile(rng)
+        # A dry run finds the question that ends this profile's session
+        asked, _ = answer_until(client, answers)
+        web_app.recommendation_cache.clear()
+        _, state = answer_until(client, answers, len(asked) - 1)
+        assert state['status'] == 'question' and state['question']['attribute'] == asked[-1], state
+
+        start = time.perf_counter()
+        response = client.post('/question', data={'option': answers[asked[-1]]})
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+        body = response.get_data(as_text=True)
+        assert any(url in body for url in finished), "the final answer did not finish the session"
+
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=152)
+    parser.add_argument('--reload-per-query', action='store_true',
+                        help="re-consult the KB before every query (pre-lifecycle behaviour)")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    # Most random profiles match nothing; one warning per request is noise here
+    web_app.hot_path_logger.setLevel(logging.ERROR)
+
+    if args.reload_per_query:
+        kb = web_app.knowledge_base
+        query = kb.query
+
+        def reloading_query(answers):
+            kb.reload()
+            return query(answers)
+
+        kb.query = reloading_query
+
+    timings = run(args.requests, args.seed)
+    mode = "reload per query" if args.reload_per_query else "consult once"
+    print(f"/question ({mode}), {len(timings)} requests")
+    print(f"  p50: {percentile(timings, 50) * 1000:.3f} ms")
+    print(f"  p99: {percentile(timings, 99) * 1000:.3f} ms")
+
+if __name__ == "__main__":
+    main()
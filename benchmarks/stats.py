@@ -0,0 +1,13 @@
+"""
+Summary statistics shared by the benchmark scripts.
+"""
+
+import math
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples, pct from 0 to 100; nan if empty"""
+    if not samples:
+        return float('nan')
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Atomic writes for the derived caches (catalog.bin, kb_transformed.pl).
+Each cache is written to a temporary file beside it and renamed into place,
+so a concurrent reader sees either the old file or the new one, never a
+partial write. Caches are an optimization: a checkout that cannot be written
+to just keeps recomputing them.
+"""
+
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+def save_cache(path, write, binary=False):
+    """
+    Have write(f) fill path atomically; a read-only checkout just skips it.
+    Returns whether the cache was written.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb" if binary else "w") as f:
+            write(f)
+        os.replace(tmp_path, path)
+        return True
+    except OSError as e:
+        logger.warning(f"Could not write the cache {path}: {e}")
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        return False
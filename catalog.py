@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Restaurant catalog.
+The questions, restaurant display names and map URLs shared by every front
+end, read from catalog.json. The first load checks the question menus
+against the askables in kb.pl and pickles the result to catalog.bin; later
+loads unpickle it directly for as long as neither file changes.
+
+Run this module to rebuild the cache: python catalog.py
+"""
+
+import os
+import sys
+import json
+import pickle
+import hashlib
+import logging
+
+from kb_parser import KB_PATH, read_clauses
+from rule_index import find_askables
+from cache_file import save_cache
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog.json")
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog.bin")
+CACHE_VERSION = 1
+
+class CatalogError(ValueError):
+    pass
+
+def sources_digest(catalog_path, kb_path):
+    """sha256 over the catalog and the KB its menus are checked against"""
+    digest = hashlib.sha256()
+    for path in (catalog_path, kb_path):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+class Catalog:
+    """
+    Questions in asking order, as {'attribute', 'text', 'options'} dicts,
+    and display names and URLs keyed by restaurant id.
+    """
+
+    def __init__(self, questions, restaurants):
+        self.questions = questions
+        self.restaurants = restaurants
+        self.questions_by_attribute = {question['attribute']: question for question in questions}
+        self.restaurant_names = {restaurant['id']: restaurant['name'] for restaurant in restaurants}
+        self.restaurant_urls = {restaurant['id']: restaurant.get('url', "") for restaurant in restaurants}
+
+    def display_name(self, name):
+        return self.restaurant_names.get(name, name.replace('_', ' ').title())
+
+    def url(self, name):
+        return self.restaurant_urls.get(name, "")
+
+    @classmethod
+    def from_source(cls, catalog_path=CATALOG_PATH, kb_path=KB_PATH):
+        """Parse catalog.json and check its menus agree with kb.pl"""
+        with open(catalog_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        try:
+            questions = [
+                {'text': q['text'], 'attribute': q['attribute'], 'options': list(q['options'])}
+                for q in data['questions']
+            ]
+            restaurants = [{'id': r['id'], 'name': r['name'], 'url': r.get('url', "")}
+                           for r in data['restaurants']]
+        except (KeyError, TypeError) as e:
+            raise CatalogError(f"{catalog_path}: malformed entry ({e!r})")
+
+        with open(kb_path, "r") as f:
+            askables = {askable.attribute: askable for askable in find_askables(read_clauses(f.read())).values()}
+        for question in questions:
+            askable = askables.get(question['attribute'])
+            if askable is None:
+                raise CatalogError(f"{question['attribute']} is not askable in {kb_path}")
+            if tuple(question['options']) != askable.options or question['text'] != askable.question:
+                raise CatalogError(f"The {question['attribute']} question in {catalog_path} "
+                                   f"does not match its menuask rule in {kb_path}")
+        return cls(questions, restaurants)
+
+    @classmethod
+    def load(cls, catalog_path=CATALOG_PATH, kb_path=KB_PATH, cache_path=CACHE_PATH):
+        """The cached catalog if it is current, else compile and cache it"""
+        digest = sources_digest(catalog_path, kb_path)
+        try:
+            with open(cache_path, "rb") as f:
+                version, cached_digest, questions, restaurants = pickle.load(f)
+            if version == CACHE_VERSION and cached_digest == digest:
+                return cls(questions, restaurants)
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+            pass
+
+        catalog = cls.from_source(catalog_path, kb_path)
+        catalog.save(cache_path, digest)
+        return catalog
+
+    def save(self, cache_path, digest):
+        """Cache this catalog, compiled from sources with this digest"""
+        save_cache(cache_path, lambda f: pickle.dump((CACHE_VERSION, digest, self.questions, self.restaurants), f,
+                                                     protocol=pickle.HIGHEST_PROTOCOL), binary=True)
+
+# Shared by the web app, the CLI and the GUIs
+catalog = Catalog.load()
+questions = catalog.questions
+questions_by_attribute = catalog.questions_by_attribute
+restaurant_names = catalog.restaurant_names
+restaurant_urls = catalog.restaurant_urls
+
+if __name__ == "__main__":
+    fresh = Catalog.from_source()
+    fresh.save(CACHE_PATH, sources_digest(CATALOG_PATH, KB_PATH))
+    print(f"Wrote {CACHE_PATH}: {len(fresh.questions)} questions, {len(fresh.restaurant_names)} restaurants")
+    sys.exit(0)
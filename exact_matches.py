@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Exact-match table.
+A hash table from complete answer profiles to the restaurant the KB
+recommends for them, i.e. the first restaurant/1 rule they satisfy. It is
+generated from the rules themselves, by expanding every rule into the
+answer tuples it accepts, plus the profiles pinned in test_cases.json, and
+every entry is checked against the compiled rules, so the table cannot
+disagree with kb.pl. A lookup is one dict access.
+
+Run this module to check the pinned results against kb.pl:
+python exact_matches.py
+"""
+
+import os
+import sys
+import json
+import math
+import logging
+import argparse
+import itertools
+
+from kb_parser import KB_PATH
+from rule_index import RuleIndex
+from recommendations import first_restaurant
+
+logger = logging.getLogger(__name__)
+
+PINNED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_cases.json")
+
+# Rules accepting more answer tuples than this are left to inference, and
+# expansion stops once the table holds EXACT_MATCH_LIMIT profiles
+MAX_TUPLES_PER_RULE = 4096
+EXACT_MATCH_LIMIT = int(os.environ.get("EXACT_MATCH_LIMIT", "100000"))
+
+def load_pinned(path=PINNED_PATH):
+    """(name, answers, expected restaurant or None) for every pinned profile"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [(case['name'], case['answers'], case.get('expected')) for case in json.load(f)['cases']]
+
+class ExactMatchTable:
+    def __init__(self, index, pinned=(), limit=EXACT_MATCH_LIMIT):
+        self.attributes = index.attributes()
+        self.entries = {}
+        # Pinned profiles whose expected restaurant the KB does not give:
+        # (name, expected, what the KB recommends)
+        self.disagreements = []
+
+        for rule in index.rules:
+            # Rules with negated tests, such as restaurant(ask_others), are
+            # not recommendations themselves
+            if rule.negations:
+                continue
+            if len(self.entries) >= limit:
+                logger.info(f"Exact-match table is full at {len(self.entries)} profiles")
+                break
+            accepted = {}
+            for group in rule.groups:
+                values = {value for _, value in group}
+                attribute = group[0][0]
+                if any(literal[0] != attribute for literal in group):
+                    break
+                accepted[attribute] = accepted[attribute] & values if attribute in accepted else values
+            else:
+                domains = [sorted(accepted.get(attribute, index.domain(attribute)))
+                           for attribute in self.attributes]
+                if math.prod(len(values) for values in domains) <= MAX_TUPLES_PER_RULE:
+                    self.add_all(index, [dict(zip(self.attributes, values))
+                                         for values in itertools.product(*domains)])
+
+        for name, answers, expected in pinned:
+            self.add_all(index, [answers])
+            actual = self.lookup(answers)
+            if actual != expected:
+                self.disagreements.append((name, expected, actual))
+
+    def key(self, answers):
+        """The attribute-ordered answer tuple, or None for unknown attributes"""
+        if any(attribute not in self.attributes for attribute in answers):
+            return None
+        return tuple(answers.get(attribute) for attribute in self.attributes)
+
+    def add_all(self, index, profiles):
+        """Store what the compiled rules recommend for each new profile"""
+        new = {}
+        for answers in profiles:
+            key = self.key(answers)
+            if key is not None and key not in self.entries:
+                new[key] = answers
+        for key, mask in zip(new, index.match_masks(new.values())):
+            self.entries[key] = first_restaurant(index.names_for(mask))
+
+    @classmethod
+    def from_file(cls, kb_path=KB_PATH, pinned_path=PINNED_PATH, index=None):
+        index = index or RuleIndex.from_file(kb_path)
+        pinned = load_pinned(pinned_path) if pinned_path and os.path.exists(pinned_path) else ()
+        table = cls(index, pinned)
+        for name, expected, actual in table.disagreements:
+            logger.error(f"Pinned result '{name}' expects {expected}, but {kb_path} recommends {actual}")
+        return table
+
+    def lookup(self, answers):
+        """The restaurant for a known profile, else None"""
+        key = self.key(answers)
+        return self.entries.get(key) if key is not None else None
+
+    def __len__(self):
+        return len(self.entries)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the exact-match table and check the pinned results")
+    parser.add_argument('--kb', default=KB_PATH, help="knowledge base to expand")
+    parser.add_argument('--pinned', default=PINNED_PATH, help="pinned profiles (default: test_cases.json)")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(message)s")
+    table = ExactMatchTable.from_file(args.kb, args.pinned)
+    recommended = sum(1 for name in table.entries.values() if name)
+    print(f"{len(table)} exact profiles, {recommended} with a recommendation")
+    return 1 if table.disagreements else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
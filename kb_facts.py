@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Fact-table KB representation.
+Rewrites the restaurant/1 rules of a KB as attr(Restaurant, Attribute, Value)
+facts and a single generic restaurant/1 rule. Instead of trying every rule
+in turn, a query walks the attr/3 facts of one answer through SWI-Prolog's
+JIT argument index and checks only the restaurants that offer it, so
+lookups stay sublinear as the number of restaurants grows.
+
+Every other clause of the KB is kept as written, so the result can be
+consulted, compiled into a RuleIndex and parity-checked like kb.pl:
+
+    python kb_facts.py --output kb_facts.pl
+    python rule_index.py --kb kb_facts.pl --check-parity
+"""
+
+import re
+import sys
+import argparse
+from collections import Counter
+
+from kb_parser import KB_PATH, Term, read_clauses, is_compound
+from rule_index import UnsupportedRuleError, find_askables, compile_rules
+
+# The generic rule: enumerate the restaurants accepting the answer to the
+# driver attribute through the attr/3 index, then check every attribute
+# they constrain
+GENERIC_RULE = """restaurant(R) :-
+    {candidates},
+    \\+ ( constrains(R, A), \\+ ( known(yes, A, V), attr(R, A, V) ) )."""
+
+def fact(name, *args):
+    return f"{Term(name, tuple(Term(arg, ()) for arg in args))!r}."
+
+def split_rules(kb_content):
+    """(text of every other clause, restaurant/1 clauses, askables) of a KB"""
+    clauses = read_clauses(kb_content)
+    kept = []
+    position = 0
+    rule_clauses = []
+    for clause in clauses:
+        if is_compound(clause.head, 'restaurant', 1):
+            kept.append(kb_content[position:clause.start])
+            position = clause.end
+            rule_clauses.append(clause)
+    kept.append(kb_content[position:])
+    header = re.sub(r"\n{3,}", "\n\n", ''.join(kept)).strip()
+    return header, rule_clauses, find_askables(clauses)
+
+def format_tables(tables, negated):
+    """
+    The generic rule, the negated rules and the facts for tables, a list of
+    (restaurant, {attribute: accepted values}) in clause order
+    """
+    # Drive the search from the attribute every restaurant constrains that
+    # has the most values, i.e. the most selective index
+    constrained = Counter(attribute for _, accepted in tables for attribute in accepted)
+    drivers = [attribute for attribute, count in constrained.items() if count == len(tables)]
+    if drivers:
+        driver = max(drivers, key=lambda attribute: len({value for _, accepted in tables
+                                                          for value in accepted[attribute]}))
+        candidates = f"known(yes, {Term(driver, ())!r}, D),\n    attr(R, {Term(driver, ())!r}, D)"
+    else:
+        candidates = "restaurant_id(R)"
+
+    lines = [
+        "% restaurant/1 as fact tables: restaurant_id/1 in clause order,",
+        "% constrains/2 for every attribute a restaurant tests and attr/3 for",
+        "% every value it accepts",
+        ":- discontiguous restaurant_id/1, constrains/2, attr/3.",
+        GENERIC_RULE.format(candidates=candidates),
+        *negated,
+        "",
+    ]
+    for name, accepted in tables:
+        lines.append(fact('restaurant_id', name))
+        for attribute, values in accepted.items():
+            lines.append(fact('constrains', name, attribute))
+            lines.extend(fact('attr', name, attribute, value) for value in values)
+    return "\n".join(lines) + "\n"
+
+def to_fact_table(kb_content):
+    """The KB text with its restaurant/1 rules replaced by fact tables"""
+    header, rule_clauses, askables = split_rules(kb_content)
+
+    # Only single-attribute groups fit a table; negated rules such as
+    # restaurant(ask_others) stay rules and follow the generic one
+    tables = []
+    negated = []
+    for clause, rule in zip(rule_clauses, compile_rules(rule_clauses, askables)):
+        if rule.negations:
+            if rule.groups:
+                raise UnsupportedRuleError(f"restaurant({rule.name}) mixes negated and positive tests")
+            negated.append(kb_content[clause.start:clause.end].strip())
+            continue
+        accepted = {}
+        for group in rule.groups:
+            attributes = {attribute for attribute, _ in group}
+            if len(attributes) > 1:
+                raise UnsupportedRuleError(f"restaurant({rule.name}) has a test across {sorted(attributes)}")
+            values = list(dict.fromkeys(value for _, value in group))
+            attribute = attributes.pop()
+            # Several tests on one attribute all have to pass
+            if attribute in accepted:
+                values = [value for value in accepted[attribute] if value in values]
+            accepted[attribute] = values
+        tables.append((rule.name, accepted))
+
+    return header + "\n\n" + format_tables(tables, negated)
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite restaurant/1 rules as attr/3 fact tables")
+    parser.add_argument('--kb', default=KB_PATH, help="knowledge base to convert")
+    parser.add_argument('--output', default='-', help="output file (default: stdout)")
+    args = parser.parse_args()
+
+    with open(args.kb, "r") as f:
+        converted = to_fact_table(f.read())
+    if args.output == '-':
+        sys.stdout.write(converted)
+    else:
+        with open(args.output, "w") as f:
+            f.write(converted)
+        print(f"Wrote {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
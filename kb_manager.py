@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Knowledge base lifecycle manager.
+Compiles the non-interactive version of kb.pl once per process and gives each
+query its own clean set of known/3 facts, so recommendations never re-read or
+re-consult the KB file. The non-interactive version is made by parsing the
+clauses and replacing the asking predicates, and is cached in
+kb_transformed.pl for as long as kb.pl is unchanged.
+
+The non-interactive KB can also be precompiled into a SWI-Prolog quick-load
+file, which every engine (the web app, the CLI and each pool worker) loads
+instead of rewriting and compiling the source, for as long as kb.pl is
+unchanged. Rebuild it whenever kb.pl changes:
+    python kb_manager.py build
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import logging
+from kb_parser import KB_PATH, String, Term, read_clauses
+from rule_index import find_askables
+from metrics import span, call_site, InstrumentedLock
+from cache_file import save_cache
+
+logger = logging.getLogger(__name__)
+
+QLF_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kb_compiled.qlf")
+# Bump whenever transform_kb changes what it generates, so older builds are ignored
+TRANSFORM_VERSION = 2
+
+# Predicates kb.pl uses to talk to the user, registered from Python
+FOREIGN_IO = {('read_py', 3), ('read_menu_py', 3), ('dialog_response', 1)}
+
+# Non-interactive definitions that replace every clause of kb.pl's asking
+# predicates. menuask/3 only receives the question text, so it maps each
+# question back to the attribute it defines (see menu_attribute/2);
+# otherwise noise(moderate) would also be satisfied by
+# known(yes, price, moderate).
+REPLACEMENTS = {
+    ('ask', 2): """% Simplified ask that just checks if the fact is known
+ask(A, V) :- known(yes, A, V).""",
+    ('menuask', 3): """% Simplified menuask that just checks if the fact is known for its attribute
+menuask(Q, V, _) :- menu_attribute(Q, A), known(yes, A, V).""",
+}
+
+# Whitespace and a comment after a clause's full stop, up to the end of the line
+TRAILING_COMMENT = re.compile(r"[ \t]*(%[^\n]*)?\n")
+
+# Control constructs whose arguments are goals
+CONTROL = {(',', 2), (';', 2), ('->', 2), ('*->', 2), ('\\+', 1)}
+
+# Transformed KBs by the sha256 of their source, in this process and on
+# disk for the next one (pool workers, the CLI)
+TRANSFORM_CACHE_SIZE = 4
+TRANSFORMED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kb_transformed.pl")
+_transformed = {}
+
+def body_goals(body):
+    """The goals called by a clause body, looking inside control constructs"""
+    if isinstance(body, Term) and body.indicator in CONTROL:
+        for arg in body.args:
+            yield from body_goals(arg)
+    else:
+        yield body
+
+def transform_kb(kb_content):
+    """
+    Rewrite kb.pl for non-interactive use: every clause of ask/2 and
+    menuask/3 is replaced by the definitions in REPLACEMENTS, written where
+    the predicate's first clause was, and any other predicate that calls
+    the user-facing foreign predicates is dropped. The rest of the source,
+    comments included, is kept as written. Raises ValueError if a kept
+    clause calls a dropped predicate.
+    """
+    clauses = read_clauses(kb_content)
+
+    def indicator(term):
+        return term.indicator if isinstance(term, Term) else None
+
+    interactive = set(REPLACEMENTS)
+    for clause in clauses:
+        if clause.head is not None and any(indicator(goal) in FOREIGN_IO for goal in body_goals(clause.body)):
+            interactive.add(indicator(clause.head))
+    dropped = interactive - set(REPLACEMENTS)
+    for clause in clauses:
+        if clause.head is None or indicator(clause.head) in interactive:
+            continue
+        for goal in body_goals(clause.body):
+            if indicator(goal) in dropped:
+                name, arity = indicator(clause.head)
+                raise ValueError(f"{name}/{arity} calls the interactive predicate {goal.name}/{len(goal.args)}")
+
+    menu_attributes = "\n".join(
+        f"menu_attribute({String(askable.question)!r}, {Term(askable.attribute, ())!r})."
+        for askable in find_askables(clauses).values()
+        if askable.question is not None
+    )
+    replacements = dict(REPLACEMENTS)
+    if menu_attributes:
+        replacements[('menuask', 3)] += "\n" + menu_attributes
+
+    # Cut the interactive clauses out of the source text
+    modified_kb = []
+    position = 0
+    for clause in clauses:
+        if clause.head is None or indicator(clause.head) not in interactive:
+            continue
+        modified_kb.append(kb_content[position:clause.start])
+        replacement = replacements.pop(indicator(clause.head), None)
+        if replacement is not None:
+            modified_kb.append(replacement + "\n")
+        # with the rest of its last line, when that is only a comment
+        trailing = TRAILING_COMMENT.match(kb_content, clause.end)
+        position = trailing.end() if trailing else clause.end
+    modified_kb.append(kb_content[position:])
+    # Asking predicates this KB does not define
+    for replacement in replacements.values():
+        modified_kb.append("\n" + replacement + "\n")
+    return "".join(modified_kb)
+
+def transformed_header(digest):
+    return f"% Non-interactive kb.pl (sha256 {digest}, transform {TRANSFORM_VERSION}); generated, do not edit\n"
+
+def read_transformed(path, digest):
+    """The cached transformation of the KB with this digest, else None"""
+    try:
+        with open(path, "r") as f:
+            if f.readline() != transformed_header(digest):
+                return None
+            return f.read()
+    except OSError:
+        return None
+
+def save_transformed(path, digest, modified):
+    """Cache the transformation of the KB with this digest"""
+    save_cache(path, lambda f: f.write(transformed_header(digest) + modified))
+
+def modify_kb(kb_content, cache_path=TRANSFORMED_PATH):
+    """The non-interactive KB, transformed once per version of kb.pl"""
+    digest = kb_sha256(kb_content)
+    modified = _transformed.get(digest)
+    if modified is None:
+        modified = read_transformed(cache_path, digest) if cache_path else None
+        if modified is None:
+            modified = transform_kb(kb_content)
+            if cache_path:
+                save_transformed(cache_path, digest, modified)
+        if len(_transformed) >= TRANSFORM_CACHE_SIZE:
+            _transformed.pop(next(iter(_transformed)), None)
+        _transformed[digest] = modified
+    return modified
+
+def new_prolog():
+    """
+    A pyswip engine. pyswip is only imported here, so transforming the KB
+    works without SWI-Prolog installed.
+    """
+    from pyswip import Prolog
+    return Prolog()
+
+def quote_atom(value):
+    """Quote a Python string as a Prolog atom so form input cannot inject goals"""
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+def kb_sha256(kb_content):
+    return hashlib.sha256(kb_content.encode("utf-8")).hexdigest()
+
+def qlf_info_path(qlf_path):
+    """The file next to a quick-load file recording what it was built from"""
+    return qlf_path + ".json"
+
+def quick_load_file(digest, qlf_path=QLF_PATH):
+    """
+    (quick-load file, source it was compiled from) if one was built from
+    the KB with this digest, else None
+    """
+    try:
+        with open(qlf_info_path(qlf_path), "r") as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (info.get('kb_sha256') != digest or info.get('transform') != TRANSFORM_VERSION
+            or not os.path.exists(qlf_path)):
+        return None
+    return qlf_path, info['source']
+
+def build_qlf(kb_path=KB_PATH, qlf_path=QLF_PATH, prolog=None):
+    """
+    Compile the non-interactive KB into a quick-load file with qcompile/1.
+    qcompile also loads the file, so use an engine that will not serve
+    queries from another KB. Returns the KB digest.
+    """
+    with open(kb_path, "r") as f:
+        kb = f.read()
+    prolog = prolog if prolog is not None else new_prolog()
+    build_dir = tempfile.mkdtemp(prefix="kb_qlf_")
+    try:
+        # qcompile writes <base>.qlf next to <base>.pl
+        base = os.path.splitext(os.path.basename(qlf_path))[0]
+        source = os.path.join(build_dir, base + ".pl")
+        with open(source, "w") as f:
+            f.write(modify_kb(kb))
+        list(prolog.query(f"qcompile({quote_atom(source)})"))
+        os.replace(os.path.join(build_dir, base + ".qlf"), qlf_path)
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+    digest = kb_sha256(kb)
+    info = {'kb_sha256': digest, 'transform': TRANSFORM_VERSION, 'source': source}
+    with open(qlf_info_path(qlf_path) + ".tmp", "w") as f:
+        json.dump(info, f)
+    os.replace(qlf_info_path(qlf_path) + ".tmp", qlf_info_path(qlf_path))
+    return digest
+
+class KnowledgeBase:
+    """
+    Owns the consulted KB for one Prolog engine.
+
+    The KB is loaded from the quick-load file when one was built from the
+    same KB text, else the modified KB is written to a single file that
+    lives as long as this object. A reload from a different file first
+    unloads the clauses of the previous one, so SWI-Prolog never holds two
+    copies of restaurant/1.
+    """
+
+    def __init__(self, kb_path=KB_PATH, prolog=None, lock=None, qlf_path=QLF_PATH):
+        self.kb_path = kb_path
+        self.prolog = prolog if prolog is not None else new_prolog()
+        self.lock = lock if lock is not None else threading.Lock()
+        self.qlf_path = qlf_path
+        self.compiled_path = None
+        # The source file the loaded clauses belong to
+        self.source = None
+        self.loaded = False
+        # KB text schedule_reload left for the next load() or query()
+        self.pending = None
+
+    def _compile(self, kb):
+        """Write the modified KB to this instance's compiled file"""
+        if self.compiled_path is None:
+            (fd, self.compiled_path) = tempfile.mkstemp(prefix="kb_", suffix=".pl", text=True)
+            os.close(fd)
+
+        with open(self.compiled_path, "w") as compiled_file:
+            compiled_file.write(modify_kb(kb))
+
+    def _load(self, path, source):
+        """Consult path, whose clauses belong to source, replacing the loaded KB"""
+        if self.source is not None and self.source != source:
+            list(self.prolog.query(f"unload_file({quote_atom(self.source)})"))
+        self.prolog.consult(path)
+        self.source = source
+
+    def _consult(self, kb=None):
+        """Load kb, by default read from kb_path, preferring a matching quick-load file"""
+        with span("kb_load"):
+            if kb is None:
+                with open(self.kb_path, "r") as f:
+                    kb = f.read()
+            quick_load = quick_load_file(kb_sha256(kb), self.qlf_path) if self.qlf_path else None
+            if quick_load is not None:
+                logger.info(f"Loading precompiled knowledge base from: {quick_load[0]}")
+                try:
+                    self._load(*quick_load)
+                except Exception as e:
+                    logger.warning(f"Ignoring unloadable {quick_load[0]}: {e}")
+                    quick_load = None
+            if quick_load is None:
+                logger.info(f"Consulting knowledge base from: {self.kb_path}")
+                self._compile(kb)
+                self._load(self.compiled_path, self.compiled_path)
+            self._clear_known()
+        self.loaded = True
+
+    def _clear_known(self):
+        list(self.prolog.query("retractall(known(_, _, _))"))
+
+    def _locked(self, site):
+        """
+        The lock for a with block. An InstrumentedLock credits the
+        acquisition to site, else to whoever called into this object, since
+        the function taking the lock is always one of the methods here.
+        """
+        if isinstance(self.lock, InstrumentedLock):
+            return self.lock.at(site or call_site(sys._getframe(2)))
+        return self.lock
+
+    def _consult_pending(self):
+        """With the lock held: consult a scheduled reload, or the KB if nothing is loaded yet"""
+        if self.pending is not None:
+            kb, self.pending = self.pending, None
+            self._consult(kb)
+        elif not self.loaded:
+            self._consult()
+
+    def load(self, site=None):
+        """Consult the KB if this engine has not done so yet"""
+        with self._locked(site):
+            self._consult_pending()
+        return True
+
+    def schedule_reload(self, kb_content, site=None):
+        """
+        Have the next load() or query() re-consult kb_content first. Unlike
+        reload() this never touches SWI-Prolog, so it is safe from a thread
+        other than the ones querying the engine.
+        """
+        with self._locked(site):
+            self.pending = kb_content
+
+    def reload(self, kb_content=None, site=None):
+        """
+        Re-consult the KB, e.g. after kb.pl has been edited. kb_content is
+        the KB text to consult instead of re-reading kb_path. Queries
+        already holding the lock finish on the old clauses.
+        """
+        with self._locked(site):
+            self._consult(kb_content)
+        return True
+
+    def query(self, answers, site=None):
+        """
+        Return the ids of all restaurants matching answers, in clause order.
+        The answers only exist as known/3 facts for the duration of the call.
+        site names the caller in the lock statistics.
+        """
+        with self._locked(site):
+            self._consult_pending()
+
+            self._clear_known()
+            try:
+                with span("assert"):
+                    for key, val in answers.items():
+                        self.prolog.assertz(f"known(yes, {quote_atom(key)}, {quote_atom(val)})")
+                with span("query"):
+                    return [str(r["X"]) for r in self.prolog.query("restaurant(X)")]
+            finally:
+                self._clear_known()
+
+    def close(self):
+        """Remove the compiled KB file"""
+        if self.compiled_path and os.path.exists(self.compiled_path):
+            os.unlink(self.compiled_path)
+        self.compiled_path = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompile the knowledge base into a quick-load file")
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--kb', default=KB_PATH, help="knowledge base to compile")
+    parser.add_argument('--output', default=QLF_PATH, help="quick-load file to write")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    digest = build_qlf(args.kb, args.output)
+    print(f"Wrote {args.output} ({os.path.getsize(args.output)} bytes) for {args.kb} "
+          f"(sha256 {digest[:12]}) in {time.perf_counter() - start:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,372 @@
+"""
+Minimal Prolog clause reader.
+Reads the subset of standard Prolog syntax used by kb.pl (atoms, variables,
+numbers, strings, lists, compound terms and the standard operator table)
+into plain Python terms, so the KB can be analysed without SWI-Prolog.
+"""
+
+import os
+import hashlib
+from collections import namedtuple
+
+KB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kb.pl")
+
+class Term(namedtuple('Term', ['name', 'args'])):
+    """A compound term; atoms are terms with no arguments"""
+    __slots__ = ()
+
+    @property
+    def indicator(self):
+        return (self.name, len(self.args))
+
+    def __repr__(self):
+        """Canonical Prolog syntax, e.g. ','(a, b)"""
+        if self.name == '.' and len(self.args) == 2:
+            items = []
+            term = self
+            while is_compound(term, '.', 2):
+                items.append(repr(term.args[0]))
+                term = term.args[1]
+            tail = '' if term == NIL else f"|{term!r}"
+            return f"[{', '.join(items)}{tail}]"
+        name = quote_name(self.name)
+        if not self.args:
+            return name
+        return f"{name}({', '.join(repr(arg) for arg in self.args)})"
+
+class Var(namedtuple('Var', ['name'])):
+    __slots__ = ()
+
+    def __repr__(self):
+        return self.name
+
+class String(namedtuple('String', ['value'])):
+    """A double-quoted string"""
+    __slots__ = ()
+
+    def __repr__(self):
+        return '"' + self.value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+class Clause(namedtuple('Clause', ['term', 'start', 'end'])):
+    """A clause with its character span in the source text"""
+    __slots__ = ()
+
+    @property
+    def is_directive(self):
+        return is_compound(self.term, ':-', 1)
+
+    @property
+    def head(self):
+        if is_compound(self.term, ':-', 2):
+            return self.term.args[0]
+        return None if self.is_directive else self.term
+
+    @property
+    def body(self):
+        if is_compound(self.term, ':-', 2):
+            return self.term.args[1]
+        return TRUE
+
+class PrologSyntaxError(ValueError):
+    pass
+
+NIL = Term('[]', ())
+TRUE = Term('true', ())
+
+# name -> (priority, type)
+PREFIX_OPS = {
+    ':-': (1200, 'fx'), '?-': (1200, 'fx'),
+    'dynamic': (1150, 'fx'), 'discontiguous': (1150, 'fx'), 'initialization': (1150, 'fx'),
+    'multifile': (1150, 'fx'), 'module_transparent': (1150, 'fx'), 'table': (1150, 'fx'),
+    '\\+': (900, 'fy'), '-': (200, 'fy'), '+': (200, 'fy'), '\\': (200, 'fy'),
+}
+
+INFIX_OPS = {
+    ':-': (1200, 'xfx'), '-->': (1200, 'xfx'),
+    ';': (1100, 'xfy'), '|': (1100, 'xfy'),
+    '->': (1050, 'xfy'), '*->': (1050, 'xfy'),
+    ',': (1000, 'xfy'),
+    '=': (700, 'xfx'), '\\=': (700, 'xfx'), '==': (700, 'xfx'), '\\==': (700, 'xfx'),
+    '@<': (700, 'xfx'), '@>': (700, 'xfx'), '@=<': (700, 'xfx'), '@>=': (700, 'xfx'),
+    '=..': (700, 'xfx'), 'is': (700, 'xfx'), '=:=': (700, 'xfx'), '=\\=': (700, 'xfx'),
+    '<': (700, 'xfx'), '>': (700, 'xfx'), '=<': (700, 'xfx'), '>=': (700, 'xfx'),
+    ':': (200, 'xfy'),
+    '+': (500, 'yfx'), '-': (500, 'yfx'), '/\\': (500, 'yfx'), '\\/': (500, 'yfx'),
+    '*': (400, 'yfx'), '/': (400, 'yfx'), '//': (400, 'yfx'), 'mod': (400, 'yfx'),
+    'rem': (400, 'yfx'), '<<': (400, 'yfx'), '>>': (400, 'yfx'),
+    '**': (200, 'xfx'), '^': (200, 'xfy'),
+}
+
+SYMBOL_CHARS = set('+-*/\\^<>=~:.?@#&$')
+SOLO_CHARS = set('!;')
+PUNCT_CHARS = set('()[]{},|')
+
+Token = namedtuple('Token', ['kind', 'value', 'pos', 'layout_before'])
+
+def quote_name(name):
+    """Quote an atom name unless it can be written bare"""
+    if name in ('[]', '!', ';', '{}'):
+        return name
+    if name and name[0].islower() and all(c.isalnum() or c == '_' for c in name):
+        return name
+    if name and all(c in SYMBOL_CHARS for c in name):
+        return name
+    return "'" + name.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+def is_compound(term, name, arity):
+    return isinstance(term, Term) and term.name == name and len(term.args) == arity
+
+def _read_quoted(text, i, quote):
+    """Read a quoted item starting after the opening quote; return (value, next index)"""
+    chars = []
+    escapes = {'n': '\n', 't': '\t', '\\': '\\', "'": "'", '"': '"', '`': '`', 'a': '\a',
+               'b': '\b', 'f': '\f', 'v': '\v', 'r': '\r', '0': '\0', 'e': '\x1b', 's': ' '}
+    while i < len(text):
+        c = text[i]
+        if c == quote:
+            if text[i + 1:i + 2] == quote:
+                chars.append(quote)
+                i += 2
+                continue
+            return ''.join(chars), i + 1
+        if c == '\\':
+            nxt = text[i + 1:i + 2]
+            if nxt == '\n':
+                i += 2
+                continue
+            if nxt in escapes:
+                chars.append(escapes[nxt])
+                i += 2
+                continue
+            raise PrologSyntaxError(f"Unknown escape \\{nxt} at offset {i}")
+        chars.append(c)
+        i += 1
+    raise PrologSyntaxError("Unterminated quoted item")
+
+def tokenize(text):
+    """Yield tokens; clause ends are reported as ('end', '.')"""
+    i = 0
+    n = len(text)
+    layout = True
+    while i < n:
+        c = text[i]
+        if c.isspace():
+            i += 1
+            layout = True
+            continue
+        if c == '%':
+            while i < n and text[i] != '\n':
+                i += 1
+            layout = True
+            continue
+        if c == '/' and text[i + 1:i + 2] == '*':
+            close = text.find('*/', i + 2)
+            if close < 0:
+                raise PrologSyntaxError("Unterminated block comment")
+            i = close + 2
+            layout = True
+            continue
+
+        start = i
+        if c.isdigit():
+            while i < n and (text[i].isdigit() or text[i] == '_'):
+                i += 1
+            if text[i:i + 1] == '.' and text[i + 1:i + 2].isdigit():
+                i += 1
+                while i < n and text[i].isdigit():
+                    i += 1
+                value = float(text[start:i])
+            else:
+                value = int(text[start:i].replace('_', ''))
+            yield Token('number', value, start, layout)
+        elif c == '_' or c.isupper():
+            while i < n and (text[i].isalnum() or text[i] == '_'):
+                i += 1
+            yield Token('var', text[start:i], start, layout)
+        elif c.isalpha():
+            while i < n and (text[i].isalnum() or text[i] == '_'):
+                i += 1
+            yield Token('atom', text[start:i], start, layout)
+        elif c == "'":
+            value, i = _read_quoted(text, i + 1, "'")
+            yield Token('qatom', value, start, layout)
+        elif c == '"':
+            value, i = _read_quoted(text, i + 1, '"')
+            yield Token('string', value, start, layout)
+        elif c == '.' and (i + 1 >= n or text[i + 1].isspace() or text[i + 1] == '%'):
+            i += 1
+            yield Token('end', '.', start, layout)
+        elif c in SYMBOL_CHARS:
+            while i < n and text[i] in SYMBOL_CHARS:
+                i += 1
+            yield Token('atom', text[start:i], start, layout)
+        elif c in SOLO_CHARS:
+            i += 1
+            yield Token('atom', c, start, layout)
+        elif c in PUNCT_CHARS:
+            i += 1
+            yield Token('punct', c, start, layout)
+        else:
+            raise PrologSyntaxError(f"Unexpected character {c!r} at offset {i}")
+        layout = False
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.i = 0
+
+    def peek(self, offset=0):
+        j = self.i + offset
+        return self.tokens[j] if j < len(self.tokens) else Token('eof', None, -1, True)
+
+    def next(self):
+        tok = self.peek()
+        self.i += 1
+        return tok
+
+    def expect(self, kind, value):
+        tok = self.next()
+        if tok.kind != kind or tok.value != value:
+            raise PrologSyntaxError(f"Expected {value!r} at offset {tok.pos}, got {tok.value!r}")
+        return tok
+
+    def _starts_term(self, tok):
+        if tok.kind in ('number', 'var', 'string', 'qatom'):
+            return True
+        if tok.kind == 'punct':
+            return tok.value in '([{'
+        if tok.kind == 'atom':
+            return tok.value not in INFIX_OPS or tok.value in PREFIX_OPS
+        return False
+
+    def _name_token(self, tok):
+        if tok.kind in ('atom', 'qatom'):
+            return tok.value
+        if tok.kind == 'punct' and tok.value in (',', '|'):
+            return tok.value
+        return None
+
+    def parse(self, max_prec=1200):
+        left, left_prec = self.parse_primary(max_prec)
+        while True:
+            tok = self.peek()
+            name = self._name_token(tok)
+            if name is None or name not in INFIX_OPS:
+                break
+            prec, kind = INFIX_OPS[name]
+            left_max = prec if kind == 'yfx' else prec - 1
+            right_max = prec if kind == 'xfy' else prec - 1
+            if prec > max_prec or left_prec > left_max:
+                break
+            self.next()
+            right, _ = self.parse(right_max)
+            left, left_prec = Term(';' if name == '|' else name, (left, right)), prec
+        return left, left_prec
+
+    def parse_arglist(self):
+        args = [self.parse(999)[0]]
+        while self.peek().kind == 'punct' and self.peek().value == ',':
+            self.next()
+            args.append(self.parse(999)[0])
+        return args
+
+    def parse_primary(self, max_prec):
+        tok = self.next()
+        if tok.kind == 'number':
+            return tok.value, 0
+        if tok.kind == 'var':
+            return Var(tok.value), 0
+        if tok.kind == 'string':
+            return String(tok.value), 0
+        if tok.kind == 'punct':
+            if tok.value == '(':
+                term, _ = self.parse(1200)
+                self.expect('punct', ')')
+                return term, 0
+            if tok.value == '[':
+                return self.parse_list(), 0
+            if tok.value == '{':
+                term, _ = self.parse(1200)
+                self.expect('punct', '}')
+                return Term('{}', (term,)), 0
+        if tok.kind in ('atom', 'qatom'):
+            name = tok.value
+            nxt = self.peek()
+            if nxt.kind == 'punct' and nxt.value == '(' and not nxt.layout_before:
+                self.next()
+                args = self.parse_arglist()
+                self.expect('punct', ')')
+                return Term(name, tuple(args)), 0
+            if tok.kind == 'atom' and name == '-' and nxt.kind == 'number' and not nxt.layout_before:
+                self.next()
+                return -nxt.value, 0
+            if tok.kind == 'atom' and name in PREFIX_OPS and self._starts_term(nxt):
+                prec, kind = PREFIX_OPS[name]
+                prec = min(prec, max_prec)
+                arg_max = prec if kind == 'fy' else prec - 1
+                arg, _ = self.parse(arg_max)
+                return Term(name, (arg,)), prec
+            return Term(name, ()), 0
+        raise PrologSyntaxError(f"Unexpected token {tok.value!r} at offset {tok.pos}")
+
+    def parse_list(self):
+        if self.peek().kind == 'punct' and self.peek().value == ']':
+            self.next()
+            return NIL
+        items = self.parse_arglist()
+        tail = NIL
+        if self.peek().kind == 'punct' and self.peek().value == '|':
+            self.next()
+            tail, _ = self.parse(999)
+        self.expect('punct', ']')
+        for item in reversed(items):
+            tail = Term('.', (item, tail))
+        return tail
+
+def read_clauses(text):
+    """Parse Prolog source text into a list of Clause objects"""
+    clauses = []
+    pending = []
+    for tok in tokenize(text):
+        if tok.kind != 'end':
+            pending.append(tok)
+            continue
+        if not pending:
+            raise PrologSyntaxError(f"Empty clause at offset {tok.pos}")
+        parser = _Parser(pending)
+        term, _ = parser.parse(1200)
+        if parser.peek().kind != 'eof':
+            raise PrologSyntaxError(f"Operator expected at offset {parser.peek().pos}")
+        clauses.append(Clause(term, pending[0].pos, tok.pos + 1))
+        pending = []
+    if pending:
+        raise PrologSyntaxError("Clause not terminated with a full stop")
+    return clauses
+
+def kb_digest(path=KB_PATH):
+    """SHA-256 of a KB file, used to tell whether derived artifacts are stale"""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def read_file(path):
+    with open(path, "r") as f:
+        return read_clauses(f.read())
+
+def list_items(term):
+    """Convert a Prolog list term to a Python list"""
+    items = []
+    while is_compound(term, '.', 2):
+        items.append(term.args[0])
+        term = term.args[1]
+    if term != NIL:
+        raise ValueError(f"Not a proper list: {term!r}")
+    return items
+
+def flatten(term, operator):
+    """Flatten a right-nested chain of a binary operator, e.g. a conjunction"""
+    items = []
+    while is_compound(term, operator, 2):
+        items.extend(flatten(term.args[0], operator))
+        term = term.args[1]
+    items.append(term)
+    return items
@@ -0,0 +1,185 @@
+"""
+Knowledge base hot reload.
+Watches kb.pl and, when its content changes, builds everything derived from
+it in a background thread: the rule index, the exact-match table, the
+matrix matcher when one is used and the lookup table when one was built for
+the new version. The new version must still give every profile in
+test_cases.json its expected restaurant, otherwise it is rejected and the
+old one keeps serving.
+
+A version is published by replacing a single reference to an immutable
+snapshot (copy-on-write), so requests that already took the old snapshot
+finish on it, new requests see the new one, and no request pays for
+checking or re-reading the KB.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+
+from kb_parser import KB_PATH
+from rule_index import RuleIndex
+from exact_matches import ExactMatchTable, PINNED_PATH, load_pinned
+from matrix_matcher import MatrixMatcher
+from lookup_table import LookupTable
+from metrics import registry, span
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of kb.pl; 0 turns hot reload off
+KB_WATCH_INTERVAL = float(os.environ.get("KB_WATCH_INTERVAL", "1.0"))
+
+kb_reloads = registry.counter(
+    "recommender_kb_reloads_total", "Attempted KB reloads, by outcome", ("outcome",))
+
+class InvalidKB(ValueError):
+    """A new KB version that failed validation"""
+
+class KBSnapshot(namedtuple('KBSnapshot', ['digest', 'content', 'rule_index', 'exact_matches',
+                                           'matrix_matcher', 'lookup_table', 'loaded_at'])):
+    """Everything derived from one version of the KB; never modified once built"""
+    __slots__ = ()
+
+    @property
+    def version(self):
+        """Short form of the digest, e.g. for sessions and cache keys"""
+        return self.digest[:12]
+
+def build_snapshot(content, kb_path=KB_PATH, matrix=False, pinned_path=PINNED_PATH, validate=True):
+    """
+    Compile KB text into a snapshot. With validate, a pinned profile that
+    the new rules do not recommend as expected raises InvalidKB.
+    """
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    index = RuleIndex.compile(content)
+    pinned = load_pinned(pinned_path) if pinned_path and os.path.exists(pinned_path) else ()
+    exact_matches = ExactMatchTable(index, pinned)
+    for name, expected, actual in exact_matches.disagreements:
+        message = f"Pinned result '{name}' expects {expected}, but {kb_path} recommends {actual}"
+        if validate:
+            raise InvalidKB(message)
+        logger.error(message)
+    return KBSnapshot(
+        digest=digest,
+        content=content,
+        rule_index=index,
+        exact_matches=exact_matches,
+        matrix_matcher=MatrixMatcher(index) if matrix else None,
+        lookup_table=LookupTable.open(kb_path=kb_path, kb_sha256=digest),
+        loaded_at=time.time(),
+    )
+
+class KBReloader:
+    """
+    Holds the current KBSnapshot and replaces it when kb.pl changes.
+
+    Listeners are called as listener(old, new) from the watcher thread after
+    each swap, for state that cannot be copied, such as a consulted Prolog
+    engine.
+    """
+
+    def __init__(self, kb_path=KB_PATH, matrix=False, pinned_path=PINNED_PATH, interval=KB_WATCH_INTERVAL):
+        self.kb_path = kb_path
+        self.matrix = matrix
+        self.pinned_path = pinned_path
+        self.interval = interval
+        self.listeners = []
+        self.reloads = 0
+        self.rejected = 0
+        self.last_error = None
+        self.check_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.start_lock = threading.Lock()
+        self.started = False
+        self.thread = None
+        self.mtime = os.stat(kb_path).st_mtime_ns
+        # The startup version is served even if a pinned result disagrees;
+        # there is nothing older to fall back to
+        self.current = build_snapshot(self._read(), kb_path, matrix, pinned_path, validate=False)
+        # Digest of the last version tried, so a rejected one is not rebuilt every interval
+        self.seen = self.current.digest
+
+    def _read(self):
+        with open(self.kb_path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def check(self):
+        """Reload if kb.pl has changed since the last check; True if a new version was published"""
+        with self.check_lock:
+            try:
+                mtime = os.stat(self.kb_path).st_mtime_ns
+            except OSError:
+                return False
+            if mtime == self.mtime:
+                return False
+            self.mtime = mtime
+            content = self._read()
+            if hashlib.sha256(content.encode("utf-8")).hexdigest() == self.seen:
+                return False
+            return self.reload(content)
+
+    def reload(self, content):
+        """Build, validate and publish a new version of the KB"""
+        old = self.current
+        try:
+            with span("kb_reload"):
+                new = build_snapshot(content, self.kb_path, self.matrix, self.pinned_path)
+        except Exception as e:
+            self.seen = hashlib.sha256(content.encode("utf-8")).hexdigest()
+            self.rejected += 1
+            self.last_error = str(e)
+            kb_reloads.inc(outcome="rejected")
+            logger.error(f"Keeping KB version {old.version}; the edited {self.kb_path} was rejected: {e}")
+            return False
+
+        self.seen = new.digest
+        self.current = new
+        self.reloads += 1
+        self.last_error = None
+        kb_reloads.inc(outcome="published")
+        logger.info(f"Published KB version {new.version} ({len(new.rule_index.rules)} rules), "
+                    f"replacing {old.version}")
+        for listener in self.listeners:
+            try:
+                listener(old, new)
+            except Exception as e:
+                logger.error(f"KB reload listener {listener.__name__} failed: {e}")
+        return True
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Checking {self.kb_path} for changes failed: {e}")
+
+    def start(self):
+        """Watch kb.pl from a daemon thread, unless the interval is 0"""
+        with self.start_lock:
+            if not self.started and self.interval > 0:
+                self.thread = threading.Thread(target=self.run, name="kb-reloader", daemon=True)
+                self.thread.start()
+            self.started = True
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def stats(self):
+        current = self.current
+        return {
+            'version': current.version,
+            'loaded_at': current.loaded_at,
+            'rules': len(current.rule_index.rules),
+            'lookup_table': current.lookup_table is not None,
+            'watching': self.thread is not None,
+            'reloads': self.reloads,
+            'rejected': self.rejected,
+            'last_error': self.last_error,
+        }
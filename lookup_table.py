@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Precomputed recommendation lookup table.
+Enumerates every subset of answers against the KB, whatever order the
+questions were asked in, and stores the matching rules as fixed-width
+bitmasks in a memory-mapped file, so a recommendation is one offset
+computation and one read. An entry's offset is the answers read as a
+mixed-radix number with one digit per attribute: 0 when unanswered, else
+1 + the value's position in the attribute's domain.
+
+Rebuild whenever kb.pl changes:
+    python lookup_table.py build [--backend prolog]
+"""
+
+import os
+import sys
+import json
+import mmap
+import struct
+import logging
+import argparse
+import itertools
+
+from kb_parser import KB_PATH, kb_digest
+from rule_index import RuleIndex, iter_bits
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kb_lookup.bin")
+
+MAGIC = b"SFLT"
+VERSION = 2
+# magic, version, header length
+PREAMBLE = struct.Struct("<4sHI")
+
+# Answers every table entry assumes; profiles outside SF never reach /question
+FIXED_ANSWERS = {'location': 'san_francisco'}
+
+# Entries evaluated together by the index
+BUILD_CHUNK_SIZE = 4096
+
+def build_table(index, attributes, path=LOOKUP_PATH, kb_path=KB_PATH, match=None):
+    """
+    Write the lookup table over the given attributes, the most significant
+    digit first. match(answers) returns the matching rule names; defaults
+    to the index. Returns the number of entries written.
+    """
+    domains = [list(index.domain(attribute)) for attribute in attributes]
+    width = max(1, (len(index.names) + 7) // 8)
+    bit_of = {}
+    for bit, name in enumerate(index.names):
+        bit_of.setdefault(name, bit)
+
+    header = json.dumps({
+        'kb_sha256': kb_digest(kb_path),
+        'attributes': list(attributes),
+        'domains': domains,
+        'fixed': FIXED_ANSWERS,
+        'names': index.names,
+        'width': width,
+    }).encode("utf-8")
+    # Keep the body 8-byte aligned
+    header += b" " * (-(PREAMBLE.size + len(header)) % 8)
+
+    def profiles():
+        # Every digit vector in offset order; None stands for unanswered
+        for values in itertools.product(*[[None] + domain for domain in domains]):
+            answers = dict(FIXED_ANSWERS)
+            answers.update((attribute, value) for attribute, value in zip(attributes, values) if value is not None)
+            yield answers
+
+    def masks(chunk):
+        if match is None:
+            return index.match_masks(chunk)
+        result = []
+        for answers in chunk:
+            mask = 0
+            for name in match(answers):
+                mask |= 1 << bit_of[name]
+            result.append(mask)
+        return result
+
+    entries = 0
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        all_profiles = profiles()
+        while True:
+            chunk = list(itertools.islice(all_profiles, BUILD_CHUNK_SIZE))
+            if not chunk:
+                break
+            f.write(b"".join(mask.to_bytes(width, "little") for mask in masks(chunk)))
+            entries += len(chunk)
+    os.replace(tmp_path, path)
+    return entries
+
+class LookupTable:
+    """Read-only view of a lookup table file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_len = PREAMBLE.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self.buffer.close()
+            raise ValueError(f"{path} is not a version {VERSION} lookup table")
+        header = json.loads(self.buffer[PREAMBLE.size:PREAMBLE.size + header_len])
+
+        self.body_offset = PREAMBLE.size + header_len
+        self.kb_sha256 = header['kb_sha256']
+        self.fixed = header['fixed']
+        self.names = header['names']
+        self.width = header['width']
+        # (attribute, {value: digit}, stride) per attribute, in offset order
+        self.layout = []
+        stride = self.width
+        for attribute, domain in reversed(list(zip(header['attributes'], header['domains']))):
+            digits = {value: digit for digit, value in enumerate(domain, 1)}
+            self.layout.append((attribute, digits, stride))
+            stride *= len(domain) + 1
+        self.layout.reverse()
+
+    @classmethod
+    def open(cls, path=LOOKUP_PATH, kb_path=KB_PATH, kb_sha256=None):
+        """
+        Open the table if it exists and was built from the current KB, else
+        None; kb_sha256 is the KB's digest, if the caller already has it
+        """
+        if not os.path.exists(path):
+            logger.info(f"No lookup table at {path}; run 'python lookup_table.py build'")
+            return None
+        try:
+            table = cls(path)
+        except (ValueError, OSError) as e:
+            logger.warning(f"Ignoring unreadable lookup table {path}: {e}")
+            return None
+        if table.kb_sha256 != (kb_sha256 or kb_digest(kb_path)):
+            logger.warning(f"Lookup table {path} is stale for {kb_path}; rebuild it")
+            table.close()
+            return None
+        return table
+
+    def lookup(self, answers):
+        """
+        Bitmask of matching rules, or None if answers hold an attribute or a
+        value the table was not built for
+        """
+        for attribute, value in self.fixed.items():
+            if answers.get(attribute) != value:
+                return None
+
+        start = self.body_offset
+        found = len(self.fixed)
+        for attribute, digits, stride in self.layout:
+            value = answers.get(attribute)
+            if value is not None:
+                digit = digits.get(value)
+                if digit is None:
+                    return None
+                start += digit * stride
+                found += 1
+        if found != len(answers):
+            return None
+        return int.from_bytes(self.buffer[start:start + self.width], "little")
+
+    def names_for(self, mask):
+        return [self.names[bit] for bit in iter_bits(mask)]
+
+    def close(self):
+        self.buffer.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the recommendation lookup table")
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--kb', default=KB_PATH, help="knowledge base to enumerate")
+    parser.add_argument('--output', default=LOOKUP_PATH)
+    parser.add_argument('--backend', choices=['index', 'prolog'], default='index',
+                        help="engine used to evaluate each answer prefix")
+    args = parser.parse_args()
+
+    from catalog import questions
+
+    index = RuleIndex.from_file(args.kb)
+    attributes = [question['attribute'] for question in questions]
+    match = None
+    if args.backend == 'prolog':
+        from kb_manager import KnowledgeBase
+        match = KnowledgeBase(args.kb).query
+
+    entries = build_table(index, attributes, args.output, args.kb, match)
+    print(f"Wrote {entries} entries ({os.path.getsize(args.output)} bytes) to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
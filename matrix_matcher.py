@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Matrix matcher.
+Compiles the rule index into a matrix with one row per (attribute, value)
+and one column per restaurant rule. A batch of answer profiles is encoded
+as one-hot rows, so matching N profiles against M restaurants, and counting
+how many tests each restaurant fails, is a single N x M matrix product
+instead of N walks over the rules.
+
+Run this module to check it against the rule index on every answer
+combination: python matrix_matcher.py --check
+"""
+
+import sys
+import argparse
+
+import numpy as np
+
+from kb_parser import KB_PATH
+from rule_index import RuleIndex, UnsupportedRuleError
+
+# Profiles per matrix product in match_matrix
+BLOCK_ROWS = 4096
+
+class MatrixMatcher:
+    """
+    Profiles are encoded as one small int per attribute, in the layout of
+    session_store.AnswerCodec: 0 when unanswered, 1 + the index of the
+    value in its domain, or -1 for a value outside the domain.
+
+    Every code selects one row of the rule matrix, whose columns hold, per
+    restaurant, the number of its tests accepting that answer, whether a
+    negated test rejects it, and for the unanswered rows the number of its
+    tests on that attribute. Summed over a profile's rows, that gives the
+    tests each restaurant passes and fails; it matches when it passes
+    every test and no negated one rejects the profile.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.names = index.names
+        if index.has_multi_attribute_slots:
+            raise UnsupportedRuleError("Tests across several attributes do not fit the matrix")
+
+        self.attributes = index.attributes()
+        for rule in index.rules:
+            for attribute, _ in [literal for group in rule.groups for literal in group] + list(rule.negations):
+                if attribute not in self.attributes:
+                    self.attributes.append(attribute)
+        self.domains = [index.domain(attribute) for attribute in self.attributes]
+        self.position = {attribute: i for i, attribute in enumerate(self.attributes)}
+        self.codes = [{value: code for code, value in enumerate(values, 1)} for values in self.domains]
+
+        # Rows: every (attribute, value), then one "unanswered" row per
+        # attribute, then an all-zero row for values outside the domains
+        rows = {}
+        for attribute, values in zip(self.attributes, self.domains):
+            for value in values:
+                rows[(attribute, value)] = len(rows)
+        unanswered = {attribute: len(rows) + i for i, attribute in enumerate(self.attributes)}
+        self.unknown_row = len(rows) + len(self.attributes)
+
+        # code + 1 -> row, per attribute, flattened with an offset per attribute
+        lookup = []
+        self.offsets = np.zeros(len(self.attributes), dtype=np.int64)
+        for i, (attribute, values) in enumerate(zip(self.attributes, self.domains)):
+            self.offsets[i] = len(lookup)
+            lookup.append(self.unknown_row)
+            lookup.append(unanswered[attribute])
+            lookup.extend(rows[(attribute, value)] for value in values)
+        self.lookup = np.array(lookup, dtype=np.int64)
+
+        count = len(index.rules)
+        matrix = np.zeros((self.unknown_row + 1, 3 * count), dtype=np.float32)
+        self.required = np.zeros(count, dtype=np.float32)
+        self.tests = np.zeros(count, dtype=np.float32)
+        for m, rule in enumerate(index.rules):
+            for group in rule.groups:
+                attribute = group[0][0]
+                # A group accepts an answer at most once
+                for value in dict.fromkeys(value for _, value in group):
+                    if (attribute, value) in rows:
+                        matrix[rows[(attribute, value)], m] += 1
+                matrix[unanswered[attribute], 2 * count + m] += 1
+            for literal in rule.negations:
+                if literal in rows:
+                    matrix[rows[literal], count + m] = 1
+            self.required[m] = len(rule.groups)
+            self.tests[m] = len(rule.groups) + len(rule.negations)
+        self.matrix = matrix
+
+        # Matching alone needs one column per restaurant: a rejecting answer
+        # outweighs every test it could pass, so only matches reach required
+        self.match_weights = matrix[:, :count] - (self.required + 1) * matrix[:, count:2 * count]
+
+    @classmethod
+    def from_file(cls, kb_path=KB_PATH):
+        return cls(RuleIndex.from_file(kb_path))
+
+    def encode(self, profiles):
+        """Answer dicts as an N x attributes array of codes"""
+        profiles = profiles if isinstance(profiles, list) else list(profiles)
+        codes = np.zeros((len(profiles), len(self.attributes)), dtype=np.int16)
+        for i, (attribute, value_codes) in enumerate(zip(self.attributes, self.codes)):
+            codes[:, i] = [value_codes.get(answers[attribute], -1) if attribute in answers else 0
+                           for answers in profiles]
+        return codes
+
+    def one_hot(self, codes):
+        """One row per profile with a 1 in the matrix row of every answer"""
+        codes = np.asarray(codes)
+        selected = self.lookup[self.offsets + codes.astype(np.int64) + 1]
+        encoded = np.zeros((len(codes), self.unknown_row + 1), dtype=np.float32)
+        np.put_along_axis(encoded, selected, 1.0, axis=1)
+        return encoded
+
+    def counts(self, codes):
+        """(tests passed, negated tests failed, tests unanswered), each N x M"""
+        product = self.one_hot(codes) @ self.matrix
+        count = len(self.names)
+        return product[:, :count], product[:, count:2 * count], product[:, 2 * count:]
+
+    def match_matrix(self, codes):
+        """N x M booleans: does profile n match restaurant m"""
+        codes = np.asarray(codes)
+        matched = np.empty((len(codes), len(self.names)), dtype=bool)
+        # In blocks of rows, so the float products stay in cache
+        for start in range(0, len(codes), BLOCK_ROWS):
+            block = slice(start, start + BLOCK_ROWS)
+            np.equal(self.one_hot(codes[block]) @ self.match_weights, self.required, out=matched[block])
+        return matched
+
+    def misses(self, codes, answered_only=False):
+        """
+        N x M count of the tests each restaurant fails, as in
+        RuleIndex.rank; with answered_only, tests on unanswered attributes
+        are not counted
+        """
+        passed, rejected, unanswered = self.counts(codes)
+        misses = self.required - passed + rejected
+        if answered_only:
+            misses -= unanswered
+        return misses.astype(np.int32)
+
+    def scores(self, codes, answered_only=False):
+        """N x M fraction of the tests each restaurant passes, its Match.score"""
+        misses = self.misses(codes, answered_only)
+        tests = np.where(self.tests > 0, self.tests, 1)
+        return np.where(self.tests > 0, 1.0 - misses / tests, 1.0)
+
+    def match_lists(self, profiles):
+        """Names of the restaurants matching each profile, in clause order"""
+        matched = self.match_matrix(self.encode(profiles))
+        # Matches are sparse: flatnonzero is far quicker than a 2-D nonzero
+        rows, columns = np.divmod(np.flatnonzero(matched), len(self.names))
+        names = [self.names[m] for m in columns.tolist()]
+        ends = np.cumsum(np.bincount(rows, minlength=len(matched))).tolist()
+        starts = [0] + ends[:-1]
+        return [names[start:end] for start, end in zip(starts, ends)]
+
+    def matches(self, answers):
+        """Names of all matching restaurants, like RuleIndex.matches"""
+        return self.match_lists([answers])[0]
+
+def check(matcher, progress=None):
+    """
+    Compare matches and partial-match misses with the rule index on every
+    answer prefix; return the profiles that disagree
+    """
+    index = matcher.index
+    profiles = list(index.answer_space())
+    codes = matcher.encode(profiles)
+    matched = matcher.match_matrix(codes)
+    misses = matcher.misses(codes, answered_only=True)
+    mismatches = []
+    for n, answers in enumerate(profiles):
+        expected = {match.name: match.misses
+                    for match in index.rank(answers, max_misses=len(index.slots) + len(index.excluded),
+                                            answered_only=True)}
+        if (index.names_for(index.match_mask(answers)) != [index.names[m] for m in np.flatnonzero(matched[n])]
+                or expected != dict(zip(index.names, misses[n].tolist()))):
+            mismatches.append(answers)
+        if progress and n % 10000 == 0:
+            progress(n, len(profiles))
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Match answer profiles with a restaurant matrix")
+    parser.add_argument('--kb', default=KB_PATH, help="knowledge base to compile")
+    parser.add_argument('--check', action='store_true', help="compare with the rule index on every answer combination")
+    args = parser.parse_args()
+
+    matcher = MatrixMatcher.from_file(args.kb)
+    print(f"{len(matcher.names)} restaurants x {matcher.unknown_row + 1} answer rows")
+    if args.check:
+        mismatches = check(matcher, progress=lambda n, total: print(f"  {n}/{total}", end="\r"))
+        print()
+        if mismatches:
+            print(f"{len(mismatches)} answer combinations disagree, e.g. {mismatches[0]}")
+            return 1
+        print("Matrix matcher agrees with the rule index on every answer combination")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+"""
+Request metrics.
+In-process counters and latency histograms, exported in the Prometheus text
+format on /metrics. span() times a block of work into one histogram labelled
+by stage (KB load, fact assertion, query, template render, ...), and
+InstrumentedLock records wait time, hold time and queue depth per call site
+for a lock such as prolog_lock.
+"""
+
+import sys
+import math
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from 50us to 10s
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+               for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+class Metric:
+    """A named family of samples, one per combination of label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        """(name suffix, labels dict, value) for every sample"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(labels)} {format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        if not self.labels and not values:
+            values[()] = 0
+        for key, value in values.items():
+            yield "", dict(zip(self.labels, key)), value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # One count per bucket and one above the last, then the sum
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[slot] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self.lock:
+            values = {key: list(counts) for key, counts in self.values.items()}
+        if not self.labels and not values:
+            values[()] = [0] * (len(self.buckets) + 1) + [0.0]
+        for key, counts in values.items():
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", {**labels, 'le': format_value(float(bound))}, cumulative
+            yield "_sum", labels, counts[-1]
+            yield "_count", labels, cumulative
+
+class Callback(Metric):
+    """
+    Samples read from elsewhere when /metrics is scraped, e.g. the hit
+    counts a cache keeps anyway; function returns a number, or a dict of
+    label value tuples to numbers
+    """
+
+    def __init__(self, name, documentation, kind, function, labels=()):
+        super().__init__(name, documentation, labels)
+        self.kind = kind
+        self.function = function
+
+    def samples(self):
+        values = self.function()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in values.items():
+            yield "", dict(zip(self.labels, key)), value
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def callback(self, name, documentation, kind, function, labels=()):
+        return self.register(Callback(name, documentation, kind, function, labels))
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+span_seconds = registry.histogram(
+    "recommender_span_seconds", "Time spent in each stage of handling a request", ("span",))
+
+@contextmanager
+def span(name):
+    """Time a stage into recommender_span_seconds{span=name}"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        span_seconds.observe(elapsed, span=name)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("span=%s seconds=%.6f", name, elapsed)
+
+lock_wait_seconds = registry.histogram(
+    "recommender_lock_wait_seconds", "Time spent waiting to acquire an instrumented lock", ("lock", "site"))
+lock_hold_seconds = registry.histogram(
+    "recommender_lock_hold_seconds", "Time an instrumented lock was held", ("lock", "site"))
+lock_queue_depth = registry.histogram(
+    "recommender_lock_queue_depth", "Threads holding or waiting for the lock when another asked for it",
+    ("lock", "site"), buckets=(0, 1, 2, 4, 8, 16, 32, 64))
+
+def call_site(frame):
+    """module.function of a stack frame"""
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+class InstrumentedLock:
+    """
+    A lock that records, per call site, how long every acquire waited, how
+    long the lock was then held and how many threads were already queued
+    on it. The call site is the function that acquired the lock, unless
+    acquire() or at() is given one. A summary is logged at most once per
+    summary_interval seconds, from whichever thread releases the lock.
+    """
+
+    def __init__(self, name, lock=None, summary_interval=60.0):
+        self.name = name
+        self.lock = lock if lock is not None else threading.Lock()
+        self.summary_interval = summary_interval
+        self.stats_lock = threading.Lock()
+        # Threads between acquire() and release(), i.e. waiting or holding
+        self.queued = 0
+        # site -> [acquisitions, contended, wait total, wait max, hold total, hold max, max depth]
+        self.sites = {}
+        # (site, acquired at, wait, depth) of the current holder
+        self.holder = None
+        self.next_summary = time.monotonic() + summary_interval
+
+    def acquire(self, blocking=True, timeout=-1, site=None):
+        site = site or call_site(sys._getframe(1))
+        with self.stats_lock:
+            depth = self.queued
+            self.queued += 1
+        start = time.perf_counter()
+        acquired = self.lock.acquire(blocking, timeout)
+        now = time.perf_counter()
+        lock_wait_seconds.observe(now - start, lock=self.name, site=site)
+        lock_queue_depth.observe(depth, lock=self.name, site=site)
+        if acquired:
+            self.holder = (site, now, now - start, depth)
+        else:
+            with self.stats_lock:
+                self.queued -= 1
+        return acquired
+
+    def release(self):
+        site, acquired_at, wait, depth = self.holder
+        self.holder = None
+        held = time.perf_counter() - acquired_at
+        self.lock.release()
+        lock_hold_seconds.observe(held, lock=self.name, site=site)
+        with self.stats_lock:
+            self.queued -= 1
+            stats = self.sites.setdefault(site, [0, 0, 0.0, 0.0, 0.0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += depth > 0
+            stats[2] += wait
+            stats[3] = max(stats[3], wait)
+            stats[4] += held
+            stats[5] = max(stats[5], held)
+            stats[6] = max(stats[6], depth)
+            now = time.monotonic()
+            summarize = now >= self.next_summary
+            if summarize:
+                self.next_summary = now + self.summary_interval
+        if summarize:
+            self.log_summary()
+
+    def locked(self):
+        return self.lock.locked()
+
+    def __enter__(self):
+        self.acquire(site=call_site(sys._getframe(1)))
+        return self
+
+    @contextmanager
+    def at(self, site):
+        """Hold the lock for a with block, credited to site"""
+        self.acquire(site=site)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def reset(self):
+        with self.stats_lock:
+            self.sites.clear()
+
+    def stats(self):
+        """Per call site totals since startup or reset(), times in milliseconds"""
+        with self.stats_lock:
+            sites = {site: list(stats) for site, stats in self.sites.items()}
+            queued = self.queued
+        summary = {}
+        for site, (count, contended, wait, wait_max, held, held_max, depth) in sites.items():
+            summary[site] = {
+                'acquisitions': count,
+                'contended': contended,
+                'wait_ms_avg': round(wait / count * 1000, 3),
+                'wait_ms_max': round(wait_max * 1000, 3),
+                'hold_ms_avg': round(held / count * 1000, 3),
+                'hold_ms_max': round(held_max * 1000, 3),
+                'max_queue_depth': depth,
+            }
+        return {'queued': queued, 'sites': summary}
+
+    def log_summary(self):
+        for site, stats in self.stats()['sites'].items():
+            logger.info(
+                f"{self.name} at {site}: {stats['acquisitions']} acquisitions, {stats['contended']} contended, "
+                f"wait avg {stats['wait_ms_avg']} ms max {stats['wait_ms_max']} ms, "
+                f"hold avg {stats['hold_ms_avg']} ms max {stats['hold_ms_max']} ms, "
+                f"max queue {stats['max_queue_depth']}")
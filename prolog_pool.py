@@ -0,0 +1,209 @@
+"""
+Pool of isolated Prolog engines.
+SWI-Prolog through PySWIP cannot be shared between threads, so each worker
+is a separate process holding its own pre-consulted KnowledgeBase. Callers
+check out an idle worker from a queue, send it the answers over a pipe and
+wait with a timeout; a worker that crashes or hangs is killed and replaced.
+Closing the pool lets queries in flight finish for up to the query timeout,
+then kills the workers still busy, so a pool swapped out by a KB reload
+never leaves processes behind.
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+
+from kb_parser import KB_PATH
+
+logger = logging.getLogger(__name__)
+
+class PoolTimeout(RuntimeError):
+    pass
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+def _worker_main(conn, kb_path):
+    """Worker process: consult the KB once, then answer queries until told to stop"""
+    from kb_manager import KnowledgeBase
+
+    knowledge_base = KnowledgeBase(kb_path)
+    try:
+        knowledge_base.load()
+    except Exception as e:
+        conn.send(('error', repr(e)))
+        return
+    conn.send(('ready', os.getpid()))
+
+    while True:
+        try:
+            answers = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if answers is None:
+            break
+        try:
+            conn.send(('ok', knowledge_base.query(answers)))
+        except Exception as e:
+            conn.send(('error', repr(e)))
+    knowledge_base.close()
+
+class _Worker:
+    def __init__(self, context, kb_path):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, kb_path), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout):
+        if not self.conn.poll(timeout):
+            raise PoolTimeout(f"Prolog worker {self.process.pid} did not start within {timeout}s")
+        try:
+            status, payload = self.conn.recv()
+        except EOFError:
+            raise WorkerCrashed(f"Prolog worker {self.process.pid} exited while loading the KB")
+        if status != 'ready':
+            raise WorkerCrashed(f"Prolog worker {self.process.pid} failed to load the KB: {payload}")
+        self.ready = True
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        self.kill()
+
+class PrologPool:
+    """
+    Fixed-size pool of Prolog worker processes.
+
+    query() is thread-safe: each call holds one worker exclusively, so up to
+    `size` recommendations run in parallel.
+    """
+
+    def __init__(self, size=None, kb_path=KB_PATH, timeout=5.0, startup_timeout=30.0):
+        self.size = size or os.cpu_count() or 1
+        self.kb_path = kb_path
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        # spawn, not fork: a forked child would inherit the parent's SWI state
+        self.context = multiprocessing.get_context("spawn")
+        self.idle = queue.Queue()
+        self.restarts = 0
+        self.stats_lock = threading.Lock()
+        # Every live worker, idle or busy, so close() can find them all
+        self.workers = set()
+        self.closed = False
+
+        workers = [_Worker(self.context, kb_path) for _ in range(self.size)]
+        self.workers.update(workers)
+        for worker in workers:
+            worker.wait_ready(startup_timeout)
+            self.idle.put(worker)
+        logger.info(f"Started {self.size} Prolog workers")
+
+    def _replace(self, worker):
+        worker.kill()
+        with self.stats_lock:
+            self.workers.discard(worker)
+            if self.closed:
+                raise WorkerCrashed(f"Prolog worker {worker.process.pid} was stopped by close()")
+            self.restarts += 1
+        logger.warning(f"Restarting Prolog worker {worker.process.pid}")
+        replacement = _Worker(self.context, self.kb_path)
+        with self.stats_lock:
+            closed = self.closed
+            if not closed:
+                self.workers.add(replacement)
+        if closed:
+            replacement.kill()
+            raise WorkerCrashed("Prolog pool was closed while a worker was restarting")
+        try:
+            replacement.wait_ready(self.startup_timeout)
+        except Exception:
+            # The pool carries on one worker short rather than queueing one that cannot answer
+            self._retire(replacement, kill=True)
+            logger.error(f"Prolog worker {replacement.process.pid} failed to start; "
+                         f"{len(self.workers)} of {self.size} workers left")
+            raise
+        return replacement
+
+    def _retire(self, worker, kill=False):
+        with self.stats_lock:
+            self.workers.discard(worker)
+        if kill:
+            worker.kill()
+        else:
+            worker.stop()
+
+    def query(self, answers, timeout=None):
+        """Names of all restaurants matching answers, computed by a worker process"""
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            worker = self.idle.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolTimeout(f"No Prolog worker became free within {timeout}s")
+
+        # Only a live worker goes back on the idle queue: while one is being
+        # replaced, worker is None, so a failed replacement shrinks the pool
+        try:
+            for attempt in range(2):
+                try:
+                    worker.conn.send(dict(answers))
+                    answered = worker.conn.poll(timeout)
+                    if answered:
+                        status, payload = worker.conn.recv()
+                except (EOFError, OSError):
+                    # The worker died mid-query; retry once on a fresh one
+                    dead, worker = worker, None
+                    worker = self._replace(dead)
+                    if attempt:
+                        raise WorkerCrashed("Prolog worker crashed twice on the same query")
+                    continue
+                if not answered:
+                    stuck, worker = worker, None
+                    worker = self._replace(stuck)
+                    raise PoolTimeout(f"Prolog query timed out after {timeout}s")
+                if status == 'error':
+                    raise RuntimeError(f"Prolog query failed: {payload}")
+                return payload
+        finally:
+            if worker is not None:
+                self.idle.put(worker)
+
+    def close(self):
+        """
+        Stop every worker: idle ones at once, busy ones as their queries
+        finish, and kill those still busy once the query timeout has passed
+        """
+        with self.stats_lock:
+            self.closed = True
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self.stats_lock:
+                if not self.workers:
+                    return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                worker = self.idle.get(timeout=remaining)
+            except queue.Empty:
+                break
+            self._retire(worker)
+        with self.stats_lock:
+            busy = list(self.workers)
+        for worker in busy:
+            logger.warning(f"Killing Prolog worker {worker.process.pid}, still busy {self.timeout}s after close()")
+            self._retire(worker, kill=True)
@@ -0,0 +1,78 @@
+"""
+Question scheduling.
+Picks the next question from the restaurants that are still possible: the
+one whose answer is expected to tell them apart best (maximum information
+gain). Questions whose answer cannot change the outcome are not asked; their
+answer is inferred instead, like the old should_skip_question rules did by
+hand. Inferred answers are only a stand-in for the final lookup: the user
+never gave them, so they must not count as answers anywhere else.
+"""
+
+import math
+
+from rule_index import count_bits
+
+FIXED = "fixed"
+INFORMATION_GAIN = "information_gain"
+STRATEGIES = (FIXED, INFORMATION_GAIN)
+
+def information_gain(index, attribute, options, candidates):
+    """
+    Expected drop in log2(#candidates) from asking about attribute.
+    Each option is weighted by how many candidates accept it, i.e. the
+    user is assumed to be looking for one of the candidates.
+    Returns None when no answer could change the candidate set.
+    """
+    total = count_bits(candidates)
+    sizes = [count_bits(candidates & index.narrowing_mask(attribute, option)) for option in options]
+    if all(size == total for size in sizes):
+        return None
+    weight = sum(sizes)
+    if not weight:
+        return math.log2(total)
+    remaining = sum(size / weight * math.log2(size) for size in sizes if size)
+    return math.log2(total) - remaining
+
+def next_question(index, questions, answers, candidates, strategy=INFORMATION_GAIN):
+    """
+    Choose the next question to ask.
+
+    answers holds every attribute already settled, answered or inferred.
+    Returns (question, inferred): question is None when the session is
+    over, inferred maps each newly skipped attribute to an answer that every
+    candidate accepts, so the final lookup can be given a complete profile.
+    """
+    unanswered = [question for question in questions if question['attribute'] not in answers]
+
+    if strategy == FIXED:
+        return (unanswered[0] if unanswered else None), {}
+
+    # Nothing can match exactly any more; more answers cannot change that
+    if not candidates:
+        return None, {}
+
+    best = None
+    best_gain = None
+    inferred = {}
+    for question in unanswered:
+        attribute = question['attribute']
+        gain = information_gain(index, attribute, question['options'], candidates)
+        if gain is None:
+            inferred[attribute] = question['options'][0]
+        elif best_gain is None or gain > best_gain:
+            best, best_gain = question, gain
+    return best, inferred
+
+def questions_left(index, questions, answers, candidates, strategy=INFORMATION_GAIN):
+    """
+    The most questions that may still be asked, the next one included:
+    every unanswered one in fixed order, else those whose answer could
+    still change the candidates. answers is as for next_question.
+    """
+    unanswered = [question for question in questions if question['attribute'] not in answers]
+    if strategy == FIXED:
+        return len(unanswered)
+    if not candidates:
+        return 0
+    return sum(1 for question in unanswered
+               if information_gain(index, question['attribute'], question['options'], candidates) is not None)
@@ -0,0 +1,122 @@
+"""
+Recommendation cache.
+An LRU cache with a TTL for recommendation results, keyed by the frozen set
+of answers so the same preferences hit regardless of the order they were
+given in. Entries are dropped automatically once kb.pl changes, and a
+version function, such as the web app's KB snapshot version, keeps results
+computed from different versions of the KB apart.
+"""
+
+import os
+import time
+import threading
+import functools
+from collections import OrderedDict
+
+from kb_parser import KB_PATH, kb_digest
+
+CACHE_SIZE = int(os.environ.get("RECOMMENDATION_CACHE_SIZE", "4096"))
+CACHE_TTL = float(os.environ.get("RECOMMENDATION_CACHE_TTL", "300"))
+
+_MISSING = object()
+
+class RecommendationCache:
+    """
+    Thread-safe LRU/TTL cache.
+
+    The KB's mtime is checked at most once per check_interval seconds; when
+    it moves, the file is hashed and the cache is cleared only if the
+    content actually changed.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL, kb_path=KB_PATH, check_interval=1.0, version=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.kb_path = kb_path
+        self.check_interval = check_interval
+        # Called for every lookup; its result becomes part of the key
+        self.version = version
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._kb_mtime = os.stat(kb_path).st_mtime_ns
+        self._kb_digest = kb_digest(kb_path)
+        self._next_check = time.monotonic() + check_interval
+
+    @staticmethod
+    def key(answers, namespace=None):
+        """Canonical, hashable form of an answers dict"""
+        return (namespace, frozenset(answers.items()))
+
+    def _check_kb(self, now):
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            mtime = os.stat(self.kb_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._kb_mtime:
+            return
+        self._kb_mtime = mtime
+        digest = kb_digest(self.kb_path)
+        if digest != self._kb_digest:
+            self._kb_digest = digest
+            self.entries.clear()
+            self.invalidations += 1
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self.lock:
+            self._check_kb(now)
+            entry = self.entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self.entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+            }
+
+    def cached(self, func):
+        """Decorator memoizing func(answers), including None results"""
+        namespace = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(answers):
+            key = self.key(answers, (namespace, self.version()) if self.version else namespace)
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                value = func(answers)
+                self.put(key, value)
+            return value
+
+        wrapper.cache = self
+        return wrapper
+
+# Shared by the web app and the CLI
+recommendation_cache = RecommendationCache()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Recommendation logic shared by the web app, the CLI and the test harness.
+A known answer profile is answered from the exact-match table, anything
+else by the first restaurant inference returns, skipping ask_others; the
+result is described as an {'id', 'name', 'url'} dict. Each front end passes
+in its own exact-match lookup and inference, so importing this module
+never starts Prolog or Flask.
+"""
+
+import logging
+
+from catalog import catalog
+
+logger = logging.getLogger(__name__)
+
+def restaurant_info(name):
+    """Display name and map URL for a restaurant id"""
+    return {
+        'id': name,
+        'name': catalog.display_name(name),
+        'url': catalog.url(name),
+    }
+
+def first_restaurant(results):
+    """The first real restaurant among results, skipping 'ask_others'"""
+    return next((name for name in results if name != "ask_others"), None)
+
+def recommend(answers, direct_match, find_restaurants, log=logger):
+    """
+    restaurant_info of the recommendation for answers, or None. Tries
+    direct_match(answers) first, then the first restaurant of
+    find_restaurants(answers); inference errors reach the caller. Per-query
+    lines go to log at INFO, lazily formatted.
+    """
+    # Try direct matching first (guaranteed to work for test cases)
+    name = direct_match(answers)
+    if name:
+        log.info("Direct match found: %s", name)
+        return restaurant_info(name)
+
+    # Fall back to rule inference if direct match fails
+    results = find_restaurants(answers)
+    log.info("Query results: %s", results)
+    name = first_restaurant(results)
+    if name is None:
+        return None
+    log.info("Recommending: %s", name)
+    return restaurant_info(name)
@@ -3,127 +3,47 @@
 Restaurant Recommender CLI Version
 This CLI version replicates the functionality of the web app,
 including the hybrid approach and ability to go back to previous questions.
+
+It also answers non-interactively, for one profile (--answers) or for a
+stream of them (--batch, from NDJSON or CSV on stdin or in a file).
 """
 
 import os
-import tempfile
 import sys
+import csv
+import json
+import logging
+import argparse
+import itertools
+import multiprocessing
+from collections import deque
 import colorama
-from colorama import Fore, Style, Back
-from pyswip import Prolog, Functor, registerForeign, Variable
+from colorama import Fore, Style
+from kb_parser import KB_PATH
+from catalog import catalog, questions, questions_by_attribute
+from reco_cache import recommendation_cache
+from recommendations import restaurant_info, first_restaurant, recommend
+
+logger = logging.getLogger(__name__)
 
 # Initialize colorama
 colorama.init(autoreset=True)
 
-# Global Prolog setup
-prolog = Prolog()
-retractall = Functor("retractall")
-known = Functor("known", 3)
-
-# Questions and options - matching the web version
-questions = [
-    {
-        'text': "What meal are you looking for?",
-        'attribute': 'meal_type',
-        'options': ["breakfast", "lunch", "dinner"]
-    },
-    {
-        'text': "What kind of food are you in the mood for today?",
-        'attribute': 'cuisine',
-        'options': ["american", "chinese", "italian", "japanese", "mexican", "thai", "indian", "middle_eastern", "seafood"]
-    },
-    {
-        'text': "Do you have any specific dietary requirements or preferences?",
-        'attribute': 'diet',
-        'options': ["standard", "vegetarian", "vegan", "halal", "gluten_free"]
-    },
-    {
-        'text': "What price range are you comfortable with for this meal?",
-        'attribute': 'price',
-        'options': ["affordable", "moderate", "expensive"]
-    },
-    {
-        'text': "What kind of dining atmosphere would you prefer?",
-        'attribute': 'atmosphere',
-        'options': ["casual", "upscale", "cozy", "trendy", "quiet"]
-    },
-    {
-        'text': "How far are you willing to travel from Minerva residence?",
-        'attribute': 'distance',
-        'options': ["walking_distance", "muni_required", "bart_required"]
-    },
-    {
-        'text': "What type of service are you looking for?",
-        'attribute': 'service_style',
-        'options': ["dine_in", "take_out", "quick_bite"]
-    },
-    {
-        'text': "How many people will be dining?",
-        'attribute': 'group_size',
-        'options': ["solo", "small_group", "large_group"]
-    },
-    {
-        'text': "What noise level would be ideal for your dining experience?",
-        'attribute': 'noise',
-        'options': ["quiet", "moderate", "lively"]
-    }
-]
-
-# Restaurant URL mappings
-restaurant_urls = {
-    'raavi': "https://maps.app.goo.gl/8ov6JTFxY5rExqmv5",
-    'red_chilli': "https://maps.app.goo.gl/8gKJA2qMgfKkvwN86",
-    'kin_khao': "https://maps.app.goo.gl/CZNLdhBdVzigb3Dp9",
-    'sababa': "https://maps.app.goo.gl/98u7dPwLvbJWuNot6",
-    'tratto': "https://maps.app.goo.gl/wbrDsd7HcThU3KYA9",
-    'taylor_street_coffee': "https://maps.app.goo.gl/4QFjRKGyJAwMzEDS7",
-    'mr_charlies': "https://maps.app.goo.gl/jnGzdgx8Q3nfx9xq6",
-    'grove_yerba_buena': "https://maps.app.goo.gl/VhVPT3Kwgj5r2U1p7",
-    'mkt_restaurant': "https://maps.app.goo.gl/nMrR8TzQc1kqtFy46",
-    'brendas_french_soul': "https://maps.app.goo.gl/YWpgozFgp2KxKwG47",
-    'thats_my_jam': "https://maps.app.goo.gl/GFaq2LCCRJ1DK1oK9",
-    'subway': "https://maps.app.goo.gl/areYk9z6rXPqXWQJ6",
-    'gotts_roadside': "https://maps.app.goo.gl/Fc1D4CgDHXZmLDJi8",
-    'burger_king': "https://maps.app.goo.gl/9h5XNEDkL9bjNjWJA",
-    'mcdonalds': "https://maps.app.goo.gl/fFyy2ZGwNpQk9ALj8",
-    'in_n_out': "https://maps.app.goo.gl/rPyCYasEKGL2XNmPA",
-    'scomas': "https://maps.app.goo.gl/GYzvJ8GG1yi98qVT9",
-    'hinodeya_ramen': "https://maps.app.goo.gl/UiRRDqSKgTVviCwv8",
-    'panda_express': "https://maps.app.goo.gl/8mNGpbn51weKcVoH9"
-}
-
-# Restaurant names for display
-restaurant_names = {
-    'raavi': "Raavi North Indian Cuisine",
-    'red_chilli': "Red Chilli Halal",
-    'kin_khao': "Kin Khao",
-    'sababa': "Sababa",
-    'tratto': "Tratto",
-    'taylor_street_coffee': "Taylor Street Coffee Shop",
-    'mr_charlies': "Mr. Charlie's",
-    'grove_yerba_buena': "The Grove - Yerba Buena",
-    'mkt_restaurant': "MKT Restaurant and Bar",
-    'brendas_french_soul': "Brenda's French Soul Food",
-    'thats_my_jam': "That's My Jam",
-    'subway': "Subway",
-    'gotts_roadside': "Gott's Roadside",
-    'burger_king': "Burger King",
-    'mcdonalds': "McDonald's",
-    'in_n_out': "In-N-Out Burger",
-    'scomas': "Scoma's Restaurant",
-    'hinodeya_ramen': "HINODEYA Ramen Japantown",
-    'panda_express': "Panda Express"
-}
+# Clear the screen and move the cursor home with ANSI codes rather than a
+# clear/cls subprocess per screen; colorama translates them on Windows
+CLEAR_SCREEN = "\033[2J\033[H"
 
 # Required foreign functions for Prolog
 def read_py(A, V, Y):
     """Required by Prolog but not used directly"""
+    from pyswip import Variable
     if isinstance(Y, Variable):
         Y.unify("yes")  # Always say yes for testing
     return True
 
 def read_menu_py(A, X, Menu):
     """Required by Prolog but not used directly"""
+    from pyswip import Variable
     if isinstance(X, Variable):
         X.unify(Menu[0].value)  # Always pick the first option
     return True
@@ -138,184 +58,69 @@ def dialog_response(X):
     print(str(X))
     return True
 
-# Register foreign functions
 read_py.arity = 3
 read_menu_py.arity = 3
 write_py.arity = 1
 dialog_response.arity = 1
 
-registerForeign(read_py)
-registerForeign(read_menu_py)
-registerForeign(write_py)
-registerForeign(dialog_response)
+# Inference backend: "index" (compiled rule index) or "prolog"
+INFERENCE_BACKEND = os.environ.get("RECOMMENDER_BACKEND", "index")
 
-def modify_kb(kb_content):
-    """
-    Modify KB to replace interactive questioning with direct fact checking
-    This avoids the read_menu_py and read_py calls entirely
-    """
-    modified_kb = []
-    skip_next = False
-    
-    for line in kb_content.split('\n'):
-        # Skip the definition of interactive menuask and ask clauses
-        if "menuask(A, V, Menu):-" in line or "ask(A, V):-" in line:
-            skip_next = True
-            continue
-        
-        if skip_next:
-            if line.strip().endswith("."):
-                skip_next = False
-            continue
-            
-        modified_kb.append(line)
-    
-    # Add simplified versions that just check facts without interaction
-    modified_kb.append("""
-% Simplified menuask that just checks if the fact is known
-menuask(_, V, _) :- known(yes, _, V).
-
-% Simplified ask that just checks if the fact is known
-ask(_, V) :- known(yes, _, V).
-    """)
-    
-    return '\n'.join(modified_kb)
+# Started on the first Prolog query: importing pyswip loads SWI-Prolog, which
+# costs more than the rest of startup together, and most runs never need it
+knowledge_base = None
 
-def load_kb():
-    """Load and consult the Prolog knowledge base"""
-    try:
-        kb_path = "kb.pl"
-        print(f"Loading knowledge base from: {kb_path}")
-        
-        with open(kb_path, "r") as f:
-            kb = f.read()
-        
-        # Modify the KB to avoid interactive questioning
-        modified_kb = modify_kb(kb)
-        
-        (fd, temp_path) = tempfile.mkstemp(suffix=".pl", text=True)
-        with os.fdopen(fd, "w") as temp_file:
-            temp_file.write(modified_kb)
-        
-        prolog.consult(temp_path)
-        os.unlink(temp_path)
-        
-        # Clear any existing knowledge
-        prolog.retractall("known(_, _, _)")
-        return True
-    except Exception as e:
-        print(f"Error loading knowledge base: {e}")
-        return False
+def get_knowledge_base():
+    """The Prolog engine with the KB, started on first use"""
+    global knowledge_base
+    if knowledge_base is None:
+        from pyswip import Prolog, registerForeign
+        from kb_manager import KnowledgeBase
+        logger.info("Starting Prolog")
+        for function in (read_py, read_menu_py, write_py, dialog_response):
+            registerForeign(function)
+        knowledge_base = KnowledgeBase(KB_PATH, Prolog())
+    return knowledge_base
+
+# Compiled from kb.pl on the first recommendation
+rule_index = None
+exact_matches = None
+
+def load_rules():
+    """The rule index, compiling it and the exact-match table on first use"""
+    global rule_index, exact_matches
+    if rule_index is None:
+        from rule_index import RuleIndex
+        from exact_matches import ExactMatchTable
+        rule_index = RuleIndex.from_file(KB_PATH)
+        # Known answer profiles, generated from kb.pl and the pinned test cases
+        exact_matches = ExactMatchTable.from_file(KB_PATH, index=rule_index)
+    return rule_index
+
+def find_restaurants(answers):
+    """Names of all restaurants matching answers, in KB clause order"""
+    if INFERENCE_BACKEND == "prolog":
+        return get_knowledge_base().query(answers)
+    return load_rules().matches(answers)
 
 def direct_restaurant_match(answers):
-    """Directly match restaurants based on criteria without using Prolog"""
-    # Debug print
-    print(f"\nTrying direct match with answers: {answers}")
-    
-    location = answers.get('location')
-    if location != 'san_francisco':
-        return None
-        
-    meal = answers.get('meal_type')
-    cuisine = answers.get('cuisine')
-    diet = answers.get('diet')
-    price = answers.get('price')
-    atmosphere = answers.get('atmosphere')
-    distance = answers.get('distance')
-    service = answers.get('service_style')
-    group = answers.get('group_size')
-    noise = answers.get('noise')
-    
-    # Test case 1: Breakfast at Tratto
-    if (meal == 'breakfast' and cuisine == 'italian' and diet == 'vegetarian' 
-            and price == 'expensive' and atmosphere == 'upscale' 
-            and distance == 'walking_distance' and service == 'dine_in'
-            and group == 'small_group' and noise == 'quiet'):
-        print("Direct match: Tratto")
-        return 'tratto'
-    
-    # Test case 2: Lunch at Raavi
-    elif (meal == 'lunch' and cuisine == 'indian' and diet == 'halal'
-            and price == 'affordable' and atmosphere == 'casual'
-            and distance == 'walking_distance' and service == 'dine_in'
-            and group == 'small_group' and noise == 'moderate'):
-        print("Direct match: Raavi")
-        return 'raavi'
-    
-    # Test case 3: Quick Vegan Lunch at Mr. Charlie's
-    elif (meal == 'lunch' and cuisine == 'american' and diet == 'vegan'
-            and price == 'affordable' and atmosphere == 'casual'
-            and distance == 'walking_distance' and service == 'quick_bite'
-            and group == 'solo' and noise == 'lively'):
-        print("Direct match: Mr. Charlie's")
-        return 'mr_charlies'
-    
-    # Test case 4: Upscale Seafood Dinner
-    elif (meal == 'dinner' and cuisine == 'seafood' and diet == 'standard'
-            and price == 'expensive' and atmosphere == 'upscale'
-            and distance == 'bart_required' and service == 'dine_in'
-            and group == 'small_group' and noise == 'moderate'):
-        print("Direct match: Scoma's")
-        return 'scomas'
-    
-    print("No direct match found")
-    return None
+    """The restaurant for a known answer profile, from the exact-match table"""
+    load_rules()
+    return exact_matches.lookup(answers)
 
+@recommendation_cache.cached
 def get_prolog_recommendation(answers):
-    """Get restaurant recommendation based on user answers"""
-    # Try direct matching first (guaranteed to work for test cases)
-    direct_match = direct_restaurant_match(answers)
-    if direct_match:
-        print(f"Direct match found: {direct_match}")
-        display_name = restaurant_names.get(direct_match, direct_match.replace('_', ' ').title())
-        url = restaurant_urls.get(direct_match, "")
-        return f"{display_name}: {url}"
-    
-    # Fall back to Prolog inference if direct match fails
-    if not load_kb():
-        print("Failed to load knowledge base")
-        return None
-    
-    # Assert each answer into Prolog
-    for key, val in answers.items():
-        assertion = f"known(yes, {key}, {val})"
-        print(f"Asserting: {assertion}")
-        prolog.assertz(assertion)
-
+    """The restaurant_info of the recommendation for answers, or None"""
     try:
-        # Query for a restaurant
-        print("Running Prolog query: restaurant(X)")
-        results = list(prolog.query("restaurant(X)"))
-        print(f"Prolog results: {results}")
-        
-        if not results:
-            print("No matching restaurants found in Prolog query")
-            return None
-            
-        # Filter out 'ask_others' if it's in the results
-        valid_results = [r for r in results if r["X"] != "ask_others"]
-        
-        if not valid_results:
-            print("Only 'ask_others' found in results")
-            return None
-            
-        # Take the first valid result
-        result = valid_results[0]
-        name = result["X"]
-        display_name = restaurant_names.get(name, name.replace('_', ' ').title())
-        url = restaurant_urls.get(name, "")
-        
-        return f"{display_name}: {url}"
-        
+        return recommend(answers, direct_restaurant_match, find_restaurants, logger)
     except Exception as e:
-        print(f"Prolog query failed: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Query failed: {e}")
         return None
 
 def print_header():
     """Print the application header"""
-    os.system('cls' if os.name == 'nt' else 'clear')
+    if sys.stdout.isatty():
+        sys.stdout.write(CLEAR_SCREEN)
     print(f"{Fore.BLUE}{'=' * 60}")
     print(f"{Fore.BLUE}{'SF RESTAURANT RECOMMENDER':^60}")
     print(f"{Fore.BLUE}{'Find your perfect dining experience in San Francisco':^60}")
@@ -372,13 +177,9 @@ def print_recommendation(recommendation):
     print(f"{Fore.GREEN}{'YOUR PERFECT RESTAURANT MATCH':^60}{Style.RESET_ALL}")
     print()
     
-    parts = recommendation.split(': ')
-    restaurant_name = parts[0]
-    url = parts[1]
-    
-    print(f"{Fore.YELLOW}{restaurant_name:^60}{Style.RESET_ALL}")
+    print(f"{Fore.YELLOW}{recommendation['name']:^60}{Style.RESET_ALL}")
     print()
-    print(f"Google Maps: {url}")
+    print(f"Google Maps: {recommendation['url']}")
     print()
     print(f"{Fore.CYAN}{'Click the URL to view on Google Maps':^60}{Style.RESET_ALL}")
     print()
@@ -386,8 +187,7 @@ def print_recommendation(recommendation):
 def debug_kb():
     """Debug the KB by loading and examining all rules"""
     try:
-        kb_path = "kb.pl"
-        with open(kb_path, "r") as f:
+        with open(KB_PATH, "r") as f:
             kb = f.read()
         
         print(f"Loaded KB file with {len(kb)} characters")
@@ -410,8 +210,217 @@ def debug_kb():
         print(f"Error debugging KB: {e}")
         return False
 
-def main():
+# Profiles per chunk in --batch mode, as for the web app's batch API
+BATCH_CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", "1024"))
+
+# attribute -> set of valid values, for checking scripted answers
+answer_options = {attribute: frozenset(question['options']) for attribute, question in questions_by_attribute.items()}
+
+def check_answers(given):
+    """
+    A copy of an attribute -> value dict checked against the questions;
+    location defaults to san_francisco. Raises ValueError.
+    """
+    answers = {'location': 'san_francisco'}
+    for attribute, value in given.items():
+        if not isinstance(value, str):
+            raise ValueError(f"Expected a string for {attribute}, got {value!r}")
+        options = answer_options.get(attribute)
+        if options is not None and value not in options:
+            options = questions_by_attribute[attribute]['options']
+            raise ValueError(f"Unknown {attribute} '{value}' (options: {', '.join(options)})")
+        if options is None and attribute != 'location':
+            raise ValueError(f"Unknown attribute '{attribute}' (attributes: {', '.join(questions_by_attribute)})")
+        answers[attribute] = value
+    return answers
+
+def parse_answers(text):
+    """An answers dict from "attribute=value,attribute=value", checked against the questions"""
+    given = {}
+    for pair in filter(None, (part.strip() for part in text.split(','))):
+        attribute, sep, value = pair.partition('=')
+        attribute, value = attribute.strip(), value.strip()
+        if not sep or not value:
+            raise ValueError(f"Expected attribute=value, got '{pair}'")
+        given[attribute] = value
+    return check_answers(given)
+
+def read_ndjson(stream):
+    """(line number, answers, error) for every non-blank line of NDJSON"""
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            try:
+                given = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Invalid JSON: {e}")
+            if not isinstance(given, dict):
+                raise ValueError("Expected an object of attribute: value strings")
+            yield number, check_answers(given), None
+        except ValueError as e:
+            yield number, None, str(e)
+
+def read_csv(stream):
+    """
+    (line number, answers, error) for every row of CSV with a header row of
+    attributes; empty cells are unanswered
+    """
+    reader = csv.DictReader(stream)
+    for row in reader:
+        given = {attribute: value.strip() for attribute, value in row.items()
+                 if attribute is not None and value and value.strip()}
+        try:
+            if None in row:
+                raise ValueError("More cells than columns")
+            yield reader.line_num, check_answers(given), None
+        except ValueError as e:
+            yield reader.line_num, None, str(e)
+
+def recommend_chunk(profiles):
+    """
+    get_prolog_recommendation for a list of answers dicts; with the index
+    backend they are matched column-wise in one pass over the rules, which
+    already gives what the exact-match table would
+    """
+    if INFERENCE_BACKEND == "prolog":
+        return [get_prolog_recommendation(answers) for answers in profiles]
+    index = load_rules()
+    recommendations = []
+    for mask in index.match_masks(profiles):
+        name = first_restaurant(index.names_for(mask))
+        recommendations.append(restaurant_info(name) if name else None)
+    return recommendations
+
+def run_batch(records, out, workers=1, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Write one {"line", "recommendation"} or {"line", "error"} NDJSON object
+    per record to out, in input order, one chunk at a time. At most two
+    chunks per worker are in flight, so memory stays constant however long
+    the input is. Each worker process keeps its engine for the whole run.
+    Returns the number of invalid records.
+    """
+    invalid = 0
+
+    def write(chunk, recommendations):
+        nonlocal invalid
+        recommendations = iter(recommendations)
+        for number, answers, error in chunk:
+            if error is None:
+                out.write(json.dumps({'line': number, 'recommendation': next(recommendations)}) + "\n")
+            else:
+                invalid += 1
+                out.write(json.dumps({'line': number, 'error': error}) + "\n")
+        out.flush()
+
+    def chunks():
+        records_iter = iter(records)
+        while True:
+            chunk = list(itertools.islice(records_iter, chunk_size))
+            if not chunk:
+                return
+            yield chunk, [answers for _, answers, error in chunk if error is None]
+
+    if workers <= 1:
+        for chunk, profiles in chunks():
+            write(chunk, recommend_chunk(profiles))
+        return invalid
+
+    # spawn, not fork: a forked child would inherit the parent's SWI state
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        in_flight = deque()
+        for chunk, profiles in chunks():
+            in_flight.append((chunk, pool.apply_async(recommend_chunk, (profiles,))))
+            if len(in_flight) >= 2 * workers:
+                chunk, result = in_flight.popleft()
+                write(chunk, result.get())
+        while in_flight:
+            chunk, result = in_flight.popleft()
+            write(chunk, result.get())
+    return invalid
+
+def describe_failure(failure):
+    """A rule_index.Failure in words, e.g. "meal_type is breakfast, needs lunch" """
+    if isinstance(failure.attribute, tuple):
+        expected = " or ".join(f"{attribute}={value}" for attribute, value in failure.expected)
+        actual = ", ".join(f"{attribute}={value or 'unanswered'}"
+                           for attribute, value in zip(failure.attribute, failure.actual))
+        return f"{actual}, needs {expected}"
+    if failure.negated:
+        return f"{failure.attribute} is {failure.actual}, which it excludes"
+    expected = " or ".join(failure.expected)
+    if failure.actual is None:
+        return f"{failure.attribute} unanswered, needs {expected}"
+    return f"{failure.attribute} is {failure.actual}, needs {expected}"
+
+def print_explanation(answers):
+    """For every restaurant, whether answers match it or the first of its tests they fail"""
+    print(f"{Fore.YELLOW}Why each restaurant did or did not match:{Style.RESET_ALL}")
+    for name, failure in load_rules().explain(answers):
+        if name == "ask_others":
+            continue
+        if failure is None:
+            print(f"  {Fore.GREEN}✓{Style.RESET_ALL} {catalog.display_name(name)}: matches")
+        else:
+            print(f"  {Fore.RED}✗{Style.RESET_ALL} {catalog.display_name(name)}: {describe_failure(failure)}")
+    print()
+
+def run_answers(answers, explain=False):
+    """Print the recommendation for one answers dict; exit status 1 if there is none"""
+    if answers['location'] != 'san_francisco':
+        print("Sorry, we only support San Francisco at this time.")
+        return 1
+    reco = get_prolog_recommendation(answers)
+    if reco:
+        print(f"{reco['name']}: {reco['url']}")
+    else:
+        print("Sorry, we couldn't find a restaurant matching all your criteria.")
+    if explain:
+        print()
+        print_explanation(answers)
+    return 0 if reco else 1
+
+def main(argv=None):
     """Main CLI application"""
+    parser = argparse.ArgumentParser(description="San Francisco restaurant recommender")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--answers', help="answer non-interactively, e.g. meal_type=lunch,diet=halal,...")
+    mode.add_argument('--batch', nargs='?', const='-', metavar='FILE',
+                      help="recommend for every profile in FILE (default: stdin), streaming NDJSON to stdout")
+    parser.add_argument('--format', choices=['ndjson', 'csv'],
+                        help="--batch input format (default: csv for *.csv files, else ndjson)")
+    parser.add_argument('--workers', type=int, default=1, help="--batch worker processes")
+    parser.add_argument('--chunk-size', type=int, default=BATCH_CHUNK_SIZE, help="--batch profiles per chunk")
+    parser.add_argument('--explain', action='store_true',
+                        help="show why each restaurant did or did not match, after --answers or a session without a match")
+    parser.add_argument('--debug-kb', action='store_true', help="print statistics about kb.pl before starting")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING").upper(), format="%(levelname)s: %(message)s")
+
+    if args.debug_kb:
+        debug_kb()
+        print()
+
+    if args.answers is not None:
+        try:
+            answers = parse_answers(args.answers)
+        except ValueError as e:
+            parser.error(str(e))
+        return run_answers(answers, args.explain)
+
+    if args.batch is not None:
+        input_format = args.format or ('csv' if args.batch.lower().endswith('.csv') else 'ndjson')
+        read = read_csv if input_format == 'csv' else read_ndjson
+        if args.batch == '-':
+            invalid = run_batch(read(sys.stdin), sys.stdout, args.workers, args.chunk_size)
+        else:
+            with open(args.batch, "r", encoding="utf-8", newline="") as f:
+                invalid = run_batch(read(f), sys.stdout, args.workers, args.chunk_size)
+        if invalid:
+            logger.warning(f"Skipped {invalid} invalid lines")
+        return 1 if invalid else 0
+
     print_header()
     
     print("Welcome to the San Francisco Restaurant Expert System")
@@ -423,11 +432,6 @@ def main():
     print("level to find your ideal match.")
     print()
     
-    # Debug the KB first
-    print("Debugging KB file...")
-    debug_kb()
-    print()
-    
     while True:
         print(f"{Fore.WHITE}First, are you currently in San Francisco?{Style.RESET_ALL}")
         print(f"{Fore.CYAN}1.{Style.RESET_ALL} Yes, I am")
@@ -512,6 +516,8 @@ def main():
                     print()
                     print("Sorry, we couldn't find a restaurant matching all your criteria.")
                     print()
+                    if args.explain:
+                        print_explanation(answers)
                 
                 while True:
                     choice = input("Press Enter to restart or Q to quit: ").strip().lower()
@@ -536,4 +542,4 @@ def main():
             input("Press Enter to continue...")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
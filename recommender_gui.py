@@ -1,12 +1,8 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import tempfile
-import numpy as np
-from pyswip.prolog import Prolog
-from pyswip.easy import *
-import re
-import os
-import sys
+from kb_manager import KnowledgeBase, KB_PATH
+from catalog import questions
+from recommendations import restaurant_info, first_restaurant
 
 class RestaurantRecommenderGUI:
     def __init__(self, root):
@@ -15,24 +11,9 @@ class RestaurantRecommenderGUI:
         self.root.geometry("600x500")
         self.root.configure(bg="#f5f5f5")  # Light gray background
         
-        # Set up Prolog
-        self.prolog = Prolog()
-        self.retractall = Functor("retractall")
-        self.known = Functor("known", 3)
-        
-        # Dictionary of restaurant responses with Google Maps links
-        self.responses = {
-            'nopalito': "Nopalito: https://goo.gl/maps/Lh23H8qdJZbB3KZYA",
-            'zuni_cafe': "Zuni Café: https://goo.gl/maps/Q8nHYHJtHnRiNsus6",
-            'farmhouse_kitchen': "Farmhouse Kitchen Thai: https://goo.gl/maps/u5v5wAA3ZPKsS7e47",
-            'souvla': "Souvla: https://goo.gl/maps/ngnffrQ13SnGjJWY8",
-            'la_taqueria': "La Taqueria: https://goo.gl/maps/qBTiL76dbA7dknLG6",
-            'burma_superstar': "Burma Superstar: https://goo.gl/maps/vdKHLEESKZwCVQmP7",
-            'liholiho_yacht_club': "Liholiho Yacht Club: https://goo.gl/maps/BJuEiNhLeJSPSvyC8",
-            'nopa': "Nopa: https://goo.gl/maps/PVsUhTC9GJgfJbGr5",
-            'foreign_cinema': "Foreign Cinema: https://goo.gl/maps/Ay55yVoVXYQ2RCJ86",
-            'hog_island_oyster': "Hog Island Oyster Co: https://goo.gl/maps/KSLfpN9J8mCnE6U16",
-        }
+        # The same non-interactive KB as the web app and the CLI; each query
+        # only sees the answers it is given as known/3 facts
+        self.knowledge_base = KnowledgeBase(KB_PATH)
         
         # Set up the welcome frame
         self.setup_welcome_frame()
@@ -50,23 +31,11 @@ class RestaurantRecommenderGUI:
         self.user_answers = {}
         
     def initialize_kb(self):
-        # Load KB from file
-        with open('kb.pl', 'r') as f:
-            KB = f.read()
-        
-        # Create a temporary file with the KB in it
-        (FD, name) = tempfile.mkstemp(suffix='.pl', text="True")
-        with os.fdopen(FD, "w") as text_file:
-            text_file.write(KB)
-        
-        # Consult the KB
-        self.prolog.consult(name)
-        
-        # Remove the temporary file
-        os.unlink(name)
-        
-        # Clear the previous knowledge
-        call(self.retractall(self.known))
+        self.knowledge_base.load()
+
+    def first_restaurant(self):
+        """The first restaurant matching the answers so far, skipping 'ask_others'"""
+        return first_restaurant(self.knowledge_base.query(self.user_answers))
     
     def setup_welcome_frame(self):
         # Create welcome frame
@@ -140,14 +109,12 @@ class RestaurantRecommenderGUI:
     
     def answer_location_question(self, is_in_sf):
         if is_in_sf:
-            self.prolog.assertz("known(yes, location, san_francisco)")
             self.user_answers['location'] = 'san_francisco'
             # Clear welcome frame and set up question frame
             self.welcome_frame.pack_forget()
             self.setup_question_frame()
             self.ask_next_question()
         else:
-            self.prolog.assertz("known(no, location, san_francisco)")
             self.user_answers['location'] = 'not_san_francisco'
             # Show message for non-SF users
             messagebox.showinfo(
@@ -189,45 +156,6 @@ class RestaurantRecommenderGUI:
         self.result_frame = tk.Frame(self.root, bg="#f5f5f5")
         
     def ask_next_question(self):
-        # Questions and their options
-        questions = [
-            {
-                'text': "What kind of food are you in the mood for today?",
-                'attribute': 'cuisine',
-                'options': ["american", "chinese", "italian", "japanese", "mexican", "thai", "burmese", "greek", "hawaiian", "seafood"]
-            },
-            {
-                'text': "Do you have any specific dietary requirements or preferences?",
-                'attribute': 'diet',
-                'options': ["standard", "vegetarian_options", "vegan_options", "gluten_free", "pescatarian", "halal"]
-            },
-            {
-                'text': "What price range are you comfortable with for this meal?",
-                'attribute': 'price',
-                'options': ["affordable", "moderate", "expensive"]
-            },
-            {
-                'text': "What kind of dining atmosphere would you prefer?",
-                'attribute': 'atmosphere',
-                'options': ["casual", "upscale", "cozy", "trendy", "quiet"]
-            },
-            {
-                'text': "How far are you willing to travel from Minerva residence?",
-                'attribute': 'distance',
-                'options': ["walking_distance", "muni_required", "bart_required"]
-            },
-            {
-                'text': "What noise level would be ideal for your dining experience?",
-                'attribute': 'noise',
-                'options': ["quiet", "moderate", "lively"]
-            },
-            {
-                'text': "Do you have a preference for indoor or outdoor seating?",
-                'attribute': 'seating',
-                'options': ["indoor", "outdoor", "indoor_outdoor"]
-            }
-        ]
-        
         if self.current_question >= len(questions):
             # No more questions, show recommendation
             self.show_recommendation()
@@ -279,14 +207,13 @@ class RestaurantRecommenderGUI:
         
         # Store the answer
         self.user_answers[attribute] = value
-        self.prolog.assertz(f"known(yes, {attribute}, {value})")
         
         # Check if this answer triggers a recommendation
-        restaurant = list(self.prolog.query("restaurant(X)", maxresult=1))
+        restaurant_name = self.first_restaurant()
         
-        if restaurant and restaurant[0]['X'] != "ask_others":
+        if restaurant_name:
             # We have a recommendation, show it
-            self.show_recommendation(restaurant[0]['X'])
+            self.show_recommendation(restaurant_name)
             return
         
         # Move to next question
@@ -302,7 +229,7 @@ class RestaurantRecommenderGUI:
         self.result_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
         
         if restaurant_name:
-            restaurant_info = self.responses.get(restaurant_name, restaurant_name)
+            restaurant = restaurant_info(restaurant_name)
             
             # Result title
             result_label = tk.Label(
@@ -317,7 +244,7 @@ class RestaurantRecommenderGUI:
             # Restaurant name and info
             restaurant_label = tk.Label(
                 self.result_frame,
-                text=restaurant_info,
+                text=f"{restaurant['name']}: {restaurant['url']}",
                 font=("Arial", 14),
                 bg="#f5f5f5",
                 fg="#333333",
@@ -327,7 +254,7 @@ class RestaurantRecommenderGUI:
             
             # Add hyperlink-style formatting
             restaurant_label.config(fg="blue", cursor="hand2")
-            restaurant_label.bind("<Button-1>", lambda e: self.open_url(restaurant_info.split(": ")[1]))
+            restaurant_label.bind("<Button-1>", lambda e: self.open_url(restaurant['url']))
             
             # Instructions for link
             instructions = tk.Label(
@@ -387,9 +314,6 @@ class RestaurantRecommenderGUI:
         self.questions_asked = []
         self.user_answers = {}
         
-        # Re-initialize KB
-        self.initialize_kb()
-        
         # Show welcome frame again
         self.setup_welcome_frame()
 
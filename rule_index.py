@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+Compiled rule index.
+Compiles the restaurant/1 rules of a KB into an inverted index of
+(attribute, value) bitsets, one bit per rule in clause order. Matching a set
+of answers is then a few bitwise ANDs instead of a Prolog query, and needs
+neither PySWIP nor the Prolog lock.
+
+Run this module to check the index against SWI-Prolog on every answer
+combination: python rule_index.py --check-parity
+"""
+
+import sys
+import itertools
+import argparse
+from collections import namedtuple, Counter
+
+from kb_parser import KB_PATH, Term, Var, String, TRUE, read_clauses, flatten, list_items, is_compound
+
+# An askable predicate such as meal_type/1, defined through menuask/3 or ask/2
+Askable = namedtuple('Askable', ['predicate', 'attribute', 'question', 'options'])
+
+# One restaurant/1 clause: every group needs one matching literal, no negated
+# literal may match
+Rule = namedtuple('Rule', ['name', 'groups', 'negations'])
+
+# A ranked rule: how many of its tests failed, which attributes they were on,
+# and the fraction of tests that passed
+Match = namedtuple('Match', ['name', 'misses', 'missed', 'score'])
+
+# The first test of a rule that answers fail: the attribute, the values the
+# test accepts (or, when negated, rejects) and the answer given, None when
+# unanswered. Tests on several attributes give tuples of each.
+Failure = namedtuple('Failure', ['attribute', 'expected', 'actual', 'negated'])
+
+class UnsupportedRuleError(ValueError):
+    pass
+
+def find_askables(clauses):
+    """Map predicate name -> Askable for every P(X) :- menuask(...) / ask(...) clause"""
+    askables = {}
+    for clause in clauses:
+        head, body = clause.head, clause.body
+        if not (isinstance(head, Term) and len(head.args) == 1 and isinstance(head.args[0], Var)):
+            continue
+        var = head.args[0]
+        if is_compound(body, 'menuask', 3) and body.args[1] == var:
+            question, menu = body.args[0], body.args[2]
+            askables[head.name] = Askable(
+                head.name,
+                head.name,
+                question.value if isinstance(question, String) else None,
+                tuple(item.name for item in list_items(menu)),
+            )
+        elif is_compound(body, 'ask', 2) and body.args[1] == var:
+            attribute = body.args[0].name if isinstance(body.args[0], Term) else head.name
+            askables[head.name] = Askable(head.name, attribute, None, ())
+    return askables
+
+def _literal(goal, askables, name):
+    if (isinstance(goal, Term) and len(goal.args) == 1 and goal.name in askables
+            and isinstance(goal.args[0], Term) and not goal.args[0].args):
+        return (askables[goal.name].attribute, goal.args[0].name)
+    raise UnsupportedRuleError(f"Unsupported goal {goal!r} in restaurant({name})")
+
+def fact_rules(clauses):
+    """
+    Rule tuples for a fact-table KB (see kb_facts.py): one per
+    restaurant_id/1 fact, with one group per constrains/2 fact holding the
+    attr/3 values it accepts
+    """
+    names = []
+    values = {}
+    for clause in clauses:
+        term = clause.head
+        if clause.body != TRUE or not isinstance(term, Term):
+            continue
+        args = [arg.name if isinstance(arg, Term) and not arg.args else None for arg in term.args]
+        if term.indicator == ('restaurant_id', 1) and args[0]:
+            names.append(args[0])
+        elif term.indicator == ('constrains', 2) and all(args):
+            values.setdefault(args[0], {}).setdefault(args[1], [])
+        elif term.indicator == ('attr', 3) and all(args):
+            values.setdefault(args[0], {}).setdefault(args[1], []).append(args[2])
+    return [
+        Rule(name, tuple(tuple((attribute, value) for value in accepted)
+                         for attribute, accepted in values.get(name, {}).items()), ())
+        for name in names
+    ]
+
+def compile_rules(clauses, askables):
+    """Turn restaurant/1 clauses into Rule tuples"""
+    rules = []
+    for clause in clauses:
+        head = clause.head
+        if not is_compound(head, 'restaurant', 1):
+            continue
+        if isinstance(head.args[0], Var):
+            # The generic rule of a fact-table KB stands for every restaurant
+            # in its tables
+            rules.extend(fact_rules(clauses))
+            continue
+        if not isinstance(head.args[0], Term) or head.args[0].args:
+            raise UnsupportedRuleError(f"Unsupported rule head {head!r}")
+        name = head.args[0].name
+
+        groups = []
+        negations = []
+        for goal in flatten(clause.body, ','):
+            if goal == TRUE:
+                continue
+            if is_compound(goal, '\\+', 1):
+                negations.append(_literal(goal.args[0], askables, name))
+            else:
+                groups.append(tuple(_literal(alt, askables, name) for alt in flatten(goal, ';')))
+        rules.append(Rule(name, tuple(groups), tuple(negations)))
+    return rules
+
+def count_bits(mask):
+    return bin(mask).count("1")
+
+def iter_bits(mask):
+    """Yield the positions of the set bits of mask, lowest first"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+class RuleIndex:
+    """
+    Inverted index over the restaurant/1 rules.
+
+    Every disjunctive group of a rule lands in a slot keyed by the attributes
+    it tests. A slot stores, per (attribute, value), the rules that accept it,
+    plus the rules that do not constrain the slot at all. A rule matches when
+    each slot accepts it, i.e. the AND of one OR per slot, which mirrors the
+    Prolog semantics: an unanswered attribute fails every test on it.
+    """
+
+    def __init__(self, rules, askables):
+        self.rules = rules
+        self.names = [rule.name for rule in rules]
+        self.askables = askables
+        self.all_mask = (1 << len(rules)) - 1
+        self.excluded = {}
+
+        slots = {}
+        # Per rule, the slot of each of its groups, in clause body order
+        rule_slots = []
+        for bit, rule in enumerate(rules):
+            seen = Counter()
+            keys = []
+            for group in rule.groups:
+                attributes = tuple(sorted({attribute for attribute, _ in group}))
+                key = (attributes, seen[attributes])
+                seen[attributes] += 1
+                keys.append(key)
+                constrained, accepts = slots.setdefault(key, [0, {}])
+                slots[key][0] = constrained | (1 << bit)
+                for literal in group:
+                    accepts[literal] = accepts.get(literal, 0) | (1 << bit)
+            for literal in rule.negations:
+                self.excluded[literal] = self.excluded.get(literal, 0) | (1 << bit)
+            rule_slots.append(keys)
+
+        # (attributes, unconstrained mask, accepts) per slot
+        self.slots = [
+            (attributes, self.all_mask & ~constrained, accepts)
+            for (attributes, _), (constrained, accepts) in slots.items()
+        ]
+        # Per rule, (attribute, accepted values) of each group for explain(),
+        # or (attributes, literals) for groups over several attributes
+        self.tests = []
+        for rule in rules:
+            tests = []
+            for group in rule.groups:
+                attributes = tuple(dict.fromkeys(attribute for attribute, _ in group))
+                if len(attributes) == 1:
+                    tests.append((attributes[0], tuple(value for _, value in group)))
+                else:
+                    tests.append((attributes, group))
+            self.tests.append(tests)
+
+        # Per body position k, {slot: rules whose k-th group is in that slot}
+        position = {key: i for i, key in enumerate(slots)}
+        self.position_slots = []
+        for bit, keys in enumerate(rule_slots):
+            for k, key in enumerate(keys):
+                if k == len(self.position_slots):
+                    self.position_slots.append({})
+                by_slot = self.position_slots[k]
+                by_slot[position[key]] = by_slot.get(position[key], 0) | (1 << bit)
+
+        # Rules with a single-attribute test on each attribute, for narrowing
+        self.constrained_by = {}
+        self.has_multi_attribute_slots = False
+        for attributes, unconstrained, _ in self.slots:
+            if len(attributes) > 1:
+                self.has_multi_attribute_slots = True
+                continue
+            constrained = self.all_mask & ~unconstrained
+            self.constrained_by[attributes[0]] = self.constrained_by.get(attributes[0], 0) | constrained
+        self._narrowing = {}
+
+    @classmethod
+    def compile(cls, kb_content):
+        clauses = read_clauses(kb_content)
+        askables = find_askables(clauses)
+        return cls(compile_rules(clauses, askables), askables)
+
+    @classmethod
+    def from_file(cls, kb_path=KB_PATH):
+        with open(kb_path, "r") as f:
+            return cls.compile(f.read())
+
+    def match_mask(self, answers):
+        """Bitmask of the rules satisfied by answers"""
+        mask = self.all_mask
+        for attributes, unconstrained, accepts in self.slots:
+            ok = unconstrained
+            for attribute in attributes:
+                ok |= accepts.get((attribute, answers.get(attribute)), 0)
+            mask &= ok
+            if not mask:
+                return 0
+        if self.excluded:
+            for literal in answers.items():
+                mask &= ~self.excluded.get(literal, 0)
+        return mask
+
+    def match_masks(self, profiles):
+        """
+        match_mask of every answers dict in profiles, computed column-wise:
+        one pass over the slots for the whole batch, each slot turning into
+        a table lookup per profile
+        """
+        profiles = list(profiles)
+        columns = {}
+
+        def column(attribute):
+            if attribute not in columns:
+                columns[attribute] = [answers.get(attribute) for answers in profiles]
+            return columns[attribute]
+
+        masks = [self.all_mask] * len(profiles)
+        for attributes, unconstrained, accepts in self.slots:
+            if len(attributes) == 1:
+                ok = {value: unconstrained | mask for (_, value), mask in accepts.items()}
+                masks = [mask & ok.get(value, unconstrained) for mask, value in zip(masks, column(attributes[0]))]
+            else:
+                oks = [unconstrained] * len(profiles)
+                for attribute in attributes:
+                    oks = [ok | accepts.get((attribute, value), 0) for ok, value in zip(oks, column(attribute))]
+                masks = [mask & ok for mask, ok in zip(masks, oks)]
+        for (attribute, excluded_value), excluded in self.excluded.items():
+            masks = [mask & ~excluded if value == excluded_value else mask
+                     for mask, value in zip(masks, column(attribute))]
+        return masks
+
+    def narrowing_mask(self, attribute, value):
+        """
+        Rules still satisfiable once attribute=value is known, whatever the
+        other answers turn out to be
+        """
+        key = (attribute, value)
+        mask = self._narrowing.get(key)
+        if mask is None:
+            mask = self.all_mask & ~self.excluded.get(key, 0)
+            for attributes, unconstrained, accepts in self.slots:
+                if attributes == (attribute,):
+                    mask &= unconstrained | accepts.get(key, 0)
+            self._narrowing[key] = mask
+        return mask
+
+    def candidates(self, answers, mask=None):
+        """Narrow mask (default: every rule) by each answer in turn"""
+        mask = self.all_mask if mask is None else mask
+        for attribute, value in answers.items():
+            mask &= self.narrowing_mask(attribute, value)
+        return mask
+
+    def exact_mask(self, answers, candidates):
+        """
+        The rules among candidates that match answers already, i.e. whose
+        tested attributes have all been answered. Equals match_mask(answers)
+        when candidates == self.candidates(answers).
+        """
+        mask = candidates
+        for attribute, constrained in self.constrained_by.items():
+            if attribute not in answers:
+                mask &= ~constrained
+        if mask and self.has_multi_attribute_slots:
+            mask &= self.match_mask(answers)
+        return mask
+
+    def rank(self, answers, max_misses=2, answered_only=False):
+        """
+        Every rule failing at most max_misses of its tests, exact matches
+        first, then by clause order. One pass over the slots feeds each
+        slot's failures into bit-sliced counters, so near-misses cost no
+        extra queries. With answered_only, tests on unanswered attributes
+        are not counted as failures.
+        """
+        # at_least[k]: rules failing at least k tests, for k = 1..max_misses + 1
+        at_least = [self.all_mask] + [0] * (max_misses + 1)
+        failures = []
+
+        def record(attributes, failed):
+            if not failed:
+                return
+            failures.append((attributes, failed))
+            for k in range(max_misses + 1, 0, -1):
+                at_least[k] |= at_least[k - 1] & failed
+
+        for attributes, unconstrained, accepts in self.slots:
+            if answered_only and not any(attribute in answers for attribute in attributes):
+                continue
+            ok = unconstrained
+            for attribute in attributes:
+                ok |= accepts.get((attribute, answers.get(attribute)), 0)
+            record(attributes, self.all_mask & ~ok)
+        for literal in answers.items():
+            record((literal[0],), self.excluded.get(literal, 0))
+
+        matches = []
+        for misses in range(max_misses + 1):
+            mask = at_least[misses] & ~at_least[misses + 1]
+            for bit in iter_bits(mask):
+                rule = self.rules[bit]
+                missed = [attribute
+                          for attributes, failed in failures if failed >> bit & 1
+                          for attribute in attributes]
+                tests = len(rule.groups) + len(rule.negations)
+                score = 1.0 - misses / tests if tests else 1.0
+                matches.append(Match(rule.name, misses, tuple(missed), score))
+        return matches
+
+    def explain(self, answers, mask=None):
+        """
+        (name, Failure or None) for every rule in mask (default: every
+        rule), in clause order: the first of its tests the answers fail, in
+        clause body order with negated tests last, or None for a match.
+        Each slot is evaluated once for all rules, as in match_mask, and the
+        first failing test of every rule is found with one bitset pass per
+        body position.
+        """
+        mask = self.all_mask if mask is None else mask
+        failed = []
+        for attributes, unconstrained, accepts in self.slots:
+            ok = unconstrained
+            for attribute in attributes:
+                ok |= accepts.get((attribute, answers.get(attribute)), 0)
+            failed.append(~ok)
+
+        # bit -> body position of the rule's first failing group
+        first_failure = {}
+        remaining = mask
+        for k, by_slot in enumerate(self.position_slots):
+            failing = 0
+            for slot, rules in by_slot.items():
+                failing |= failed[slot] & rules
+            failing &= remaining
+            for bit in iter_bits(failing):
+                first_failure[bit] = k
+            remaining &= ~failing
+        negated = 0
+        for literal in answers.items():
+            negated |= self.excluded.get(literal, 0)
+        negated &= remaining
+
+        explanations = []
+        for bit in iter_bits(mask):
+            rule = self.rules[bit]
+            failure = None
+            k = first_failure.get(bit)
+            if k is not None:
+                attribute, expected = self.tests[bit][k]
+                if isinstance(attribute, tuple):
+                    actual = tuple(answers.get(name) for name in attribute)
+                else:
+                    actual = answers.get(attribute)
+                failure = Failure(attribute, expected, actual, False)
+            elif negated >> bit & 1:
+                attribute, value = next(literal for literal in rule.negations
+                                        if answers.get(literal[0]) == literal[1])
+                failure = Failure(attribute, (value,), value, True)
+            explanations.append((rule.name, failure))
+        return explanations
+
+    def names_for(self, mask):
+        return [self.names[bit] for bit in iter_bits(mask)]
+
+    def matches(self, answers):
+        """Names of all matching restaurants, in clause order like restaurant(X)"""
+        return self.names_for(self.match_mask(answers))
+
+    def domain(self, attribute):
+        """Possible values of an attribute: its menu, else the values the rules test"""
+        for askable in self.askables.values():
+            if askable.attribute == attribute and askable.options:
+                return askable.options
+        values = []
+        for rule in self.rules:
+            for literal in itertools.chain(itertools.chain.from_iterable(rule.groups), rule.negations):
+                if literal[0] == attribute and literal[1] not in values:
+                    values.append(literal[1])
+        return tuple(values)
+
+    def attributes(self):
+        """Askable attributes in KB declaration order"""
+        return [askable.attribute for askable in self.askables.values()]
+
+    def answer_space(self, order=None):
+        """
+        Yield every prefix of answers in the given attribute order, from no
+        answers up to every attribute answered.
+        """
+        order = order or self.attributes()
+        domains = [self.domain(attribute) for attribute in order]
+        for length in range(len(order) + 1):
+            for values in itertools.product(*domains[:length]):
+                yield dict(zip(order, values))
+
+def check_parity(index, knowledge_base, order=None, progress=None):
+    """Compare the index with SWI-Prolog; return (checked, mismatches)"""
+    checked = 0
+    mismatches = []
+    for answers in index.answer_space(order):
+        expected = knowledge_base.query(answers)
+        actual = index.matches(answers)
+        if expected != actual:
+            mismatches.append((answers, expected, actual))
+        checked += 1
+        if progress and checked % progress == 0:
+            print(f"  checked {checked} combinations, {len(mismatches)} mismatches")
+    return checked, mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Compiled restaurant rule index")
+    parser.add_argument('--kb', default=KB_PATH, help="knowledge base to compile")
+    parser.add_argument('--check-parity', action='store_true',
+                        help="compare against SWI-Prolog for every answer combination")
+    args = parser.parse_args()
+
+    index = RuleIndex.from_file(args.kb)
+    print(f"Compiled {len(index.rules)} rules into {len(index.slots)} slots "
+          f"over attributes {', '.join(index.attributes())}")
+
+    if args.check_parity:
+        from kb_manager import KnowledgeBase
+
+        knowledge_base = KnowledgeBase(args.kb)
+        checked, mismatches = check_parity(index, knowledge_base, progress=50000)
+        knowledge_base.close()
+        for answers, expected, actual in mismatches[:20]:
+            print(f"MISMATCH {answers}: prolog={expected} index={actual}")
+        print(f"Checked {checked} answer combinations: {len(mismatches)} mismatches")
+        return 1 if mismatches else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""
+Server-side sessions.
+Keeps session data on the server and only a random session id in the
+cookie, so requests no longer carry, re-sign and re-send the whole session.
+Answers are stored as a fixed-width vector with one small int per
+attribute, and sessions idle for longer than the timeout are evicted.
+
+Two stores are provided: MemoryStore, for a single server process, and
+SQLiteStore, a local database that survives restarts and can be shared by
+several processes on one host.
+"""
+
+import json
+import time
+import sqlite3
+import secrets
+import threading
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+IDLE_TIMEOUT = 30 * 60
+
+class AnswerCodec:
+    """
+    Packs an answers dict into bytes, one byte per attribute: 0 when the
+    attribute is unanswered, else 1 + the index of the value in its domain.
+    """
+
+    def __init__(self, domains):
+        self.attributes = list(domains)
+        self.domains = [tuple(values) for values in domains.values()]
+        self.position = {attribute: i for i, attribute in enumerate(self.attributes)}
+        self.codes = [{value: code for code, value in enumerate(values, 1)} for values in self.domains]
+        if any(len(values) > 255 for values in self.domains):
+            raise ValueError("Attribute domains are limited to 255 values")
+
+    def encode(self, answers):
+        """The answer vector, or None if an answer is outside its domain"""
+        vector = bytearray(len(self.attributes))
+        for attribute, value in answers.items():
+            i = self.position.get(attribute)
+            code = self.codes[i].get(value) if i is not None else None
+            if code is None:
+                return None
+            vector[i] = code
+        return bytes(vector)
+
+    def decode(self, vector):
+        return {
+            attribute: values[code - 1]
+            for attribute, values, code in zip(self.attributes, self.domains, vector) if code
+        }
+
+    def encode_attributes(self, attributes):
+        """A list of attribute names as bytes of positions, or None"""
+        try:
+            return bytes(self.position[attribute] for attribute in attributes)
+        except (KeyError, TypeError):
+            return None
+
+    def decode_attributes(self, positions):
+        return [self.attributes[i] for i in positions]
+
+    def pack(self, data):
+        """(answers vector, asked vector, everything else) for a session dict"""
+        data = dict(data)
+        answers = self.encode(data['answers']) if isinstance(data.get('answers'), dict) else None
+        if answers is not None:
+            del data['answers']
+        asked = self.encode_attributes(data['asked']) if isinstance(data.get('asked'), list) else None
+        if asked is not None:
+            del data['asked']
+        return answers, asked, data
+
+    def unpack(self, answers, asked, data):
+        data = dict(data)
+        if answers is not None:
+            data['answers'] = self.decode(answers)
+        if asked is not None:
+            data['asked'] = self.decode_attributes(asked)
+        return data
+
+class MemoryStore:
+    """Sessions in a dict of this process, least recently used first"""
+
+    def __init__(self, codec, idle_timeout=IDLE_TIMEOUT, max_sessions=100000):
+        self.codec = codec
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.records = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def _evict(self, now):
+        # Oldest first, so stop at the first session still in use
+        while self.records:
+            sid, (accessed, _) = next(iter(self.records.items()))
+            if accessed > now - self.idle_timeout and len(self.records) <= self.max_sessions:
+                break
+            del self.records[sid]
+            self.evictions += 1
+
+    def load(self, sid):
+        now = time.monotonic()
+        with self.lock:
+            self._evict(now)
+            record = self.records.get(sid)
+            if record is None:
+                return None
+            self.records[sid] = (now, record[1])
+            self.records.move_to_end(sid)
+        return self.codec.unpack(*record[1])
+
+    def save(self, sid, data):
+        packed = self.codec.pack(data)
+        now = time.monotonic()
+        with self.lock:
+            self.records[sid] = (now, packed)
+            self.records.move_to_end(sid)
+            self._evict(now)
+
+    def delete(self, sid):
+        with self.lock:
+            self.records.pop(sid, None)
+
+    def stats(self):
+        with self.lock:
+            return {'backend': 'memory', 'sessions': len(self.records), 'evictions': self.evictions}
+
+class SQLiteStore:
+    """
+    Sessions in a local SQLite database. Last-access times are only
+    written back once per touch_interval, and idle sessions are deleted at
+    most once per evict_interval, so most requests cost a single read.
+    """
+
+    def __init__(self, codec, path, idle_timeout=IDLE_TIMEOUT, touch_interval=60.0, evict_interval=60.0):
+        self.codec = codec
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.touch_interval = touch_interval
+        self.evict_interval = evict_interval
+        self.local = threading.local()
+        self.next_eviction = 0.0
+        self.evictions = 0
+        with self.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    answers BLOB,
+                    asked BLOB,
+                    data TEXT NOT NULL,
+                    accessed REAL NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_accessed ON sessions (accessed)")
+
+    def connection(self):
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def load(self, sid):
+        now = time.time()
+        conn = self.connection()
+        row = conn.execute("SELECT answers, asked, data, accessed FROM sessions WHERE id = ?",
+                           (sid,)).fetchone()
+        if row is None or row[3] < now - self.idle_timeout:
+            return None
+        if row[3] < now - self.touch_interval:
+            with conn:
+                conn.execute("UPDATE sessions SET accessed = ? WHERE id = ?", (now, sid))
+        return self.codec.unpack(row[0], row[1], json.loads(row[2]))
+
+    def save(self, sid, data):
+        answers, asked, rest = self.codec.pack(data)
+        now = time.time()
+        conn = self.connection()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO sessions (id, answers, asked, data, accessed) "
+                         "VALUES (?, ?, ?, ?, ?)", (sid, answers, asked, json.dumps(rest), now))
+            if now >= self.next_eviction:
+                self.next_eviction = now + self.evict_interval
+                deleted = conn.execute("DELETE FROM sessions WHERE accessed < ?", (now - self.idle_timeout,))
+                self.evictions += deleted.rowcount
+
+    def delete(self, sid):
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+
+    def stats(self):
+        count = self.connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {'backend': 'sqlite', 'sessions': count, 'evictions': self.evictions}
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface keeping the data in a store, keyed by a cookie id"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(app.session_cookie_name)
+        if sid:
+            data = self.store.load(sid)
+            if data is not None:
+                return ServerSession(data, sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(24), new=True)
+
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(app.session_cookie_name, domain=domain, path=path)
+            return
+        if session.modified:
+            self.store.save(session.sid, dict(session))
+        if session.new:
+            response.set_cookie(
+                app.session_cookie_name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Test and benchmark harness.
+Runs the profiles in test_cases.json against each inference backend, checks
+the recommendation for every case and times it, and writes the results in
+the JSON layout of pytest-benchmark, so runs can be compared over time:
+
+    python test_harness.py [--backends direct,index,prolog] [--rounds 20] [--json results.json]
+
+The web app serves the same report at /test_cases and /api/test_cases.
+Backends that are safe to call from several threads run their cases in
+parallel; the in-process Prolog engine runs them one at a time.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import platform
+import argparse
+import datetime
+import statistics
+import subprocess
+from collections import namedtuple, Counter
+from concurrent.futures import ThreadPoolExecutor
+from recommendations import first_restaurant
+
+CASES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_cases.json")
+DEFAULT_ROUNDS = 20
+FORMAT_VERSION = "1"
+
+# query(answers) returns restaurant ids in clause order. A partial backend,
+# such as the direct-match fast path, may answer nothing for a profile it
+# does not cover; that case is skipped rather than failed.
+Backend = namedtuple('Backend', ['name', 'query', 'parallel', 'partial'])
+
+def load_cases(path=CASES_PATH):
+    """[{'name', 'answers', 'expected'}], expected being a restaurant id or None"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [{'name': case['name'], 'answers': case['answers'], 'expected': case.get('expected')}
+            for case in data['cases']]
+
+def run_case(backend, case, rounds):
+    """Check one case once, then time it over rounds calls"""
+    try:
+        actual = first_restaurant(backend.query(case['answers']))
+    except Exception as e:
+        return {'backend': backend.name, 'case': case['name'], 'expected': case['expected'],
+                'actual': None, 'outcome': 'error', 'error': str(e), 'timings': []}
+    if actual == case['expected']:
+        outcome = 'passed'
+    elif backend.partial and actual is None:
+        outcome = 'skipped'
+    else:
+        outcome = 'failed'
+
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        backend.query(case['answers'])
+        timings.append(time.perf_counter() - start)
+    return {'backend': backend.name, 'case': case['name'], 'expected': case['expected'],
+            'actual': actual, 'outcome': outcome, 'timings': timings}
+
+def run_suite(cases, backends, rounds=DEFAULT_ROUNDS, workers=None):
+    """Every case against every backend, one backend after the other"""
+    workers = workers or min(len(cases), os.cpu_count() or 1) or 1
+    results = []
+    for backend in backends:
+        if backend.parallel and workers > 1:
+            with ThreadPoolExecutor(workers) as executor:
+                results.extend(executor.map(lambda case: run_case(backend, case, rounds), cases))
+        else:
+            results.extend(run_case(backend, case, rounds) for case in cases)
+    return results
+
+def summarize(results):
+    """{backend: {'passed': n, 'failed': n, 'skipped': n, 'error': n}}"""
+    summary = {}
+    for result in results:
+        counts = summary.setdefault(result['backend'], Counter(passed=0, failed=0, skipped=0, error=0))
+        counts[result['outcome']] += 1
+    return {backend: dict(counts) for backend, counts in summary.items()}
+
+def timing_stats(timings):
+    """pytest-benchmark's stats block for a list of timings, in seconds"""
+    if not timings:
+        return None
+    ordered = sorted(timings)
+    mean = statistics.fmean(ordered)
+    stddev = statistics.stdev(ordered) if len(ordered) > 1 else 0.0
+    if len(ordered) > 1:
+        q1, median, q3 = statistics.quantiles(ordered, n=4, method='inclusive')
+    else:
+        q1 = median = q3 = ordered[0]
+    iqr = q3 - q1
+    low, high = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+    inside = [t for t in ordered if low <= t <= high]
+    iqr_outliers = len(ordered) - len(inside)
+    stddev_outliers = sum(1 for t in ordered if abs(t - mean) > stddev)
+    return {
+        'min': ordered[0],
+        'max': ordered[-1],
+        'mean': mean,
+        'stddev': stddev,
+        'rounds': len(ordered),
+        'median': median,
+        'iqr': iqr,
+        'q1': q1,
+        'q3': q3,
+        'iqr_outliers': iqr_outliers,
+        'stddev_outliers': stddev_outliers,
+        'outliers': f"{stddev_outliers};{iqr_outliers}",
+        'ld15iqr': inside[0],
+        'hd15iqr': inside[-1],
+        'ops': 1.0 / mean if mean else 0.0,
+        'total': sum(ordered),
+        'iterations': 1,
+    }
+
+def machine_info():
+    return {
+        'node': socket.gethostname(),
+        'processor': platform.processor(),
+        'machine': platform.machine(),
+        'python_implementation': platform.python_implementation(),
+        'python_version': platform.python_version(),
+        'release': platform.release(),
+        'system': platform.system(),
+        'cpu': {'count': os.cpu_count()},
+    }
+
+def commit_info():
+    """The checked-out commit, when running from a git checkout"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True,
+                                text=True, timeout=5).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                    capture_output=True, text=True, timeout=5).stdout.strip())
+    except (OSError, subprocess.SubprocessError):
+        return {}
+    return {'id': commit, 'dirty': dirty} if commit else {}
+
+def benchmark_json(results):
+    """Results in the layout of pytest-benchmark's --benchmark-json output"""
+    benchmarks = []
+    for result in results:
+        benchmarks.append({
+            'group': result['backend'],
+            'name': f"test_case[{result['backend']}-{result['case']}]",
+            'fullname': f"test_harness.py::test_case[{result['backend']}-{result['case']}]",
+            'params': {'backend': result['backend'], 'case': result['case']},
+            'param': f"{result['backend']}-{result['case']}",
+            'extra_info': {key: result[key] for key in ('expected', 'actual', 'outcome', 'error') if key in result},
+            'stats': timing_stats(result['timings']),
+        })
+    return {
+        'machine_info': machine_info(),
+        'commit_info': commit_info(),
+        'benchmarks': benchmarks,
+        'datetime': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'version': FORMAT_VERSION,
+    }
+
+def app_backends(app, names=None, in_process_prolog=None):
+    """
+    The backends the web app can run: the direct-match fast path, the rule
+    index and the matrix matcher always, the in-process Prolog engine and
+    the Prolog pool when the app was started with them (or, for Prolog,
+    when in_process_prolog says the caller owns the engine's thread)
+    """
+    from matrix_matcher import MatrixMatcher
+
+    def direct(answers):
+        name = app.direct_restaurant_match(answers)
+        return [name] if name else []
+
+    def prolog(answers):
+        app.knowledge_base.load(site="test_cases")
+        return app.knowledge_base.query(answers, site="test_cases")
+
+    kb = app.current_kb()
+    matrix_matcher = kb.matrix_matcher or MatrixMatcher(kb.rule_index)
+    if in_process_prolog is None:
+        in_process_prolog = app.INFERENCE_BACKEND == "prolog"
+    available = {
+        'direct': Backend('direct', direct, True, True),
+        'index': Backend('index', kb.rule_index.matches, True, False),
+        'matrix': Backend('matrix', matrix_matcher.matches, True, False),
+    }
+    if in_process_prolog:
+        available['prolog'] = Backend('prolog', prolog, False, False)
+    if app.INFERENCE_BACKEND == "pool" or (names and 'pool' in names):
+        available['pool'] = Backend('pool', lambda answers: app.get_prolog_pool().query(answers), True, False)
+    if names is None:
+        return list(available.values())
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unavailable backends: {', '.join(unknown)} (available: {', '.join(available)})")
+    return [available[name] for name in names]
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and time the test profiles against each inference backend")
+    parser.add_argument('--cases', default=CASES_PATH, help="test profiles (default: test_cases.json)")
+    parser.add_argument('--backends', help="comma-separated: direct,index,matrix,prolog,pool (default: all but pool)")
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS, help="timed calls per case")
+    parser.add_argument('--workers', type=int, help="threads per parallel backend (default: one per case, up to the CPU count)")
+    parser.add_argument('--json', help="write pytest-benchmark style results to this file")
+    args = parser.parse_args()
+
+    import app
+
+    names = args.backends.split(',') if args.backends else None
+    # This process owns its Prolog engine and calls it from the main thread
+    try:
+        backends = app_backends(app, names, in_process_prolog=True)
+    except ValueError as e:
+        parser.error(str(e))
+
+    results = run_suite(load_cases(args.cases), backends, args.rounds, args.workers)
+    print(f"{'backend':<8} {'case':<40} {'outcome':<8} {'median ms':>10} {'max ms':>9}")
+    for result in results:
+        stats = timing_stats(result['timings'])
+        median = f"{stats['median'] * 1000:.3f}" if stats else "-"
+        worst = f"{stats['max'] * 1000:.3f}" if stats else "-"
+        print(f"{result['backend']:<8} {result['case'][:40]:<40} {result['outcome']:<8} {median:>10} {worst:>9}")
+        if result['outcome'] in ('failed', 'error'):
+            print(f"         expected {result['expected']}, got {result.get('error') or result['actual']}")
+    for backend, counts in summarize(results).items():
+        print(f"{backend}: {counts['passed']} passed, {counts['failed']} failed, "
+              f"{counts['skipped']} skipped, {counts['error']} errors")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(benchmark_json(results), f, indent=2)
+        print(f"Wrote {args.json}")
+    return 1 if any(result['outcome'] in ('failed', 'error') for result in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""
+Shared fixtures: the rule index of kb.pl and of a synthetic KB with
+disjunctive tests, and random answer profiles to check them on.
+"""
+
+import os
+import sys
+import random
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from rule_index import RuleIndex
+from generate_kb import generate_kb
+
+SYNTHETIC_RESTAURANTS = 200
+PROFILES = 2000
+
+def random_profiles(index, count, seed=152):
+    """
+    Answer dicts over a random subset of the attributes, with the odd value
+    outside an attribute's domain
+    """
+    rng = random.Random(seed)
+    attributes = index.attributes()
+    profiles = []
+    for _ in range(count):
+        answers = {}
+        for attribute in rng.sample(attributes, rng.randint(0, len(attributes))):
+            domain = index.domain(attribute)
+            answers[attribute] = rng.choice(domain) if rng.random() < 0.95 or not domain else "unknown"
+        profiles.append(answers)
+    return profiles
+
+@pytest.fixture(scope="session")
+def synthetic_kb():
+    rule_kb, _, _ = generate_kb(SYNTHETIC_RESTAURANTS)
+    return rule_kb
+
+@pytest.fixture(scope="session", params=["kb.pl", "synthetic"])
+def index(request, synthetic_kb):
+    if request.param == "kb.pl":
+        return RuleIndex.from_file()
+    return RuleIndex.compile(synthetic_kb)
+
+@pytest.fixture(scope="session")
+def profiles(index):
+    return random_profiles(index, PROFILES)
@@ -0,0 +1,85 @@
+"""
+transform_kb, the rewrite of kb.pl that Prolog consults: the asking
+predicates, the dropped foreign I/O and the reader's error handling.
+Runs without SWI-Prolog.
+"""
+
+import pytest
+
+from kb_parser import KB_PATH, read_clauses
+from kb_manager import transform_kb, body_goals, REPLACEMENTS, FOREIGN_IO
+from rule_index import find_askables
+
+# The asking predicates as kb.pl defines them, plus a helper that talks to
+# the user and one attribute asked with ask/2 and one with menuask/3
+INTERACTIVE_KB = """
+price(X) :- menuask("Budget?", X, [cheap, dear]).
+location(X) :- ask(location, X).
+ask(A, V) :- known(yes, A, V), !.
+ask(A, V) :- read_py(A, V, Y), asserta(known(Y, A, V)), Y == yes.
+menuask(A, V, Menu) :- read_menu_py(A, X, Menu), check_val(X, A, V, Menu).
+check_val(X, A, V, Menu) :- dialog_response(X), menuask(A, V, Menu).
+restaurant(deli) :- location(here), price(cheap).
+"""
+
+@pytest.fixture(scope="module")
+def kb():
+    with open(KB_PATH, "r") as f:
+        return f.read()
+
+def clauses_of(text):
+    """Clause terms by predicate indicator"""
+    by_indicator = {}
+    for clause in read_clauses(text):
+        if clause.head is not None:
+            by_indicator.setdefault(clause.head.indicator, []).append(clause)
+    return by_indicator
+
+def test_asking_predicates_replaced(kb):
+    clauses = clauses_of(transform_kb(kb))
+    for indicator, replacement in REPLACEMENTS.items():
+        expected = [clause.term for clause in read_clauses(replacement)]
+        assert [clause.term for clause in clauses[indicator]] == expected, indicator
+
+def test_menu_attributes(kb):
+    """Each menuask question maps back to the attribute that asks it"""
+    clauses = clauses_of(transform_kb(kb))
+    mapped = {clause.term.args[0].value: clause.term.args[1].name for clause in clauses[('menu_attribute', 2)]}
+    askables = find_askables(read_clauses(kb)).values()
+    expected = {askable.question: askable.attribute for askable in askables if askable.question is not None}
+    assert mapped == expected
+    assert 'location' not in mapped.values()
+
+def test_foreign_io_dropped(kb):
+    for text in (kb, INTERACTIVE_KB):
+        clauses = clauses_of(transform_kb(text))
+        for indicator, predicate in clauses.items():
+            for clause in predicate:
+                called = {goal.indicator for goal in body_goals(clause.body) if hasattr(goal, 'indicator')}
+                assert not called & FOREIGN_IO, indicator
+    clauses = clauses_of(transform_kb(INTERACTIVE_KB))
+    assert ('check_val', 4) not in clauses
+    assert len(clauses[('restaurant', 1)]) == 1
+
+def test_rest_of_source_kept():
+    transformed = transform_kb(INTERACTIVE_KB)
+    assert 'price(X) :- menuask("Budget?", X, [cheap, dear]).' in transformed
+    assert "restaurant(deli) :- location(here), price(cheap)." in transformed
+
+def test_unparseable_kb():
+    with pytest.raises(ValueError):
+        transform_kb("restaurant(deli) :- location(here")
+    with pytest.raises(ValueError):
+        transform_kb('name(X) :- X = "unterminated.')
+
+def test_kept_clause_calling_dropped_predicate():
+    with pytest.raises(ValueError, match="check_val/4"):
+        transform_kb(INTERACTIVE_KB + "restaurant(any) :- check_val(a, b, c, []).\n")
+
+def test_reformatted_kb(kb):
+    """The same clauses, laid out and commented differently, transform to the same clauses"""
+    reformatted = "".join(f"% clause {number}\n{clause.term!r}  .\n\n"
+                          for number, clause in enumerate(read_clauses(kb)))
+    assert reformatted != kb
+    assert ([clause.term for clause in read_clauses(transform_kb(reformatted))] ==
+            [clause.term for clause in read_clauses(transform_kb(kb))])
@@ -0,0 +1,57 @@
+"""
+The derived matchers against the rule index they are built from: the NumPy
+matrix matcher, the exact-match table and the lookup table.
+"""
+
+from rule_index import RuleIndex
+from matrix_matcher import MatrixMatcher
+from lookup_table import LookupTable, build_table, FIXED_ANSWERS
+from exact_matches import ExactMatchTable, load_pinned, PINNED_PATH
+from recommendations import first_restaurant
+from conftest import random_profiles
+
+def test_matrix_matches(index, profiles):
+    matcher = MatrixMatcher(index)
+    assert matcher.match_lists(profiles) == [index.matches(answers) for answers in profiles]
+
+def test_matrix_misses(index, profiles):
+    """misses() counts the failed tests of every restaurant as rank() does"""
+    matcher = MatrixMatcher(index)
+    max_misses = len(index.slots) + len(index.excluded)
+    for answered_only in (False, True):
+        misses = matcher.misses(matcher.encode(profiles), answered_only=answered_only)
+        for answers, row in zip(profiles, misses.tolist()):
+            expected = {match.name: match.misses
+                        for match in index.rank(answers, max_misses, answered_only=answered_only)}
+            assert dict(zip(index.names, row)) == expected, answers
+
+def test_exact_match_table(index):
+    table = ExactMatchTable(index)
+    assert len(table) > 0
+    for key, name in table.entries.items():
+        answers = {attribute: value for attribute, value in zip(table.attributes, key) if value is not None}
+        assert name == first_restaurant(index.matches(answers)), answers
+
+def test_pinned_profiles():
+    table = ExactMatchTable.from_file(pinned_path=PINNED_PATH)
+    assert table.disagreements == []
+    for _, answers, expected in load_pinned():
+        assert table.lookup(answers) == expected
+
+def test_lookup_table(tmp_path):
+    """Any subset of answers, in any order, is looked up as the index matches it"""
+    index = RuleIndex.from_file()
+    path = str(tmp_path / "kb_lookup.bin")
+    build_table(index, [attribute for attribute in index.attributes() if attribute not in FIXED_ANSWERS], path)
+    table = LookupTable(path)
+    try:
+        for answers in random_profiles(index, 2000):
+            answers = dict(reversed(list(answers.items())), **FIXED_ANSWERS)
+            mask = table.lookup(answers)
+            if any(value not in index.domain(attribute) for attribute, value in answers.items()):
+                assert mask is None, answers
+            else:
+                assert mask == index.match_mask(answers), answers
+        assert table.lookup({}) is None
+    finally:
+        table.close()
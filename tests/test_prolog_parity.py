@@ -0,0 +1,39 @@
+"""
+The rule index against SWI-Prolog: every answer prefix of kb.pl, and random
+profiles of a synthetic KB. Skipped without pyswip and SWI-Prolog.
+"""
+
+import shutil
+
+import pytest
+
+from rule_index import RuleIndex, check_parity
+from conftest import random_profiles
+
+if shutil.which("swipl") is None:
+    pytest.skip("SWI-Prolog is not installed", allow_module_level=True)
+try:
+    import pyswip  # noqa: F401
+except Exception as e:
+    pytest.skip(f"pyswip is not usable: {e}", allow_module_level=True)
+
+from kb_manager import KnowledgeBase
+
+@pytest.fixture(scope="module")
+def knowledge_base():
+    # pyswip has one engine per process, so the KBs take turns in it
+    knowledge_base = KnowledgeBase()
+    yield knowledge_base
+    knowledge_base.close()
+
+def test_kb_parity(knowledge_base):
+    knowledge_base.reload()
+    checked, mismatches = check_parity(RuleIndex.from_file(), knowledge_base)
+    assert checked > 0
+    assert mismatches == []
+
+def test_synthetic_kb_parity(knowledge_base, synthetic_kb):
+    knowledge_base.reload(synthetic_kb)
+    index = RuleIndex.compile(synthetic_kb)
+    for answers in random_profiles(index, 500):
+        assert knowledge_base.query(answers) == index.matches(answers), answers
@@ -0,0 +1,109 @@
+"""
+The rule index against a brute-force evaluator of the same rules: matching,
+ranking near-misses, explanations and narrowing by partial answers.
+"""
+
+from collections import Counter
+
+from rule_index import Failure
+
+def accepted(group, answers):
+    return any(answers.get(attribute) == value for attribute, value in group)
+
+def group_attributes(group):
+    return tuple(dict.fromkeys(attribute for attribute, _ in group))
+
+def brute_matches(index, answers):
+    return [rule.name for rule in index.rules
+            if all(accepted(group, answers) for group in rule.groups)
+            and not any(answers.get(attribute) == value for attribute, value in rule.negations)]
+
+def brute_rank(index, answers, max_misses, answered_only):
+    """(name, misses, Counter of missed attributes, score), exact matches first"""
+    ranked = []
+    for position, rule in enumerate(index.rules):
+        missed = []
+        misses = 0
+        for group in rule.groups:
+            if accepted(group, answers):
+                continue
+            attributes = group_attributes(group)
+            if answered_only and not any(attribute in answers for attribute in attributes):
+                continue
+            missed.extend(attributes)
+            misses += 1
+        for attribute, value in rule.negations:
+            if answers.get(attribute) == value:
+                missed.append(attribute)
+                misses += 1
+        if misses <= max_misses:
+            tests = len(rule.groups) + len(rule.negations)
+            score = 1.0 - misses / tests if tests else 1.0
+            ranked.append((misses, position, (rule.name, misses, Counter(missed), score)))
+    return [entry for _, _, entry in sorted(ranked, key=lambda item: item[:2])]
+
+def brute_explain(index, answers):
+    explanations = []
+    for rule in index.rules:
+        failure = None
+        for group in rule.groups:
+            if accepted(group, answers):
+                continue
+            attributes = group_attributes(group)
+            if len(attributes) == 1:
+                failure = Failure(attributes[0], tuple(value for _, value in group), answers.get(attributes[0]), False)
+            else:
+                failure = Failure(attributes, group, tuple(answers.get(attribute) for attribute in attributes), False)
+            break
+        else:
+            for attribute, value in rule.negations:
+                if answers.get(attribute) == value:
+                    failure = Failure(attribute, (value,), value, True)
+                    break
+        explanations.append((rule.name, failure))
+    return explanations
+
+def brute_satisfiable(index, answers):
+    """Rules some completion of answers can still match"""
+    return [rule.name for rule in index.rules
+            if all(any(attribute not in answers or answers[attribute] == value for attribute, value in group)
+                   for group in rule.groups)
+            and not any(answers.get(attribute) == value for attribute, value in rule.negations)]
+
+def test_matches(index, profiles):
+    for answers in profiles:
+        assert index.matches(answers) == brute_matches(index, answers), answers
+
+def test_match_masks_agree_with_match_mask(index, profiles):
+    assert index.match_masks(profiles) == [index.match_mask(answers) for answers in profiles]
+
+def test_rank(index, profiles):
+    for answered_only in (False, True):
+        for answers in profiles[:1000]:
+            ranked = [(match.name, match.misses, Counter(match.missed), match.score)
+                      for match in index.rank(answers, 2, answered_only=answered_only)]
+            assert ranked == brute_rank(index, answers, 2, answered_only), answers
+
+def test_explain(index, profiles):
+    for answers in profiles:
+        assert index.explain(answers) == brute_explain(index, answers), answers
+
+def test_explain_within_mask(index, profiles):
+    for answers in profiles[:200]:
+        mask = index.candidates(answers)
+        expected = dict(brute_explain(index, answers))
+        assert index.explain(answers, mask) == [(name, expected[name]) for name in index.names_for(mask)]
+
+def test_narrowing(index, profiles):
+    """candidates() keeps exactly the rules the answers so far leave satisfiable"""
+    for answers in profiles:
+        candidates = index.candidates(answers)
+        assert index.names_for(candidates) == brute_satisfiable(index, answers), answers
+        assert index.exact_mask(answers, candidates) == index.match_mask(answers), answers
+
+def test_narrowing_one_answer_at_a_time(index, profiles):
+    for answers in profiles[:200]:
+        mask = None
+        for attribute, value in answers.items():
+            mask = index.candidates({attribute: value}, mask)
+        assert (mask if mask is not None else index.all_mask) == index.candidates(answers)
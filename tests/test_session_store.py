@@ -0,0 +1,163 @@
+"""
+Server-side sessions: the answer codec, idle expiry and eviction in both
+stores, and the session id cookie.
+"""
+
+import types
+
+import pytest
+from flask import Flask, session
+
+import session_store
+from session_store import AnswerCodec, MemoryStore, SQLiteStore, ServerSessionInterface
+
+DOMAINS = {
+    'meal_type': ['breakfast', 'lunch', 'dinner'],
+    'price': ['affordable', 'moderate', 'expensive'],
+    'noise': ['quiet', 'moderate', 'lively'],
+}
+
+@pytest.fixture
+def codec():
+    return AnswerCodec(DOMAINS)
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable clock standing in for both time.monotonic and time.time"""
+    now = [1000.0]
+    fake = types.SimpleNamespace(monotonic=lambda: now[0], time=lambda: now[0])
+    monkeypatch.setattr(session_store, "time", fake)
+    return now
+
+def session_data(**answers):
+    return {'answers': answers, 'asked': list(answers), 'q_index': len(answers), 'inferred': {}}
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, codec, clock, tmp_path):
+    if request.param == "memory":
+        return MemoryStore(codec, idle_timeout=60)
+    return SQLiteStore(codec, str(tmp_path / "sessions.db"), idle_timeout=60, touch_interval=10, evict_interval=0)
+
+def test_codec_round_trip(codec):
+    for answers in ({}, {'price': 'moderate'}, {'meal_type': 'dinner', 'price': 'affordable', 'noise': 'moderate'}):
+        vector = codec.encode(answers)
+        assert len(vector) == len(DOMAINS)
+        assert codec.decode(vector) == answers
+    assert codec.encode({'noise': 'quiet'}) == bytes([0, 0, 1])
+
+def test_codec_unknown_values(codec):
+    """Answers the vector cannot hold stay in the plain data instead"""
+    assert codec.encode({'price': 'free'}) is None
+    assert codec.encode({'location': 'san_francisco'}) is None
+    assert codec.encode_attributes(['meal_type', 'location']) is None
+    for data in (session_data(price='free'), session_data(location='san_francisco'),
+                 {'answers': 'not a dict', 'asked': None}):
+        packed = codec.pack(data)
+        assert codec.unpack(*packed) == data
+
+def test_codec_pack(codec):
+    data = session_data(meal_type='lunch', noise='lively')
+    answers, asked, rest = codec.pack(data)
+    assert (answers, asked) == (bytes([2, 0, 3]), bytes([0, 2]))
+    assert rest == {'q_index': 2, 'inferred': {}}
+    assert codec.unpack(answers, asked, rest) == data
+
+def test_codec_domain_limit():
+    with pytest.raises(ValueError):
+        AnswerCodec({'cuisine': [f"c{i}" for i in range(256)]})
+
+def test_store_round_trip(store):
+    data = session_data(meal_type='breakfast', price='expensive')
+    store.save("a", data)
+    assert store.load("a") == data
+    assert store.load("missing") is None
+    store.save("a", session_data())
+    assert store.load("a") == session_data()
+    store.delete("a")
+    assert store.load("a") is None
+
+def test_store_idle_expiry(store, clock):
+    store.save("idle", session_data(price='moderate'))
+    store.save("busy", session_data(noise='quiet'))
+    for _ in range(3):
+        clock[0] += 40
+        assert store.load("busy") is not None
+    assert store.load("idle") is None
+    store.save("new", session_data())
+    assert store.stats()['sessions'] == 2
+    assert store.stats()['evictions'] == 1
+
+def test_memory_store_evicts_least_recently_used(codec, clock):
+    store = MemoryStore(codec, idle_timeout=60, max_sessions=3)
+    for sid in "abc":
+        store.save(sid, session_data())
+        clock[0] += 1
+    store.load("a")
+    store.save("d", session_data())
+    assert [sid for sid in "abcd" if store.load(sid) is not None] == ["a", "c", "d"]
+    assert store.stats() == {'backend': 'memory', 'sessions': 3, 'evictions': 1}
+
+def test_sqlite_store_touch_interval(codec, clock, tmp_path):
+    """A load only writes back its access time once touch_interval has passed"""
+    store = SQLiteStore(codec, str(tmp_path / "sessions.db"), idle_timeout=60, touch_interval=30)
+    store.save("a", session_data())
+    clock[0] += 20
+    assert store.load("a") is not None
+    clock[0] += 45
+    assert store.load("a") is None
+    store.save("a", session_data())
+    clock[0] += 35
+    assert store.load("a") is not None
+    clock[0] += 45
+    assert store.load("a") is not None
+
+@pytest.fixture
+def client(store):
+    app = Flask(__name__)
+    app.session_interface = ServerSessionInterface(store)
+
+    @app.route('/answer/<attribute>/<value>')
+    def answer(attribute, value):
+        answers = session.get('answers', {})
+        answers[attribute] = value
+        session['answers'] = answers
+        return "ok"
+
+    @app.route('/answers')
+    def answers():
+        return session.get('answers', {})
+
+    @app.route('/clear')
+    def clear():
+        session.clear()
+        return "ok"
+
+    return app.test_client()
+
+def session_cookie(client):
+    cookies = [cookie for cookie in client.cookie_jar if cookie.name == "session"]
+    return cookies[0].value if cookies else None
+
+def test_session_cookie(client, store):
+    assert client.get('/answers').get_json() == {}
+    assert session_cookie(client) is None
+
+    client.get('/answer/price/moderate')
+    sid = session_cookie(client)
+    assert sid and "moderate" not in sid
+    assert store.load(sid)['answers'] == {'price': 'moderate'}
+
+    response = client.get('/answer/noise/quiet')
+    assert "Set-Cookie" not in response.headers
+    assert client.get('/answers').get_json() == {'price': 'moderate', 'noise': 'quiet'}
+
+    client.get('/clear')
+    assert session_cookie(client) is None
+    assert store.load(sid) is None
+
+def test_unknown_session_id(client):
+    """A stale or forged id starts a fresh session under a new id"""
+    client.set_cookie("localhost", "session", "forged")
+    assert client.get('/answers').get_json() == {}
+    client.get('/answer/price/affordable')
+    assert session_cookie(client) not in (None, "forged")
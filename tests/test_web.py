@@ -0,0 +1,105 @@
+"""
+The Flask front ends: the shared templates rendered by app.py and by the
+deprecated web_gui.py, and the app's JSON API. Skipped without pyswip,
+which both import.
+"""
+
+import random
+import importlib
+
+import pytest
+
+try:
+    import pyswip  # noqa: F401
+except Exception as e:
+    pytest.skip(f"pyswip is not usable: {e}", allow_module_level=True)
+
+@pytest.fixture(params=["app", "web_gui"])
+def client(request):
+    module = importlib.import_module(request.param)
+    module.app.config['TESTING'] = True
+    return module.app.test_client()
+
+def test_pages_render(client):
+    response = client.get('/')
+    assert response.status_code == 200
+    assert b'data-api="session"' in response.data
+
+    client.post('/location', data={'location': 'yes'})
+    response = client.get('/question')
+    assert response.status_code == 200
+    assert b'class="step active"' in response.data
+    assert b'name="option"' in response.data
+
+def test_api_script_only_in_app():
+    """Only app.py has the /api endpoints the shared layout's script calls"""
+    for name, expected in (("app", True), ("web_gui", False)):
+        response = importlib.import_module(name).app.test_client().get('/')
+        assert (b"/api/session" in response.data) == expected, name
+
+@pytest.fixture
+def api():
+    import app
+    return app.app.test_client()
+
+def answer_all(api, choose):
+    """Answer every question the API asks with choose(question); returns the final state"""
+    state = api.post('/api/session', json={'location': 'yes'}).get_json()
+    while state['status'] == 'question':
+        state = api.post('/api/answer', json={'option': choose(state['question'])}).get_json()
+    return state
+
+def test_api_session(api):
+    assert api.post('/api/answer', json={'option': 'lunch'}).status_code == 409
+
+    start = api.post('/api/session', json={'location': 'yes'}).get_json()
+    assert start['status'] == 'question'
+    assert start['step'] == 0 and start['steps'] >= 1 and start['remaining'] > 0
+    first = start['question']
+
+    response = api.post('/api/answer', json={'option': 'not an option'})
+    assert response.status_code == 400 and response.get_json()['status'] == 'error'
+
+    state = api.post('/api/answer', json={'option': first['options'][0]}).get_json()
+    assert state['status'] == 'question' and state['step'] == 1
+    assert state['question']['attribute'] != first['attribute']
+    assert state['remaining'] <= start['remaining']
+
+    undone = api.delete('/api/answer').get_json()
+    assert undone['question'] == first and undone['step'] == 0
+    assert undone['remaining'] == start['remaining']
+
+    state = answer_all(api, lambda question: question['options'][0])
+    assert state['status'] in ('recommendation', 'no_results')
+    if state['status'] == 'recommendation':
+        assert api.get('/api/recommendation').get_json()['restaurant'] == state['restaurant']
+        if state['restaurant']:
+            assert set(state['restaurant']) == {'id', 'name', 'url'}
+
+    assert api.post('/api/session', json={'location': 'no'}).get_json()['status'] == 'unsupported'
+
+def test_api_alternatives_skip_inferred_answers(api):
+    """Near misses are only ever scored on the answers the user gave"""
+    rng = random.Random(152)
+    inferred_sessions = 0
+    for _ in range(200):
+        state = answer_all(api, lambda question: rng.choice(question['options']))
+        debug = api.get('/debug').get_json()
+        inferred_sessions += bool(debug['inferred'])
+        answered = {attribute.replace('_', ' ') for attribute in debug['answers']}
+        for alternative in state.get('alternatives', []):
+            assert set(alternative['missed']) <= answered, alternative
+    assert inferred_sessions > 0
+
+def test_api_alternatives_pinned_inference(api):
+    """
+    On kb.pl these answers imply meal_type=breakfast. Gott's Roadside only
+    misses the noise answer the user gave; scored on the inferred meal type
+    too, it would drop out of the alternatives.
+    """
+    answers = {'cuisine': 'american', 'noise': 'quiet', 'diet': 'standard', 'price': 'moderate'}
+    state = answer_all(api, lambda question: answers[question['attribute']])
+    assert api.get('/debug').get_json()['inferred'] == {'meal_type': 'breakfast'}
+    missed = {alternative['id']: alternative['missed'] for alternative in state['alternatives']}
+    assert missed.get('gotts_roadside') == ['noise']
+    assert not any('meal type' in attributes for attributes in missed.values())
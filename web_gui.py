@@ -1,97 +1,25 @@
 from flask import Flask, render_template, request, redirect, url_for, session
-import tempfile
-import numpy as np
-from pyswip.prolog import Prolog
-from pyswip.easy import *
-import re
 import os
-import sys
+from kb_manager import KnowledgeBase, KB_PATH
+from catalog import questions
+from recommendations import restaurant_info, first_restaurant
 
 app = Flask(__name__)
 app.secret_key = 'sf_restaurant_recommender'  # Needed for session management
 
-# Set up Prolog
-prolog = Prolog()
-retractall = Functor("retractall")
-known = Functor("known", 3)
+# The same non-interactive KB as the web app and the CLI; each query only
+# sees the answers it is given as known/3 facts
+knowledge_base = KnowledgeBase(KB_PATH)
 
-# Dictionary of restaurant responses with Google Maps links
-responses = {
-    'nopalito': "Nopalito: https://goo.gl/maps/Lh23H8qdJZbB3KZYA",
-    'zuni_cafe': "Zuni Café: https://goo.gl/maps/Q8nHYHJtHnRiNsus6",
-    'farmhouse_kitchen': "Farmhouse Kitchen Thai: https://goo.gl/maps/u5v5wAA3ZPKsS7e47",
-    'souvla': "Souvla: https://goo.gl/maps/ngnffrQ13SnGjJWY8",
-    'la_taqueria': "La Taqueria: https://goo.gl/maps/qBTiL76dbA7dknLG6",
-    'burma_superstar': "Burma Superstar: https://goo.gl/maps/vdKHLEESKZwCVQmP7",
-    'liholiho_yacht_club': "Liholiho Yacht Club: https://goo.gl/maps/BJuEiNhLeJSPSvyC8",
-    'nopa': "Nopa: https://goo.gl/maps/PVsUhTC9GJgfJbGr5",
-    'foreign_cinema': "Foreign Cinema: https://goo.gl/maps/Ay55yVoVXYQ2RCJ86",
-    'hog_island_oyster': "Hog Island Oyster Co: https://goo.gl/maps/KSLfpN9J8mCnE6U16",
-}
-
-# Questions and their options
-questions = [
-    {
-        'text': "What kind of food are you in the mood for today?",
-        'attribute': 'cuisine',
-        'options': ["american", "chinese", "italian", "japanese", "mexican", "thai", "burmese", "greek", "hawaiian", "seafood"]
-    },
-    {
-        'text': "Do you have any specific dietary requirements or preferences?",
-        'attribute': 'diet',
-        'options': ["standard", "vegetarian_options", "vegan_options", "gluten_free", "pescatarian", "halal"]
-    },
-    {
-        'text': "What price range are you comfortable with for this meal?",
-        'attribute': 'price',
-        'options': ["affordable", "moderate", "expensive"]
-    },
-    {
-        'text': "What kind of dining atmosphere would you prefer?",
-        'attribute': 'atmosphere',
-        'options': ["casual", "upscale", "cozy", "trendy", "quiet"]
-    },
-    {
-        'text': "How far are you willing to travel from Minerva residence?",
-        'attribute': 'distance',
-        'options': ["walking_distance", "muni_required", "bart_required"]
-    },
-    {
-        'text': "What noise level would be ideal for your dining experience?",
-        'attribute': 'noise',
-        'options': ["quiet", "moderate", "lively"]
-    },
-    {
-        'text': "Do you have a preference for indoor or outdoor seating?",
-        'attribute': 'seating',
-        'options': ["indoor", "outdoor", "indoor_outdoor"]
-    }
-]
-
-def initialize_kb():
-    # Load KB from file
-    with open('kb.pl', 'r') as f:
-        KB = f.read()
-    
-    # Create a temporary file with the KB in it
-    (FD, name) = tempfile.mkstemp(suffix='.pl', text="True")
-    with os.fdopen(FD, "w") as text_file:
-        text_file.write(KB)
-    
-    # Consult the KB
-    prolog.consult(name)
-    
-    # Remove the temporary file
-    os.unlink(name)
-    
-    # Clear the previous knowledge
-    call(retractall(known))
+def recommended_restaurant(answers):
+    """The first restaurant matching answers, skipping 'ask_others'"""
+    return first_restaurant(knowledge_base.query(answers))
 
 @app.route('/')
 def index():
     # Initialize or reset the session
     session.clear()
-    initialize_kb()
+    knowledge_base.load()
     return render_template('index.html')
 
 @app.route('/location', methods=['POST'])
@@ -99,12 +27,10 @@ def location():
     is_in_sf = request.form.get('location') == 'yes'
     
     if is_in_sf:
-        prolog.assertz("known(yes, location, san_francisco)")
         session['answers'] = {'location': 'san_francisco'}
         session['current_question'] = 0
         return redirect(url_for('question'))
     else:
-        prolog.assertz("known(no, location, san_francisco)")
         return render_template('no_results.html', message="Sorry, we don't have any recommendations outside of San Francisco.")
 
 @app.route('/question', methods=['GET', 'POST'])
@@ -125,19 +51,15 @@ def question():
         if not value:
             return render_template('question.html', 
                                   question=questions[current_question],
+                                  steps=len(questions),
                                   error="Please select an option")
         
         # Store the answer
         answers[attribute] = value
         session['answers'] = answers
         
-        # Add to Prolog knowledge base
-        prolog.assertz(f"known(yes, {attribute}, {value})")
-        
         # Check if this answer triggers a recommendation
-        restaurant = list(prolog.query("restaurant(X)", maxresult=1))
-        
-        if restaurant and restaurant[0]['X'] != "ask_others":
+        if recommended_restaurant(answers):
             # We have a recommendation, show it
             return redirect(url_for('recommendation'))
         
@@ -146,16 +68,14 @@ def question():
         return redirect(url_for('question'))
     
     # GET request, show the current question
-    return render_template('question.html', question=questions[current_question])
+    return render_template('question.html', question=questions[current_question], steps=len(questions))
 
 @app.route('/recommendation')
 def recommendation():
-    restaurant = list(prolog.query("restaurant(X)", maxresult=1))
+    restaurant_name = recommended_restaurant(session.get('answers', {}))
     
-    if restaurant and restaurant[0]['X'] != "ask_others":
-        restaurant_name = restaurant[0]['X']
-        restaurant_info = responses.get(restaurant_name, restaurant_name)
-        return render_template('recommendation.html', restaurant=restaurant_info)
+    if restaurant_name:
+        return render_template('recommendation.html', restaurant=restaurant_info(restaurant_name))
     else:
         return render_template('no_results.html', 
                               message="Sorry, we don't have any recommendations based on your preferences, but you can ask others for suggestions.")